@@ -0,0 +1,323 @@
+"""
+Streaming archives for stack downloads
+Entries are compressed and handed to the response while the archive is being
+written, so the first bytes go out immediately and only the entry being
+written is held in memory (entries backed by a file are read from it in
+chunks). Output is never seeked: ZIP entries carry their CRC and sizes in a
+data descriptor after the data.
+
+Archive formats are pluggable: each ArchiveFormat registers under its name
+(zip-deflate, zip-store, tar.gz, tar.zst) with its own compression levels.
+Deterministic archives use fixed timestamps, so the same sorted entries give
+byte-identical output and archive_etag() identifies them before writing.
+"""
+
+import gzip
+import hashlib
+import io
+import os
+import tarfile
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import (
+    IO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+try:
+    import zstandard
+except ImportError:  # tar.zst downloads are unavailable
+    zstandard = None
+
+# Data is fed to the compressor, and compressed output to the response, in
+# pieces of this size
+CHUNK_SIZE = 64 * 1024
+
+# Permissions of entries added by name (as ZipFile.writestr() gives them)
+DEFAULT_MODE = 0o600
+
+DEFAULT_FORMAT = "zip-deflate"
+
+# Entry timestamps of deterministic archives (the earliest a ZIP can hold)
+DETERMINISTIC_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+DETERMINISTIC_MTIME = 315532800
+
+ZSTD_THREADS = int(os.getenv("ARCHIVE_ZSTD_THREADS", str(min(4, os.cpu_count() or 1))))
+
+
+@dataclass(frozen=True, slots=True)
+class ArchiveEntry:
+    """One file of a generated archive"""
+
+    name: str
+    # Content, or a loader called when the entry is written
+    data: Union[str, bytes, Callable[[], bytes]] = b""
+    mode: int = DEFAULT_MODE
+    # SHA-256 of the content, for entries whose content should not be read early
+    digest: Optional[str] = None
+    # File whose content is streamed instead of data
+    path: Optional[str] = None
+
+    def content(self) -> bytes:
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                return f.read()
+        if isinstance(self.data, str):
+            return self.data.encode("utf-8")
+        if callable(self.data):
+            return self.data()
+        return self.data
+
+    def open(self) -> IO[bytes]:
+        """Binary file object of the content"""
+        if self.path is not None:
+            return open(self.path, "rb")
+        return io.BytesIO(self.content())
+
+    def content_digest(self) -> str:
+        if self.digest is None:
+            return hashlib.sha256(self.content()).hexdigest()
+        return self.digest
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable output collecting what an archive writer produces until drained"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.pending = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        size = len(data)
+        self._chunks.append(bytes(data))
+        self._position += size
+        self.pending += size
+        return size
+
+    def tell(self) -> int:
+        # ZipFile needs offsets for the central directory, but must not seek
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
+
+
+class ArchiveFormat:
+    """
+    An archive container and compression method
+
+    Subclasses set the class attributes and implement iter_archive().
+    """
+
+    name = ""
+    extension = ""
+    media_type = "application/octet-stream"
+    # (lowest, highest, default) compression level; None if not adjustable
+    levels: Optional[Tuple[int, int, int]] = None
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def resolve_level(self, level: Optional[int]) -> Optional[int]:
+        """The level to compress at; raises ValueError if it is out of range"""
+        if self.levels is None:
+            if level is not None:
+                raise ValueError(f"{self.name} has no compression levels")
+            return None
+        lowest, highest, default = self.levels
+        if level is None:
+            return default
+        if not lowest <= level <= highest:
+            raise ValueError(
+                f"{self.name} compression level must be {lowest}-{highest}"
+            )
+        return level
+
+    def iter_archive(
+        self,
+        entries: Iterable[ArchiveEntry],
+        level: Optional[int],
+        deterministic: bool = False,
+    ) -> Iterator[bytes]:
+        """Yield the archive piece by piece; deterministic fixes all timestamps"""
+        raise NotImplementedError
+
+
+_FORMATS: Dict[str, ArchiveFormat] = {}
+
+
+def register(cls):
+    """Class decorator registering an archive format under its name"""
+    _FORMATS[cls.name] = cls()
+    return cls
+
+
+def get_archive_format(name: Optional[str]) -> ArchiveFormat:
+    """Look up a format (None means the default); raises ValueError if unusable"""
+    archive_format = _FORMATS.get(name or DEFAULT_FORMAT)
+    if archive_format is None:
+        raise ValueError(
+            f"Unknown archive format '{name}' (choose from {', '.join(_FORMATS)})"
+        )
+    if not archive_format.available:
+        raise ValueError(f"Archive format '{name}' is not available on this server")
+    return archive_format
+
+
+def archive_etag(
+    entries: Sequence[ArchiveEntry],
+    archive_format: ArchiveFormat,
+    level: Optional[int],
+) -> str:
+    """
+    Strong ETag of a deterministic archive
+
+    Hashes what determines its bytes: the format, the level and each entry's
+    name, mode and content, in archive order.
+    """
+    digest = hashlib.sha256(f"{archive_format.name}:{level}".encode())
+    for entry in entries:
+        digest.update(
+            f"\0{entry.name}\0{entry.mode:o}\0{entry.content_digest()}".encode()
+        )
+    return f'"{digest.hexdigest()}"'
+
+
+def iter_zip(
+    entries: Iterable[ArchiveEntry],
+    compression: int = zipfile.ZIP_DEFLATED,
+    level: Optional[int] = None,
+    deterministic: bool = False,
+) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of entries piece by piece as they are compressed
+
+    entries may be a lazy iterable; each entry is consumed (and can be freed)
+    before the next one is requested.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression) as zip_file:
+        for entry in entries:
+            if deterministic:
+                info = zipfile.ZipInfo(entry.name, date_time=DETERMINISTIC_DATE_TIME)
+                # Unix, whatever platform the server runs on
+                info.create_system = 3
+            else:
+                info = zipfile.ZipInfo(entry.name, date_time=time.localtime()[:6])
+            info.compress_type = compression
+            # ZipInfo has no public compression level before Python 3.13
+            info._compresslevel = level
+            info.external_attr = entry.mode << 16
+
+            with entry.open() as source, zip_file.open(info, "w") as dest:
+                while chunk := source.read(CHUNK_SIZE):
+                    dest.write(chunk)
+                    if sink.pending >= CHUNK_SIZE:
+                        yield sink.drain()
+            if sink.pending:
+                yield sink.drain()
+
+    # Central directory
+    yield sink.drain()
+
+
+def iter_tar(
+    entries: Iterable[ArchiveEntry],
+    sink: _ChunkSink,
+    compressor: IO[bytes],
+    deterministic: bool = False,
+) -> Iterator[bytes]:
+    """
+    Yield a tar stream of entries written through compressor into sink
+
+    compressor is closed (flushing its trailer) once every entry is written.
+    """
+    with tarfile.open(fileobj=compressor, mode="w|") as tar:
+        for entry in entries:
+            info = tarfile.TarInfo(entry.name)
+            info.mode = entry.mode
+            info.mtime = DETERMINISTIC_MTIME if deterministic else int(time.time())
+            with entry.open() as source:
+                info.size = source.seek(0, io.SEEK_END)
+                source.seek(0)
+                tar.addfile(info, source)
+            if sink.pending:
+                yield sink.drain()
+    compressor.close()
+    yield sink.drain()
+
+
+@register
+class ZipDeflateFormat(ArchiveFormat):
+    name = "zip-deflate"
+    extension = ".zip"
+    media_type = "application/zip"
+    levels = (0, 9, 6)
+
+    def iter_archive(self, entries, level, deterministic=False):
+        return iter_zip(entries, zipfile.ZIP_DEFLATED, level, deterministic)
+
+
+@register
+class ZipStoreFormat(ArchiveFormat):
+    name = "zip-store"
+    extension = ".zip"
+    media_type = "application/zip"
+
+    def iter_archive(self, entries, level, deterministic=False):
+        return iter_zip(entries, zipfile.ZIP_STORED, deterministic=deterministic)
+
+
+@register
+class TarGzFormat(ArchiveFormat):
+    name = "tar.gz"
+    extension = ".tar.gz"
+    media_type = "application/gzip"
+    levels = (1, 9, 6)
+
+    def iter_archive(self, entries, level, deterministic=False):
+        sink = _ChunkSink()
+        compressor = gzip.GzipFile(
+            fileobj=sink,
+            mode="wb",
+            compresslevel=level,
+            mtime=DETERMINISTIC_MTIME if deterministic else None,
+        )
+        return iter_tar(entries, sink, compressor, deterministic)
+
+
+@register
+class TarZstFormat(ArchiveFormat):
+    name = "tar.zst"
+    extension = ".tar.zst"
+    media_type = "application/zstd"
+    levels = (1, 19, 3)
+
+    @property
+    def available(self) -> bool:
+        return zstandard is not None
+
+    def iter_archive(self, entries, level, deterministic=False):
+        sink = _ChunkSink()
+        compressor = zstandard.ZstdCompressor(
+            level=level, threads=ZSTD_THREADS
+        ).stream_writer(sink, closefd=False)
+        return iter_tar(entries, sink, compressor, deterministic)
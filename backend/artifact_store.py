@@ -0,0 +1,160 @@
+"""
+Content-addressed store of generated archives on disk
+Deterministic archives are written once, named by their ETag digest, and
+served from the file afterwards: by nginx (X-Accel-Redirect) when the request
+came through it, so the Python worker is free as soon as the headers are
+sent, or as a plain file response otherwise. The store is bounded by total
+size and evicts the least recently served archives first.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Request header through which nginx says where it serves the store from
+# (see the /artifacts/ location in frontend/nginx.conf)
+ACCEL_PREFIX_HEADER = "x-artifact-accel-prefix"
+
+
+class ArtifactStore:
+    """Directory of archives by content name, with size-bounded LRU eviction"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 1 << 30):
+        self.directory = directory or None
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        # Stored archive sizes by name, least recently used first
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._scan()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        """Path of a stored archive (marks it most recently used), or None"""
+        path = self.path(name)
+        with self._lock:
+            if name not in self._sizes:
+                # Possibly written by another worker process
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    self.misses += 1
+                    return None
+                self._add(name, size)
+            self._sizes.move_to_end(name)
+            self.hits += 1
+        try:
+            # Recency survives restarts through the modification time
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, name: str, chunks: Iterable[bytes]) -> str:
+        """
+        Write an archive from its chunks and return its path
+
+        Older archives are evicted until the store fits max_bytes again; the
+        one just written is kept even if it alone is larger.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            # Readable by nginx, which runs as another user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path(name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._add(name, size)
+            self._evict()
+        return self.path(name)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current size and hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "archives": len(self._sizes),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "errors": self.errors,
+            }
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def _add(self, name: str, size: int):
+        self._total += size - self._sizes.pop(name, 0)
+        self._sizes[name] = size
+
+    def _evict(self):
+        # Archives being sent keep their data after unlink()
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            name, size = self._sizes.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.path(name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not evict stored archive {name}: {e}")
+
+    def _scan(self):
+        """Index archives left by earlier runs, oldest first"""
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                # Temp files may still be written by another worker
+                if not entry.is_file() or entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            for _, name, size in sorted(found):
+                self._add(name, size)
+            self._evict()
+
+
+# Singleton instance
+_store = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Get or create the artifact store singleton (disabled without a directory)"""
+    global _store
+    if _store is None:
+        _store = ArtifactStore(
+            directory=os.getenv("ARTIFACT_STORE_DIR", ""),
+            max_bytes=int(os.getenv("ARTIFACT_STORE_MAX_MB", "1024")) * 1024 * 1024,
+        )
+    return _store
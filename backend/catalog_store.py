@@ -0,0 +1,195 @@
+"""
+Process-wide application catalog store
+Parses catalog.json once and transparently reloads it when the file changes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class PortTemplate:
+    """A default port mapping from the catalog, pre-split into host/container"""
+
+    raw: str
+    host: Optional[str]
+    container: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class VolumeTemplate:
+    """A default volume mapping from the catalog"""
+
+    raw: str
+    source: Optional[str]
+    is_local_bind: bool
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogIndex:
+    """Precomputed lookups over the catalog applications, built once per load"""
+
+    by_id: Mapping[str, Dict[str, Any]]
+    enabled_ids: FrozenSet[str]
+    port_templates: Mapping[str, Tuple[PortTemplate, ...]]
+    volume_templates: Mapping[str, Tuple[VolumeTemplate, ...]]
+
+    @classmethod
+    def build(cls, catalog: Dict[str, Any]) -> "CatalogIndex":
+        """Build the index from a parsed catalog.json"""
+        by_id = {}
+        port_templates = {}
+        volume_templates = {}
+
+        for app in catalog.get("applications", []):
+            app_id = app["id"]
+            by_id[app_id] = app
+
+            default_config = app.get("default_config", {})
+            port_templates[app_id] = tuple(
+                _parse_port(mapping) for mapping in default_config.get("ports", [])
+            )
+            volume_templates[app_id] = tuple(
+                _parse_volume(vol) for vol in default_config.get("volumes", [])
+            )
+
+        return cls(
+            by_id=MappingProxyType(by_id),
+            enabled_ids=frozenset(
+                app_id for app_id, app in by_id.items() if app.get("enabled", False)
+            ),
+            port_templates=MappingProxyType(port_templates),
+            volume_templates=MappingProxyType(volume_templates),
+        )
+
+    def get(self, app_id: str) -> Optional[Dict[str, Any]]:
+        """Look up an application by id"""
+        return self.by_id.get(app_id)
+
+    def is_enabled(self, app_id: str) -> bool:
+        """Check whether an application exists and is enabled"""
+        return app_id in self.enabled_ids
+
+
+def _parse_port(mapping: str) -> PortTemplate:
+    """Split a "host:container" mapping; bare ports keep host/container as None"""
+    if ":" not in mapping:
+        return PortTemplate(raw=mapping, host=None, container=None)
+    parts = mapping.split(":")
+    return PortTemplate(raw=mapping, host=parts[0], container=parts[1])
+
+
+def _parse_volume(vol: str) -> VolumeTemplate:
+    """Extract the source side of a volume mapping"""
+    source = vol.split(":")[0] if ":" in vol else None
+    return VolumeTemplate(
+        raw=vol, source=source, is_local_bind=":" in vol and vol.startswith("./")
+    )
+
+
+class CatalogSnapshot:
+    """One parsed version of catalog.json (shared - treat as read-only)"""
+
+    __slots__ = ("data", "index", "body", "etag", "digest", "stat_key")
+
+    def __init__(
+        self,
+        data: Dict[str, Any],
+        index: CatalogIndex,
+        body: bytes,
+        digest: str,
+        stat_key: Tuple[int, int],
+    ):
+        self.data = data
+        self.index = index
+        self.body = body
+        self.digest = digest
+        self.etag = f'"{digest}"'
+        self.stat_key = stat_key
+
+
+class CatalogStore:
+    """Caches the parsed catalog and swaps in a new snapshot when the file changes"""
+
+    def __init__(self, catalog_file: str = "catalog.json"):
+        self.catalog_file = catalog_file
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CatalogSnapshot] = None
+
+    def get(self) -> CatalogSnapshot:
+        """
+        Return the current catalog snapshot, reloading it if catalog.json changed
+
+        A cheap stat() is done on every call; the file is only re-read when its
+        mtime or size differs from the cached snapshot, and only re-parsed when
+        its content hash differs as well.
+        """
+        stat = os.stat(self.catalog_file)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.stat_key == stat_key:
+            return snapshot
+
+        with self._lock:
+            # Another request may have reloaded while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.stat_key == stat_key:
+                return snapshot
+
+            self._snapshot = self._reload(snapshot, stat_key)
+            return self._snapshot
+
+    def _reload(
+        self, current: Optional[CatalogSnapshot], stat_key: Tuple[int, int]
+    ) -> CatalogSnapshot:
+        """Read catalog.json and build a new snapshot (keeps the old one on error)"""
+        with open(self.catalog_file, "rb") as f:
+            raw = f.read()
+
+        digest = hashlib.sha256(raw).hexdigest()
+        if current is not None and current.digest == digest:
+            # Touched but unchanged - keep the parsed data, just remember the new stat
+            return CatalogSnapshot(
+                current.data, current.index, current.body, digest, stat_key
+            )
+
+        try:
+            data = json.loads(raw)
+            index = CatalogIndex.build(data)
+        except (ValueError, KeyError, TypeError) as e:
+            if current is None:
+                raise
+            logger.error(f"Error parsing {self.catalog_file}, keeping previous: {e}")
+            # Remember the stat so a broken file isn't re-read on every request
+            return CatalogSnapshot(
+                current.data, current.index, current.body, current.digest, stat_key
+            )
+
+        # Pre-serialise once so /api/catalog never re-encodes an unchanged catalog
+        body = json.dumps(
+            data, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+        logger.info(f"Loaded catalog {self.catalog_file} ({digest[:12]})")
+        return CatalogSnapshot(data, index, body, digest, stat_key)
+
+
+# Singleton instance
+_store = None
+
+
+def get_catalog_store() -> CatalogStore:
+    """Get or create the catalog store singleton"""
+    global _store
+    if _store is None:
+        _store = CatalogStore()
+    return _store
@@ -5,7 +5,7 @@ Generates config files for MQTT, Grafana datasources, Traefik, etc.
 
 from typing import Any, Dict, List, Optional
 
-import yaml
+from yaml_emitter import dump_yaml
 
 
 def generate_prometheus_config() -> str:
@@ -94,7 +94,7 @@ def generate_emqx_config(
             }
         )
 
-    return yaml.dump(config, default_flow_style=False)
+    return dump_yaml(config)
 
 
 def generate_grafana_datasources(datasources: List[Dict[str, Any]]) -> str:
@@ -108,6 +108,7 @@ def generate_grafana_datasources(datasources: List[Dict[str, Any]]) -> str:
     ]
     """
     provisioning = {"apiVersion": 1, "datasources": []}
+    has_prometheus = False
 
     for idx, ds in enumerate(datasources):
         ds_type = ds.get("type")
@@ -115,9 +116,12 @@ def generate_grafana_datasources(datasources: List[Dict[str, Any]]) -> str:
         config = ds.get("config", {})
 
         if ds_type == "prometheus":
+            # Datasource names must be unique when several Prometheus instances exist
+            name = f"Prometheus-{instance_name}" if has_prometheus else "Prometheus"
+            has_prometheus = True
             provisioning["datasources"].append(
                 {
-                    "name": "Prometheus",
+                    "name": name,
                     "type": "prometheus",
                     "access": "proxy",
                     "url": f"http://{instance_name}:9090",
@@ -165,7 +169,7 @@ def generate_grafana_datasources(datasources: List[Dict[str, Any]]) -> str:
                 }
             )
 
-    return yaml.dump(provisioning, default_flow_style=False, sort_keys=False)
+    return dump_yaml(provisioning, sort_keys=False)
 
 
 def generate_traefik_static_config(
@@ -196,7 +200,7 @@ def generate_traefik_static_config(
                 }
             }
 
-    return yaml.dump(config, default_flow_style=False, sort_keys=False)
+    return dump_yaml(config, sort_keys=False)
 
 
 def generate_traefik_dynamic_config(
@@ -238,7 +242,7 @@ def generate_traefik_dynamic_config(
             "loadBalancer": {"servers": [{"url": f"http://{instance_name}:{port}"}]}
         }
 
-    return yaml.dump(config, default_flow_style=False, sort_keys=False)
+    return dump_yaml(config, sort_keys=False)
 
 
 def generate_ignition_db_setup_script(databases: List[Dict[str, Any]]) -> str:
@@ -0,0 +1,70 @@
+"""
+Config file rendering stage for stack generation
+Integration config files (Keycloak realm, Grafana datasources, Mosquitto,
+Prometheus, Traefik) do not depend on each other. Generation queues them on a
+ConfigFileStage, which renders them on a shared bounded thread pool and
+returns (or streams) the results in the order they were added.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+CONFIG_WORKERS = int(
+    os.getenv("CONFIG_RENDER_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get or create the worker pool shared by all generations"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=CONFIG_WORKERS, thread_name_prefix="config-render"
+                )
+    return _executor
+
+
+class ConfigFileStage:
+    """Independent config file generators, rendered together"""
+
+    def __init__(self):
+        self._jobs: List[Tuple[str, Callable[[], str]]] = []
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def add(self, path: str, generate: Callable[[], str]):
+        """Queue generate() to produce the content of path"""
+        self._jobs.append((path, generate))
+
+    def render(self) -> Dict[str, str]:
+        """Run every generator and return {path: content} in the order added"""
+        return dict(self.iter_render())
+
+    def iter_render(self) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (path, content) in the order added, each as soon as it is ready
+
+        A single job, or a pool of one worker, runs inline. Jobs not yet
+        started are cancelled if the caller stops iterating early.
+        """
+        if len(self._jobs) < 2 or CONFIG_WORKERS < 2:
+            for path, generate in self._jobs:
+                yield path, generate()
+            return
+
+        executor = _get_executor()
+        futures = [executor.submit(generate) for _, generate in self._jobs]
+        try:
+            for (path, _), future in zip(self._jobs, futures):
+                yield path, future.result()
+        finally:
+            for future in futures:
+                future.cancel()
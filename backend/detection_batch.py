@@ -0,0 +1,76 @@
+"""
+Batch integration detection for planning many stacks at once
+Runs detection for each stack on a shared worker pool and yields NDJSON lines
+in input order, so results stream back while later stacks are still running.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from integration_engine import IntegrationEngine
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_MAX", "500"))
+BATCH_WORKERS = int(
+    os.getenv("DETECTION_BATCH_WORKERS", str(min(8, os.cpu_count() or 1)))
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get or create the worker pool shared by all batch requests"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, BATCH_WORKERS),
+                    thread_name_prefix="detect-batch",
+                )
+    return _executor
+
+
+def detect_with_summary(
+    engine: IntegrationEngine, instances: List[Dict]
+) -> Dict[str, Any]:
+    """Detect integrations for one stack and add the human-readable summary"""
+    # Copy the shared (memoized) result before adding the summary
+    result = dict(engine.detect_integrations_cached(instances))
+    result["summary"] = engine.get_integration_summary(result)
+    return result
+
+
+def _detect_line(engine: IntegrationEngine, index: int, instances: List[Dict]) -> str:
+    """Run detection for one stack and encode it as an NDJSON line"""
+    try:
+        line = {"index": index, "result": detect_with_summary(engine, instances)}
+    except Exception as e:
+        logger.error(f"Error detecting integrations for batch stack {index}: {e}")
+        line = {"index": index, "error": str(e)}
+    return json.dumps(line, ensure_ascii=False) + "\n"
+
+
+def detect_batch(engine: IntegrationEngine, stacks: List[List[Dict]]) -> Iterator[str]:
+    """
+    Detect integrations for many stacks
+
+    Args:
+        engine: Integration engine shared by every stack in the batch
+        stacks: Instance lists, one per stack
+
+    Yields:
+        One NDJSON line per stack, in input order. A stack that fails yields
+        {"index", "error"} instead of {"index", "result"} without aborting the batch.
+    """
+    # map() yields in submission order and cancels pending work if the
+    # client disconnects and the generator is closed early
+    yield from _get_executor().map(
+        lambda item: _detect_line(engine, item[0], item[1]), enumerate(stacks)
+    )
@@ -0,0 +1,126 @@
+"""
+Incremental integration detection for interactive editing
+Keeps recent detection states behind opaque tokens so clients can send only
+the instances that changed and receive only the sections that changed.
+"""
+
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from cache_utils import LRUCache, canonical_hash
+from integration_engine import IntegrationEngine
+
+logger = logging.getLogger(__name__)
+
+# Result sections returned whole whenever they differ from the previous state
+LIST_SECTIONS = ("conflicts", "warnings", "recommendations", "auto_add_services")
+
+# token -> {"instances": {instance_name: instance}, "result": ..., "version": ...}
+_states = LRUCache(maxsize=int(os.getenv("DETECTION_DELTA_STATES", "1024")))
+
+
+def apply_detection_delta(
+    engine: IntegrationEngine,
+    token: Optional[str],
+    add: List[Dict],
+    remove: List[str],
+    modify: List[Dict],
+) -> Optional[Dict[str, Any]]:
+    """
+    Apply an instance delta to a stored detection state
+
+    Args:
+        engine: Integration engine to detect with
+        token: Token of the client's current state (None starts from empty)
+        add: Instances to add (an existing instance_name is treated as modify)
+        remove: Instance names to remove
+        modify: Instances to replace, matched by instance_name
+
+    Returns:
+        The changed sections plus a new token, or None if the token is unknown
+        (expired, evicted or issued by another worker) and the client must
+        resend its full stack with token=None
+    """
+    if token is None:
+        state = {"instances": {}, "result": None, "version": engine.version}
+    else:
+        state = _states.get(token)
+        if state is None:
+            return None
+
+    instances = dict(state["instances"])
+    changed_services = set()
+
+    for instance_name in remove:
+        removed = instances.pop(instance_name, None)
+        if removed is not None:
+            changed_services.add(removed["app_id"])
+
+    for instance in list(modify) + list(add):
+        existing = instances.get(instance["instance_name"])
+        if existing is not None:
+            if existing == instance:
+                continue
+            changed_services.add(existing["app_id"])
+        # Replacing an existing key keeps the instance's position in the stack
+        instances[instance["instance_name"]] = instance
+        changed_services.add(instance["app_id"])
+
+    previous = state["result"]
+    if previous is not None and state["version"] == engine.version:
+        result = engine.detect_integrations_cached(
+            list(instances.values()), previous, changed_services
+        )
+    else:
+        result = engine.detect_integrations_cached(list(instances.values()))
+
+    new_token = canonical_hash([engine.version, list(instances.values())])
+    _states.put(
+        new_token,
+        {"instances": instances, "result": result, "version": engine.version},
+    )
+
+    return _diff_results(engine, previous, result, token, new_token)
+
+
+def _diff_results(
+    engine: IntegrationEngine,
+    previous: Optional[Dict[str, Any]],
+    result: Dict[str, Any],
+    base_token: Optional[str],
+    new_token: str,
+) -> Dict[str, Any]:
+    """Build the delta response between two detection results"""
+    delta = {
+        "token": new_token,
+        "base_token": base_token,
+        "integrations": {},
+        "removed_integrations": [],
+    }
+
+    old_integrations = previous["integrations"] if previous is not None else {}
+    for integration_type, integration in result["integrations"].items():
+        old = old_integrations.get(integration_type)
+        if old is not integration and old != integration:
+            delta["integrations"][integration_type] = integration
+
+    delta["removed_integrations"] = [
+        integration_type
+        for integration_type in old_integrations
+        if integration_type not in result["integrations"]
+    ]
+
+    for section in LIST_SECTIONS:
+        if previous is None or previous[section] != result[section]:
+            delta[section] = result[section]
+
+    changed = (
+        delta["integrations"]
+        or delta["removed_integrations"]
+        or any(section in delta for section in LIST_SECTIONS)
+    )
+    if changed:
+        delta["summary"] = engine.get_integration_summary(result)
+
+    return delta
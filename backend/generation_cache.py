@@ -0,0 +1,190 @@
+"""
+Content-addressed cache of stack generation results
+Results are keyed by a canonical hash of the normalized StackConfig plus the
+catalog and integrations versions and the version of the generator itself
+(result format and a digest of its code and templates), held in a bounded
+in-memory LRU and, optionally, in a directory on disk that survives restarts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional
+
+from cache_utils import LRUCache, canonical_hash
+from keycloak_generator import deterministic_secret_key
+
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of generation results changes
+# (2: port_assignments added with host port allocation)
+GENERATION_FORMAT_VERSION = 2
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BACKEND_DIR, "templates")
+
+# Modules whose code shapes generated output
+GENERATOR_MODULES = (
+    "config_generator.py",
+    "config_stage.py",
+    "generation_stream.py",
+    "ignition_db_registration.py",
+    "integration_engine.py",
+    "keycloak_generator.py",
+    "main.py",
+    "ntfy_monitor.py",
+    "port_allocator.py",
+    "service_renderers.py",
+    "stack_fragments.py",
+    "stack_templates.py",
+    "yaml_emitter.py",
+)
+
+
+@lru_cache(maxsize=1)
+def generator_digest() -> str:
+    """SHA-256 over the generator modules and templates (read once per process)"""
+    paths = [os.path.join(BACKEND_DIR, name) for name in GENERATOR_MODULES]
+    paths += sorted(
+        os.path.join(TEMPLATE_DIR, name) for name in os.listdir(TEMPLATE_DIR)
+    )
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, BACKEND_DIR).encode() + b"\0")
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(b"missing")
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def generation_cache_key(
+    normalized_config: Dict[str, Any],
+    catalog_digest: str,
+    integrations_version: str,
+    parts: Optional[Iterable[str]] = None,
+    deterministic: bool = False,
+) -> str:
+    """
+    Cache key for one generation (config must already be normalized)
+
+    parts is given only for partial generations, and deterministic only for
+    generations with derived secrets; their keys include a digest of the
+    server key, so rotating it never serves secrets derived from the old
+    one. Keys change whenever the generator's
+    code, templates or result format do, so entries persisted by an earlier
+    deploy are never served (they are simply not found).
+    """
+    key = [
+        GENERATION_FORMAT_VERSION,
+        generator_digest(),
+        catalog_digest,
+        integrations_version,
+        normalized_config,
+    ]
+    if parts is not None:
+        key.append(sorted(parts))
+    if deterministic:
+        server_key = deterministic_secret_key()
+        if server_key is None:
+            raise ValueError("No deterministic secret key is configured")
+        # Identifies the key without putting it in the key (or on disk)
+        key.append(["deterministic", hashlib.sha256(server_key).hexdigest()[:16]])
+    return canonical_hash(key)
+
+
+class GenerationCache:
+    """Memory LRU in front of an optional directory of JSON result files"""
+
+    def __init__(self, maxsize: int = 128, directory: Optional[str] = None):
+        self.directory = directory or None
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self._memory = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached result (treat as read-only) or None"""
+        result = self._memory.get(key)
+        if result is not None:
+            return result
+
+        result = self._read_disk(key)
+        if result is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._memory.put(key, result)
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store a result in memory and, if enabled, on disk"""
+        self._memory.put(key, result)
+        self._write_disk(key, result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters; misses count memory misses, disk_hits the ones disk served"""
+        stats = self._memory.stats()
+        with self._lock:
+            stats["disk_hits"] = self.disk_hits
+            stats["disk_errors"] = self.disk_errors
+        stats["disk_enabled"] = self.directory is not None
+        return stats
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable generation cache entry {key}: {e}")
+            with self._lock:
+                self.disk_errors += 1
+            return None
+
+    def _write_disk(self, key: str, result: Dict[str, Any]):
+        if not self.directory:
+            return
+        try:
+            # Write to a temp file and rename so readers never see partial JSON
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(result, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write generation cache entry {key}: {e}")
+            with self._lock:
+                self.disk_errors += 1
+
+
+# Singleton instance
+_cache = None
+
+
+def get_generation_cache() -> GenerationCache:
+    """Get or create the generation cache singleton"""
+    global _cache
+    if _cache is None:
+        _cache = GenerationCache(
+            maxsize=int(os.getenv("GENERATION_CACHE_SIZE", "128")),
+            directory=os.getenv("GENERATION_CACHE_DIR", ""),
+        )
+    return _cache
@@ -0,0 +1,166 @@
+"""
+Section-by-section stack generation output
+Generation yields (section, value) pairs as each part of a stack is ready:
+docker_compose, env, one config_file per file, readme and finally settings.
+collect_sections() assembles them into the /generate result and
+stream_sections() encodes them as NDJSON or SSE events with timings.
+Callers can request a subset of parts (compose, env, config_files, readme);
+settings are always included.
+"""
+
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SECTION_COMPOSE = "docker_compose"
+SECTION_ENV = "env"
+SECTION_CONFIG_FILE = "config_file"
+SECTION_README = "readme"
+SECTION_SETTINGS = "settings"
+
+PART_COMPOSE = "compose"
+PART_ENV = "env"
+PART_CONFIG_FILES = "config_files"
+PART_README = "readme"
+STACK_PARTS = frozenset({PART_COMPOSE, PART_ENV, PART_CONFIG_FILES, PART_README})
+
+# Result keys that are neither generated files nor config files
+SETTINGS_KEYS = ("ntfy_enabled", "ntfy_server", "ntfy_topic", "port_assignments")
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+Section = Tuple[str, Any]
+
+
+def parse_parts(value: Optional[str]) -> FrozenSet[str]:
+    """
+    Parse a comma-separated parts list (None or empty means every part)
+
+    Raises ValueError naming any unknown part.
+    """
+    if not value:
+        return STACK_PARTS
+    parts = frozenset(part.strip() for part in value.split(",") if part.strip())
+    unknown = parts - STACK_PARTS
+    if unknown:
+        raise ValueError(
+            f"Unknown parts: {', '.join(sorted(unknown))} "
+            f"(choose from {', '.join(sorted(STACK_PARTS))})"
+        )
+    return parts or STACK_PARTS
+
+
+def collect_sections(
+    sections: Iterable[Section], parts: FrozenSet[str] = STACK_PARTS
+) -> Dict[str, Any]:
+    """Assemble generated sections into the /generate result dict"""
+    collected: Dict[str, Any] = {}
+    config_files: Dict[str, str] = {}
+    for section, value in sections:
+        if section == SECTION_CONFIG_FILE:
+            path, content = value
+            config_files[path] = content
+        else:
+            collected[section] = value
+
+    result = {}
+    for part, section in (
+        (PART_COMPOSE, SECTION_COMPOSE),
+        (PART_ENV, SECTION_ENV),
+        (PART_README, SECTION_README),
+    ):
+        if part in parts:
+            result[section] = collected[section]
+    if PART_CONFIG_FILES in parts:
+        result["config_files"] = config_files
+    result.update(collected[SECTION_SETTINGS])
+    return result
+
+
+def replay_sections(
+    result: Dict[str, Any], parts: FrozenSet[str] = STACK_PARTS
+) -> Iterator[Section]:
+    """Sections of an already generated (cached) result, in stream order"""
+    if PART_COMPOSE in parts:
+        yield SECTION_COMPOSE, result["docker_compose"]
+    if PART_ENV in parts:
+        yield SECTION_ENV, result["env"]
+    if PART_CONFIG_FILES in parts:
+        for path, content in result["config_files"].items():
+            yield SECTION_CONFIG_FILE, (path, content)
+    if PART_README in parts:
+        yield SECTION_README, result["readme"]
+    yield SECTION_SETTINGS, {key: result[key] for key in SETTINGS_KEYS}
+
+
+def project_result(result: Dict[str, Any], parts: FrozenSet[str]) -> Dict[str, Any]:
+    """A full result restricted to parts"""
+    if parts == STACK_PARTS:
+        return result
+    return collect_sections(replay_sections(result, parts), parts)
+
+
+def tee_sections(
+    sections: Iterable[Section],
+    on_complete: Callable[[Dict[str, Any]], None],
+    parts: FrozenSet[str] = STACK_PARTS,
+) -> Iterator[Section]:
+    """Pass sections through and hand the collected result to on_complete"""
+    seen = []
+    for section in sections:
+        seen.append(section)
+        yield section
+    on_complete(collect_sections(seen, parts))
+
+
+def _encode(event: Dict[str, Any], stream_format: str) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event['section']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+def stream_sections(
+    sections: Iterable[Section], stream_format: str = "ndjson", cached: bool = False
+) -> Iterator[str]:
+    """
+    Encode sections as NDJSON lines or SSE events
+
+    Each event carries section_ms (time spent producing that section) and
+    elapsed_ms (since the stream started). A final "done" event ends the
+    stream, or an "error" event if generation fails part way.
+    """
+    start = last = time.perf_counter()
+
+    def timings(now: float) -> Dict[str, float]:
+        return {
+            "section_ms": round((now - last) * 1000, 3),
+            "elapsed_ms": round((now - start) * 1000, 3),
+        }
+
+    try:
+        for section, value in sections:
+            now = time.perf_counter()
+            event: Dict[str, Any] = {"section": section}
+            if section == SECTION_CONFIG_FILE:
+                event["path"], event["content"] = value
+            elif section == SECTION_SETTINGS:
+                event.update(value)
+            else:
+                event["content"] = value
+            event.update(timings(now))
+            last = now
+            yield _encode(event, stream_format)
+    except Exception as e:
+        logger.error(f"Error streaming stack generation: {e}")
+        yield _encode({"section": "error", "detail": str(e)}, stream_format)
+        return
+
+    now = time.perf_counter()
+    yield _encode({"section": "done", "cached": cached, **timings(now)}, stream_format)
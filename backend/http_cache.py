@@ -0,0 +1,28 @@
+"""
+HTTP caching helpers (ETag / conditional request handling)
+"""
+
+from typing import Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match request header against a strong ETag
+
+    Uses the weak comparison required for If-None-Match (RFC 9110 13.1.2), so
+    a W/ prefix added by a compressing proxy such as nginx still matches.
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+
+    return False
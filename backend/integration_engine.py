@@ -3,43 +3,146 @@ Integration Engine for IIoT Stack Builder
 Handles automatic service integration detection and configuration generation.
 """
 
+import hashlib
 import json
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+import os
+import threading
+from typing import AbstractSet, Any, Dict, FrozenSet, List, Optional, Tuple
+
+from cache_utils import LRUCache, canonical_hash
+from integration_model import (
+    IntegrationModel,
+    IntegrationModelError,
+    ServiceIntegration,
+)
 
 logger = logging.getLogger(__name__)
 
+# Detection results shared by /detect-integrations, /generate and /download
+_detection_cache = LRUCache(maxsize=int(os.getenv("DETECTION_CACHE_SIZE", "256")))
+
 
 class IntegrationEngine:
     """Core engine for managing service integrations"""
 
     def __init__(self, integrations_file: str = "integrations.json"):
-        """Initialize the integration engine"""
+        """
+        Initialize the integration engine
+
+        Raises:
+            IntegrationModelError: if integrations.json is malformed
+        """
         self.integrations_file = integrations_file
-        self.integrations = self._load_integrations()
-        self.integration_types = self.integrations.get("integration_types", {})
-        self.service_capabilities = self.integrations.get("service_capabilities", {})
-        self.integration_rules = self.integrations.get("integration_rules", {})
-        self.config_templates = self.integrations.get("config_templates", {})
-
-    def _load_integrations(self) -> Dict:
-        """Load integrations configuration from JSON file"""
+        # (mtime_ns, size) of the file this engine was built from
+        self.stat_key: Optional[Tuple[int, int]] = None
+        self.model = self._load_model()
+        self.version = self.model.version
+        self._compile_rules()
+
+    def _compile_rules(self):
+        """
+        Compile integration rules into set-based inverted indexes
+
+        Each index maps a service id to the positions of the rules it can
+        trigger, so a request only evaluates rules that mention one of the
+        selected services. Positions keep results in integrations.json order.
+        """
+        model = self.model
+
+        self._exclusivity_index = self._build_rule_index(
+            (pos, rule.services) for pos, rule in enumerate(model.exclusivity_rules)
+        )
+        self._dependency_index = self._build_rule_index(
+            (pos, [rule.service]) for pos, rule in enumerate(model.dependency_rules)
+        )
+        # Recommendation rules only fire when every if_selected service is
+        # present, so indexing on if_selected alone is enough
+        self._recommendation_index = self._build_rule_index(
+            (pos, rule.if_selected)
+            for pos, rule in enumerate(model.recommendation_rules)
+        )
+
+        # integration type -> every service that can affect its result
+        type_services = {
+            type_id: set(integration_type.providers)
+            for type_id, integration_type in model.types.items()
+        }
+        for service_id, caps in model.services.items():
+            for type_id, integration in caps.integrations.items():
+                type_services.setdefault(type_id, set()).add(service_id)
+                type_services[type_id].update(integration.datasource_types)
+        self._type_services: Dict[str, FrozenSet[str]] = {
+            type_id: frozenset(services) for type_id, services in type_services.items()
+        }
+
+        # Services whose instance config is copied into detection results
+        # (database providers and Grafana datasources)
+        config_services = set(model.providers("db_provider"))
+        for caps in model.services.values():
+            visualization = caps.integrations.get("visualization")
+            if visualization:
+                config_services.update(visualization.datasource_types)
+        self._config_services = frozenset(config_services)
+
+    @staticmethod
+    def _build_rule_index(rule_services) -> Dict[str, Tuple[int, ...]]:
+        """Build a service id -> rule positions index"""
+        index: Dict[str, List[int]] = {}
+        for pos, services in rule_services:
+            for service in services:
+                positions = index.setdefault(service, [])
+                if not positions or positions[-1] != pos:
+                    positions.append(pos)
+        return {service: tuple(positions) for service, positions in index.items()}
+
+    @staticmethod
+    def _matching_rules(
+        index: Dict[str, Tuple[int, ...]], selected: FrozenSet[str]
+    ) -> List[int]:
+        """Positions of the rules touched by the selected services, in file order"""
+        positions = set()
+        for service in selected:
+            positions.update(index.get(service, ()))
+        return sorted(positions)
+
+    def _load_model(self) -> IntegrationModel:
+        """Load, validate and compile the integrations JSON file"""
         try:
-            with open(self.integrations_file, "r") as f:
-                return json.load(f)
+            with open(self.integrations_file, "rb") as f:
+                stat = os.fstat(f.fileno())
+                self.stat_key = (stat.st_mtime_ns, stat.st_size)
+                raw = f.read()
         except FileNotFoundError:
             logger.error(f"Integrations file not found: {self.integrations_file}")
-            return {}
+            return IntegrationModel.empty()
+
+        try:
+            data = json.loads(raw)
+            return IntegrationModel.from_dict(
+                data, version=hashlib.sha256(raw).hexdigest()
+            )
         except json.JSONDecodeError as e:
-            logger.error(f"Error parsing integrations file: {e}")
-            return {}
+            raise IntegrationModelError(
+                f"{self.integrations_file}: invalid JSON: {e}"
+            ) from None
+        except IntegrationModelError as e:
+            raise IntegrationModelError(f"{self.integrations_file}: {e}") from None
 
-    def detect_integrations(self, instances: List[Dict]) -> Dict[str, Any]:
+    def detect_integrations(
+        self,
+        instances: List[Dict],
+        previous: Optional[Dict[str, Any]] = None,
+        changed_services: Optional[AbstractSet[str]] = None,
+    ) -> Dict[str, Any]:
         """
         Detect all possible integrations based on selected services
 
         Args:
             instances: List of instance configurations
+            previous: Earlier result for this stack (same engine version)
+            changed_services: App ids added, removed or modified since previous;
+                integration types none of them can affect are reused from previous
 
         Returns:
             Dictionary containing detected integrations, conflicts, and recommendations
@@ -52,8 +155,12 @@ class IntegrationEngine:
             "auto_add_services": [],
         }
 
-        # Get list of selected service IDs
+        # Get list of selected service IDs and group instances by app once
         selected_services = [inst["app_id"] for inst in instances]
+        selected = frozenset(selected_services)
+        instances_by_app: Dict[str, List[Dict]] = {}
+        for inst in instances:
+            instances_by_app.setdefault(inst["app_id"], []).append(inst)
 
         # Check mutual exclusivity
         conflicts = self.check_mutual_exclusivity(selected_services)
@@ -64,41 +171,63 @@ class IntegrationEngine:
         result["warnings"].extend(deps["warnings"])
         result["auto_add_services"] = deps["auto_add"]
 
-        # Detect available integrations
-        for integration_type, type_config in self.integration_types.items():
-            providers = [
-                s for s in selected_services if s in type_config.get("providers", [])
-            ]
+        # Detect available integrations (only types a selected service provides)
+        provided_types = set()
+        for service in selected:
+            provided_types.update(self.model.provider_types.get(service, ()))
+
+        previous_integrations = (
+            previous.get("integrations", {})
+            if previous is not None and changed_services is not None
+            else {}
+        )
+
+        for integration_type, type_info in self.model.types.items():
+            if integration_type not in provided_types:
+                continue
+
+            if (
+                integration_type in previous_integrations
+                and changed_services.isdisjoint(
+                    self._type_services.get(integration_type, ())
+                )
+            ):
+                result["integrations"][integration_type] = previous_integrations[
+                    integration_type
+                ]
+                continue
+
+            providers = [s for s in instances_by_app if s in type_info.providers]
 
             if providers:
                 # For each provider, find consumers/clients
                 if integration_type == "reverse_proxy":
                     result["integrations"][integration_type] = (
                         self._detect_reverse_proxy(
-                            providers[0], selected_services, instances
+                            providers[0], instances, instances_by_app
                         )
                     )
                 elif integration_type == "oauth_provider":
                     result["integrations"][integration_type] = self._detect_oauth(
-                        providers, selected_services, instances
+                        providers, instances, instances_by_app
                     )
                 elif integration_type == "db_provider":
                     result["integrations"][integration_type] = self._detect_database(
-                        providers, selected_services, instances
+                        providers, instances, instances_by_app
                     )
                 elif integration_type == "mqtt_broker":
                     result["integrations"][integration_type] = self._detect_mqtt(
-                        providers, selected_services, instances
+                        providers, instances, instances_by_app
                     )
                 elif integration_type == "visualization":
                     result["integrations"][integration_type] = (
                         self._detect_visualization(
-                            providers, selected_services, instances
+                            providers, instances, instances_by_app
                         )
                     )
                 elif integration_type == "email_testing":
                     result["integrations"][integration_type] = self._detect_email(
-                        providers, selected_services, instances
+                        providers, instances, instances_by_app
                     )
 
         # Get recommendations
@@ -107,22 +236,59 @@ class IntegrationEngine:
 
         return result
 
+    def detection_key(self, instances: List[Dict]) -> str:
+        """
+        Canonical hash of everything detect_integrations() depends on
+
+        Only config that can show up in the result is hashed (full config for
+        database/datasource services, the custom "name" otherwise), so editing
+        unrelated settings such as Ignition memory still hits the cache.
+        """
+        relevant = []
+        for inst in instances:
+            config = inst.get("config") or {}
+            if inst["app_id"] in self._config_services:
+                relevant_config = config
+            else:
+                relevant_config = config.get("name")
+            relevant.append(
+                (inst["app_id"], inst.get("instance_name"), relevant_config)
+            )
+
+        return canonical_hash([self.version, relevant])
+
+    def detect_integrations_cached(
+        self,
+        instances: List[Dict],
+        previous: Optional[Dict[str, Any]] = None,
+        changed_services: Optional[AbstractSet[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Memoized detect_integrations()
+
+        Results are shared between callers through a bounded LRU keyed by
+        detection_key() and must be treated as read-only.
+        """
+        return _detection_cache.get_or_compute(
+            self.detection_key(instances),
+            lambda: self.detect_integrations(instances, previous, changed_services),
+        )
+
     def check_mutual_exclusivity(self, selected_services: List[str]) -> List[Dict]:
         """Check for mutually exclusive service conflicts"""
         conflicts = []
+        selected = frozenset(selected_services)
 
-        exclusivity_rules = self.integration_rules.get("mutual_exclusivity", [])
-
-        for rule in exclusivity_rules:
-            group_services = rule["services"]
-            selected_from_group = [s for s in selected_services if s in group_services]
+        for pos in self._matching_rules(self._exclusivity_index, selected):
+            rule = self.model.exclusivity_rules[pos]
+            selected_from_group = [s for s in selected_services if s in rule.services]
 
             if len(selected_from_group) > 1:
                 conflict = {
-                    "group": rule["group"],
+                    "group": rule.group,
                     "services": selected_from_group,
-                    "message": rule["message"],
-                    "level": rule.get("level", "error"),
+                    "message": rule.message,
+                    "level": rule.level,
                 }
                 conflicts.append(conflict)
 
@@ -133,33 +299,27 @@ class IntegrationEngine:
     ) -> Dict:
         """Check for missing dependencies and requirements"""
         result = {"warnings": [], "auto_add": []}
+        selected = frozenset(selected_services)
 
-        dependency_rules = self.integration_rules.get("dependencies", [])
-
-        for rule in dependency_rules:
-            service = rule["service"]
-
-            if service not in selected_services:
-                continue
+        for pos in self._matching_rules(self._dependency_index, selected):
+            rule = self.model.dependency_rules[pos]
+            service = rule.service
 
             # Check hard requirements
-            if "requires" in rule:
-                req = rule["requires"]
-                req_type = req.get("type")
-
+            req = rule.requires
+            if req is not None:
                 # Check if any service provides this type
-                providers = self._find_providers(req_type, selected_services)
-
-                if not providers:
-                    if req.get("auto_add", False):
+                if not self._has_provider(req.type, selected):
+                    if req.auto_add:
                         # Auto-add the preferred service
-                        preferred = req.get("preferred")
-                        if preferred:
+                        if req.preferred:
                             result["auto_add"].append(
                                 {
-                                    "service": preferred,
-                                    "reason": req.get(
-                                        "message", f"{service} requires {preferred}"
+                                    "service": req.preferred,
+                                    "reason": (
+                                        req.message
+                                        if req.message is not None
+                                        else f"{service} requires {req.preferred}"
                                     ),
                                 }
                             )
@@ -167,28 +327,28 @@ class IntegrationEngine:
                         result["warnings"].append(
                             {
                                 "service": service,
-                                "message": req.get(
-                                    "message", f"{service} requires {req_type}"
+                                "message": (
+                                    req.message
+                                    if req.message is not None
+                                    else f"{service} requires {req.type}"
                                 ),
                                 "level": "error",
                             }
                         )
 
             # Check recommendations
-            if "recommends" in rule:
-                rec = rule["recommends"]
-                rec_type = rec.get("type")
-
-                providers = self._find_providers(rec_type, selected_services)
-
-                if not providers:
+            rec = rule.recommends
+            if rec is not None:
+                if not self._has_provider(rec.type, selected):
                     result["warnings"].append(
                         {
                             "service": service,
-                            "message": rec.get(
-                                "message", f"{service} recommends {rec_type}"
+                            "message": (
+                                rec.message
+                                if rec.message is not None
+                                else f"{service} recommends {rec.type}"
                             ),
-                            "level": rec.get("level", "warning"),
+                            "level": rec.level or "warning",
                         }
                     )
 
@@ -197,52 +357,48 @@ class IntegrationEngine:
     def get_recommendations(self, selected_services: List[str]) -> List[Dict]:
         """Get recommendations for additional services based on current selection"""
         recommendations = []
+        selected = frozenset(selected_services)
 
-        rec_rules = self.integration_rules.get("recommendations", [])
-
-        for rule in rec_rules:
-            if_selected = rule.get("if_selected", [])
-            if_not_selected = rule.get("if_not_selected", [])
+        for pos in self._matching_rules(self._recommendation_index, selected):
+            rule = self.model.recommendation_rules[pos]
+            if_not_selected = rule.if_not_selected
 
             # Check if condition matches
-            if if_selected and all(s in selected_services for s in if_selected):
+            condition_met = bool(rule.if_selected) and rule.if_selected <= selected
+            if condition_met:
                 # Check if any required services are missing
-                if if_not_selected and all(
-                    s not in selected_services for s in if_not_selected
-                ):
+                if if_not_selected and selected.isdisjoint(if_not_selected):
                     recommendations.append(
                         {
-                            "message": rule["message"],
-                            "level": rule.get("level", "info"),
-                            "suggest": rule.get("suggest", []),
+                            "message": rule.message,
+                            "level": rule.level,
+                            "suggest": rule.suggest if rule.suggest is not None else [],
                         }
                     )
-                elif "suggest" in rule and not if_not_selected:
+                elif rule.suggest is not None and not if_not_selected:
                     # General suggestion
-                    missing = [s for s in rule["suggest"] if s not in selected_services]
+                    missing = [s for s in rule.suggest if s not in selected]
                     if missing:
                         recommendations.append(
                             {
-                                "message": rule["message"],
-                                "level": rule.get("level", "info"),
+                                "message": rule.message,
+                                "level": rule.level,
                                 "suggest": missing,
                             }
                         )
 
             # Check suggest_for pattern (e.g., Keycloak OAuth suggestion)
-            if "suggest_for" in rule:
-                suggest_for = rule["suggest_for"]
-                if if_selected and all(s in selected_services for s in if_selected):
-                    # Check which suggested services are selected
-                    applicable = [s for s in suggest_for if s in selected_services]
-                    if applicable:
-                        recommendations.append(
-                            {
-                                "message": rule["message"],
-                                "level": rule.get("level", "info"),
-                                "applies_to": applicable,
-                            }
-                        )
+            if rule.suggest_for is not None and condition_met:
+                # Check which suggested services are selected
+                applicable = [s for s in rule.suggest_for if s in selected]
+                if applicable:
+                    recommendations.append(
+                        {
+                            "message": rule.message,
+                            "level": rule.level,
+                            "applies_to": applicable,
+                        }
+                    )
 
         return recommendations
 
@@ -250,232 +406,231 @@ class IntegrationEngine:
         self, integration_type: str, selected_services: List[str]
     ) -> List[str]:
         """Find services that provide a specific integration type"""
-        providers = []
-
-        type_config = self.integration_types.get(integration_type, {})
-        type_providers = type_config.get("providers", [])
-
-        for service in selected_services:
-            if service in type_providers:
-                providers.append(service)
-
-        return providers
+        type_providers = self.model.providers(integration_type)
+        return [service for service in selected_services if service in type_providers]
+
+    def _has_provider(self, integration_type: str, selected: FrozenSet[str]) -> bool:
+        """Check whether any selected service provides a specific integration type"""
+        return not selected.isdisjoint(self.model.providers(integration_type))
+
+    def _service_integration(
+        self, service_id: str, integration_type: str
+    ) -> ServiceIntegration:
+        """Get a service's integration settings, or the defaults if it has none"""
+        integration = self.model.integration(service_id, integration_type)
+        if integration is None:
+            return ServiceIntegration.default(service_id, integration_type)
+        return integration
 
     def _detect_reverse_proxy(
-        self, provider: str, selected_services: List[str], instances: List[Dict]
+        self,
+        provider: str,
+        instances: List[Dict],
+        instances_by_app: Dict[str, List[Dict]],
     ) -> Dict:
         """Detect reverse proxy integrations"""
+        # Get provider capabilities
+        provider_integration = self._service_integration(provider, "reverse_proxy")
         integration = {
             "provider": provider,
             "targets": [],
-            "method": None,
+            "method": provider_integration.method,
             "config": {},
         }
 
-        # Get provider capabilities
-        provider_caps = self.service_capabilities.get(provider, {})
-        provider_integration = provider_caps.get("integrations", {}).get(
-            "reverse_proxy", {}
-        )
-        integration["method"] = provider_integration.get("method", "docker_labels")
-
-        # Find all web services that should be proxied
-        type_config = self.integration_types.get("reverse_proxy", {})
-        auto_targets = type_config.get("auto_configure_targets", [])
+        # Find all web service instances that should be proxied
+        auto_targets = self.model.types["reverse_proxy"].auto_configure_targets
+        target_integrations = {
+            service_id: self.model.integration(service_id, "reverse_proxy")
+            for service_id in instances_by_app
+            if service_id != provider and service_id in auto_targets
+        }
 
-        for service_id in selected_services:
-            if service_id == provider:
+        for instance in instances:
+            service_integration = target_integrations.get(instance["app_id"])
+            if service_integration is None:
                 continue
 
-            if service_id in auto_targets:
-                # Get service integration config
-                service_caps = self.service_capabilities.get(service_id, {})
-                service_integration = service_caps.get("integrations", {}).get(
-                    "reverse_proxy", {}
-                )
+            service_id = instance["app_id"]
+            # Use custom name from config, fallback to instance_name or service_id
+            custom_name = instance.get("config", {}).get("name")
+            subdomain = custom_name or instance.get("instance_name") or service_id
 
-                if service_integration:
-                    # Find instance details
-                    instance = next(
-                        (i for i in instances if i["app_id"] == service_id), None
-                    )
-                    if instance:
-                        # Use custom name from config, fallback to instance_name or service_id
-                        custom_name = instance.get("config", {}).get("name")
-                        subdomain = (
-                            custom_name or instance.get("instance_name") or service_id
-                        )
-
-                        target = {
-                            "service_id": service_id,
-                            "instance_name": instance.get("instance_name"),
-                            "ports": service_integration.get("ports", []),
-                            "default_subdomain": subdomain,
-                            "health_check": service_integration.get("health_check"),
-                        }
-                        integration["targets"].append(target)
+            target = {
+                "service_id": service_id,
+                "instance_name": instance.get("instance_name"),
+                "ports": service_integration.ports,
+                "default_subdomain": subdomain,
+                "health_check": service_integration.health_check,
+            }
+            integration["targets"].append(target)
 
         return integration
 
+    def _client_integrations(
+        self, integration_type: str, instances_by_app: Dict[str, List[Dict]]
+    ) -> Dict[str, ServiceIntegration]:
+        """Selected services acting as clients for an integration type"""
+        type_clients = self.model.clients.get(integration_type, {})
+        return {
+            service_id: type_clients[service_id]
+            for service_id in instances_by_app
+            if service_id in type_clients
+        }
+
     def _detect_oauth(
-        self, providers: List[str], selected_services: List[str], instances: List[Dict]
+        self,
+        providers: List[str],
+        instances: List[Dict],
+        instances_by_app: Dict[str, List[Dict]],
     ) -> Dict:
         """Detect OAuth/SSO integrations"""
         integration = {"providers": providers, "clients": []}
+        client_integrations = self._client_integrations(
+            "oauth_provider", instances_by_app
+        )
+        compatibility = self.model.compatibility.get("oauth_provider", {})
 
-        # For each provider, find compatible clients
+        # For each provider, find compatible client instances
         for provider_id in providers:
-            provider_caps = self.service_capabilities.get(provider_id, {})
-            provider_integration = provider_caps.get("integrations", {}).get(
-                "oauth_provider", {}
-            )
+            provider_integration = self.model.integration(provider_id, "oauth_provider")
 
-            if not provider_integration:
+            if provider_integration is None:
                 continue
 
-            client_configs = provider_integration.get("client_configs", {})
-
-            # Find selected services that can be OAuth clients
-            for service_id in selected_services:
-                service_caps = self.service_capabilities.get(service_id, {})
-                service_integration = service_caps.get("integrations", {}).get(
-                    "oauth_provider", {}
-                )
+            client_configs = provider_integration.client_configs
 
-                if service_integration and service_integration.get("type") == "client":
-                    supports = service_integration.get("supports", [])
+            for instance in instances:
+                service_id = instance["app_id"]
+                service_integration = client_integrations.get(service_id)
 
-                    if provider_id in supports:
-                        instance = next(
-                            (i for i in instances if i["app_id"] == service_id), None
-                        )
-                        if instance:
-                            client = {
-                                "service_id": service_id,
-                                "instance_name": instance.get("instance_name"),
-                                "provider": provider_id,
-                                "env_vars": service_integration.get("env_vars", {}),
-                                "client_config": client_configs.get(service_id, {}),
-                            }
-                            integration["clients"].append(client)
+                if service_integration and provider_id in compatibility[service_id]:
+                    client = {
+                        "service_id": service_id,
+                        "instance_name": instance.get("instance_name"),
+                        "provider": provider_id,
+                        "env_vars": service_integration.env_vars,
+                        "client_config": client_configs.get(service_id, {}),
+                    }
+                    integration["clients"].append(client)
 
         return integration
 
+    @staticmethod
+    def _match_providers(
+        provider_infos: List[Dict], compatible: FrozenSet[str], cache: Dict
+    ) -> List[Dict]:
+        """Providers compatible with a client, computed once per compatible set"""
+        if compatible not in cache:
+            cache[compatible] = [
+                p for p in provider_infos if p["service_id"] in compatible
+            ]
+        return list(cache[compatible])
+
     def _detect_database(
-        self, providers: List[str], selected_services: List[str], instances: List[Dict]
+        self,
+        providers: List[str],
+        instances: List[Dict],
+        instances_by_app: Dict[str, List[Dict]],
     ) -> Dict:
         """Detect database integrations"""
         integration = {"providers": [], "clients": []}
 
-        # Get provider details
+        # Get provider details for every provider instance
         for provider_id in providers:
-            instance = next((i for i in instances if i["app_id"] == provider_id), None)
-            if instance:
-                provider_caps = self.service_capabilities.get(provider_id, {})
-                provider_integration = provider_caps.get("integrations", {}).get(
-                    "db_provider", {}
-                )
+            provider_integration = self._service_integration(provider_id, "db_provider")
 
+            for instance in instances_by_app[provider_id]:
                 provider_info = {
                     "service_id": provider_id,
                     "instance_name": instance.get("instance_name"),
                     "config": instance.get("config", {}),
-                    "jdbc_url_template": provider_integration.get("jdbc_url_template"),
-                    "default_port": provider_integration.get("default_port"),
+                    "jdbc_url_template": provider_integration.jdbc_url_template,
+                    "default_port": provider_integration.default_port,
                 }
                 integration["providers"].append(provider_info)
 
-        # Find database clients
-        for service_id in selected_services:
-            service_caps = self.service_capabilities.get(service_id, {})
-            service_integration = service_caps.get("integrations", {}).get(
-                "db_provider", {}
-            )
+        # Find database client instances
+        client_integrations = self._client_integrations("db_provider", instances_by_app)
+        compatibility = self.model.compatibility.get("db_provider", {})
+        matches = {}
 
-            if service_integration and service_integration.get("type") == "client":
-                instance = next(
-                    (i for i in instances if i["app_id"] == service_id), None
-                )
-                if instance:
-                    client = {
-                        "service_id": service_id,
-                        "instance_name": instance.get("instance_name"),
-                        "supports": service_integration.get("supports", []),
-                        "auto_register": service_integration.get(
-                            "auto_register", False
-                        ),
-                        "jdbc_drivers": service_integration.get("jdbc_drivers", {}),
-                    }
+        for instance in instances:
+            service_integration = client_integrations.get(instance["app_id"])
+            if not service_integration:
+                continue
 
-                    # Match with compatible providers
-                    compatible_providers = [
-                        p
-                        for p in integration["providers"]
-                        if p["service_id"] in client["supports"]
-                    ]
-                    client["matched_providers"] = compatible_providers
+            client = {
+                "service_id": instance["app_id"],
+                "instance_name": instance.get("instance_name"),
+                "supports": service_integration.supports,
+                "auto_register": service_integration.auto_register,
+                "jdbc_drivers": service_integration.jdbc_drivers,
+            }
+
+            # Match with compatible providers
+            client["matched_providers"] = self._match_providers(
+                integration["providers"], compatibility[instance["app_id"]], matches
+            )
 
-                    integration["clients"].append(client)
+            integration["clients"].append(client)
 
         return integration
 
     def _detect_mqtt(
-        self, providers: List[str], selected_services: List[str], instances: List[Dict]
+        self,
+        providers: List[str],
+        instances: List[Dict],
+        instances_by_app: Dict[str, List[Dict]],
     ) -> Dict:
         """Detect MQTT broker integrations"""
         integration = {"providers": [], "clients": []}
 
-        # Get provider details
+        # Get provider details for every broker instance
         for provider_id in providers:
-            instance = next((i for i in instances if i["app_id"] == provider_id), None)
-            if instance:
-                provider_caps = self.service_capabilities.get(provider_id, {})
-                provider_integration = provider_caps.get("integrations", {}).get(
-                    "mqtt_broker", {}
-                )
+            provider_integration = self._service_integration(provider_id, "mqtt_broker")
 
+            for instance in instances_by_app[provider_id]:
                 provider_info = {
                     "service_id": provider_id,
                     "instance_name": instance.get("instance_name"),
-                    "mqtt_port": provider_integration.get("mqtt_port", 1883),
-                    "ws_port": provider_integration.get("ws_port"),
+                    "mqtt_port": provider_integration.mqtt_port,
+                    "ws_port": provider_integration.ws_port,
                 }
                 integration["providers"].append(provider_info)
 
-        # Find MQTT clients
-        for service_id in selected_services:
-            service_caps = self.service_capabilities.get(service_id, {})
-            service_integration = service_caps.get("integrations", {}).get(
-                "mqtt_broker", {}
-            )
+        # Find MQTT client instances
+        client_integrations = self._client_integrations("mqtt_broker", instances_by_app)
+        compatibility = self.model.compatibility.get("mqtt_broker", {})
+        matches = {}
 
-            if service_integration and service_integration.get("type") == "client":
-                instance = next(
-                    (i for i in instances if i["app_id"] == service_id), None
-                )
-                if instance:
-                    client = {
-                        "service_id": service_id,
-                        "instance_name": instance.get("instance_name"),
-                        "supports": service_integration.get("supports", []),
-                        "requires_module": service_integration.get("requires_module"),
-                        "config_file": service_integration.get("config_file"),
-                    }
+        for instance in instances:
+            service_integration = client_integrations.get(instance["app_id"])
+            if not service_integration:
+                continue
 
-                    # Match with compatible providers
-                    compatible_providers = [
-                        p
-                        for p in integration["providers"]
-                        if p["service_id"] in client["supports"]
-                    ]
-                    client["matched_providers"] = compatible_providers
+            client = {
+                "service_id": instance["app_id"],
+                "instance_name": instance.get("instance_name"),
+                "supports": service_integration.supports,
+                "requires_module": service_integration.requires_module,
+                "config_file": service_integration.config_file,
+            }
+
+            # Match with compatible providers
+            client["matched_providers"] = self._match_providers(
+                integration["providers"], compatibility[instance["app_id"]], matches
+            )
 
-                    integration["clients"].append(client)
+            integration["clients"].append(client)
 
         return integration
 
     def _detect_visualization(
-        self, providers: List[str], selected_services: List[str], instances: List[Dict]
+        self,
+        providers: List[str],
+        instances: List[Dict],
+        instances_by_app: Dict[str, List[Dict]],
     ) -> Dict:
         """Detect visualization (Grafana) datasource integrations"""
         integration = {
@@ -486,31 +641,30 @@ class IntegrationEngine:
         if not integration["provider"]:
             return integration
 
-        provider_caps = self.service_capabilities.get(integration["provider"], {})
-        provider_integration = provider_caps.get("integrations", {}).get(
-            "visualization", {}
+        provider_integration = self._service_integration(
+            integration["provider"], "visualization"
         )
-        datasource_types = provider_integration.get("datasource_types", {})
+        datasource_types = provider_integration.datasource_types
 
-        # Find compatible data sources
-        for service_id in selected_services:
+        # Every instance of a compatible service becomes a datasource
+        for instance in instances:
+            service_id = instance["app_id"]
             if service_id in datasource_types:
-                instance = next(
-                    (i for i in instances if i["app_id"] == service_id), None
-                )
-                if instance:
-                    datasource = {
-                        "service_id": service_id,
-                        "instance_name": instance.get("instance_name"),
-                        "type": datasource_types[service_id],
-                        "config": instance.get("config", {}),
-                    }
-                    integration["datasources"].append(datasource)
+                datasource = {
+                    "service_id": service_id,
+                    "instance_name": instance.get("instance_name"),
+                    "type": datasource_types[service_id],
+                    "config": instance.get("config", {}),
+                }
+                integration["datasources"].append(datasource)
 
         return integration
 
     def _detect_email(
-        self, providers: List[str], selected_services: List[str], instances: List[Dict]
+        self,
+        providers: List[str],
+        instances: List[Dict],
+        instances_by_app: Dict[str, List[Dict]],
     ) -> Dict:
         """Detect email testing (MailHog) integrations"""
         integration = {"provider": providers[0] if providers else None, "clients": []}
@@ -518,28 +672,20 @@ class IntegrationEngine:
         if not integration["provider"]:
             return integration
 
-        provider_instance = next(
-            (i for i in instances if i["app_id"] == integration["provider"]), None
+        # Find service instances that can use email
+        client_integrations = self._client_integrations(
+            "email_testing", instances_by_app
         )
 
-        # Find services that can use email
-        for service_id in selected_services:
-            service_caps = self.service_capabilities.get(service_id, {})
-            service_integration = service_caps.get("integrations", {}).get(
-                "email_testing", {}
-            )
-
-            if service_integration and service_integration.get("type") == "client":
-                instance = next(
-                    (i for i in instances if i["app_id"] == service_id), None
-                )
-                if instance:
-                    client = {
-                        "service_id": service_id,
-                        "instance_name": instance.get("instance_name"),
-                        "env_vars": service_integration.get("env_vars", {}),
-                    }
-                    integration["clients"].append(client)
+        for instance in instances:
+            service_integration = client_integrations.get(instance["app_id"])
+            if service_integration:
+                client = {
+                    "service_id": instance["app_id"],
+                    "instance_name": instance.get("instance_name"),
+                    "env_vars": service_integration.env_vars,
+                }
+                integration["clients"].append(client)
 
         return integration
 
@@ -552,8 +698,8 @@ class IntegrationEngine:
         https: bool = False,
     ) -> List[str]:
         """Generate Traefik labels for a service"""
-        template = self.config_templates.get(
-            "traefik_https_label" if https else "traefik_label", []
+        template = self.model.config_templates.get(
+            "traefik_https_label" if https else "traefik_label", ()
         )
 
         labels = []
@@ -616,13 +762,96 @@ class IntegrationEngine:
         return "\n".join(lines)
 
 
-# Singleton instance
-_engine = None
+def detection_cache_stats() -> Dict[str, int]:
+    """Size and hit/miss counters of the detection cache"""
+    return _detection_cache.stats()
+
+
+# Current engine snapshot. Requests take one reference and use it throughout,
+# so a reload never changes rules underneath an in-flight request.
+_engine: Optional[IntegrationEngine] = None
+_engine_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+_watcher_stop = threading.Event()
 
 
 def get_integration_engine() -> IntegrationEngine:
-    """Get or create the integration engine singleton"""
+    """Get the current integration engine snapshot (created on first use)"""
     global _engine
-    if _engine is None:
-        _engine = IntegrationEngine()
-    return _engine
+    engine = _engine
+    if engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = IntegrationEngine()
+            engine = _engine
+    return engine
+
+
+def reload_integration_engine() -> bool:
+    """
+    Rebuild the engine if integrations.json changed since the current snapshot
+
+    The new engine is built and validated before it is swapped in, so a
+    malformed file leaves the previous snapshot in place. Cached detection
+    results are keyed by engine version and need no explicit invalidation.
+
+    Returns:
+        True if a new snapshot was installed
+    """
+    global _engine
+    current = get_integration_engine()
+    try:
+        stat = os.stat(current.integrations_file)
+    except FileNotFoundError:
+        return False
+    if (stat.st_mtime_ns, stat.st_size) == current.stat_key:
+        return False
+
+    with _engine_lock:
+        current = _engine
+        try:
+            engine = IntegrationEngine(current.integrations_file)
+        except (IntegrationModelError, OSError) as e:
+            logger.error(f"Integrations reload failed, keeping current rules: {e}")
+            # Remember the stat so a broken file isn't rebuilt on every poll
+            current.stat_key = (stat.st_mtime_ns, stat.st_size)
+            return False
+
+        if engine.version == current.version:
+            current.stat_key = engine.stat_key
+            return False
+
+        _engine = engine
+
+    logger.info(
+        f"Reloaded {engine.integrations_file} "
+        f"({current.version[:12]} -> {engine.version[:12]})"
+    )
+    return True
+
+
+def start_integrations_watcher(interval: float):
+    """Poll integrations.json every interval seconds and hot-reload on change"""
+    global _watcher
+    if interval <= 0 or (_watcher is not None and _watcher.is_alive()):
+        return
+
+    def watch():
+        while not _watcher_stop.wait(interval):
+            try:
+                reload_integration_engine()
+            except Exception as e:
+                logger.error(f"Integrations watcher error: {e}")
+
+    _watcher_stop.clear()
+    _watcher = threading.Thread(target=watch, name="integrations-watcher", daemon=True)
+    _watcher.start()
+
+
+def stop_integrations_watcher():
+    """Stop the integrations.json watcher thread"""
+    global _watcher
+    _watcher_stop.set()
+    if _watcher is not None:
+        _watcher.join(timeout=5)
+        _watcher = None
@@ -0,0 +1,393 @@
+"""
+Typed, immutable model of integrations.json
+The file is validated and compiled once when the integration engine is built,
+so detection works on precomputed lookups instead of nested dict chains.
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+
+class IntegrationModelError(ValueError):
+    """integrations.json does not match the expected schema"""
+
+
+@dataclass(frozen=True, slots=True)
+class IntegrationType:
+    """An integration type and the services that provide it"""
+
+    id: str
+    name: str
+    providers: FrozenSet[str]
+    auto_configure_targets: FrozenSet[str]
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceIntegration:
+    """
+    One service's settings for one integration type
+
+    List and dict values are the parsed JSON objects and are copied into
+    detection results as-is, so they are shared and must not be mutated.
+    """
+
+    service_id: str
+    type_id: str
+    role: Optional[str]
+    supports: List[str]
+    supports_set: FrozenSet[str]
+    env_vars: Dict[str, str]
+    ports: List[Dict[str, Any]]
+    health_check: Optional[str]
+    method: str
+    client_configs: Dict[str, Dict[str, Any]]
+    jdbc_url_template: Optional[str]
+    default_port: Optional[int]
+    jdbc_drivers: Dict[str, str]
+    auto_register: bool
+    mqtt_port: int
+    ws_port: Optional[int]
+    requires_module: Optional[str]
+    config_file: Optional[str]
+    datasource_types: Dict[str, str]
+
+    @classmethod
+    def default(cls, service_id: str, type_id: str) -> "ServiceIntegration":
+        """Settings used when a service declares nothing for a type"""
+        return _parse_integration(service_id, type_id, {}, "")
+
+    @property
+    def is_client(self) -> bool:
+        return self.role == "client"
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceCapabilities:
+    """Everything integrations.json declares about one service"""
+
+    service_id: str
+    provides: Tuple[str, ...]
+    consumes: Tuple[str, ...]
+    integrations: Mapping[str, ServiceIntegration]
+
+
+@dataclass(frozen=True, slots=True)
+class ExclusivityRule:
+    """At most one service of the group may be selected"""
+
+    group: str
+    services: FrozenSet[str]
+    message: str
+    level: str
+
+
+@dataclass(frozen=True, slots=True)
+class Requirement:
+    """A "requires" or "recommends" clause of a dependency rule"""
+
+    type: Optional[str]
+    message: Optional[str]
+    level: Optional[str]
+    auto_add: bool
+    preferred: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class DependencyRule:
+    """Integration types a service requires or recommends"""
+
+    service: str
+    requires: Optional[Requirement]
+    recommends: Optional[Requirement]
+
+
+@dataclass(frozen=True, slots=True)
+class RecommendationRule:
+    """Suggestion shown when every if_selected service is selected"""
+
+    message: str
+    level: str
+    if_selected: FrozenSet[str]
+    if_not_selected: Tuple[str, ...]
+    suggest: Optional[List[str]]
+    suggest_for: Optional[Tuple[str, ...]]
+
+
+@dataclass(frozen=True, slots=True)
+class IntegrationModel:
+    """Compiled integrations.json plus the lookup tables derived from it"""
+
+    version: str
+    types: Mapping[str, IntegrationType]
+    services: Mapping[str, ServiceCapabilities]
+    exclusivity_rules: Tuple[ExclusivityRule, ...]
+    dependency_rules: Tuple[DependencyRule, ...]
+    recommendation_rules: Tuple[RecommendationRule, ...]
+    config_templates: Mapping[str, Tuple[str, ...]]
+    # service id -> integration types it provides
+    provider_types: Mapping[str, FrozenSet[str]]
+    # integration type -> {client service id: its integration settings}
+    clients: Mapping[str, Mapping[str, ServiceIntegration]]
+    # integration type -> {client service id: providers of that type it supports}
+    compatibility: Mapping[str, Mapping[str, FrozenSet[str]]]
+
+    @classmethod
+    def empty(cls) -> "IntegrationModel":
+        """Model used when no integrations file is available"""
+        return cls.from_dict({}, version="")
+
+    @classmethod
+    def from_dict(cls, data: Any, version: str) -> "IntegrationModel":
+        """
+        Validate and compile parsed integrations.json
+
+        Raises:
+            IntegrationModelError: naming the first offending JSON path
+        """
+        _expect(data, dict, "$")
+
+        types = {
+            type_id: _parse_type(type_id, config, f"$.integration_types.{type_id}")
+            for type_id, config in _mapping(data, "integration_types", "$").items()
+        }
+        services = {
+            service_id: _parse_service(
+                service_id, caps, f"$.service_capabilities.{service_id}"
+            )
+            for service_id, caps in _mapping(data, "service_capabilities", "$").items()
+        }
+
+        rules = _mapping(data, "integration_rules", "$")
+        exclusivity_rules = tuple(
+            _parse_exclusivity(rule, f"$.integration_rules.mutual_exclusivity[{i}]")
+            for i, rule in enumerate(
+                _sequence(rules, "mutual_exclusivity", "$.integration_rules")
+            )
+        )
+        dependency_rules = tuple(
+            _parse_dependency(rule, f"$.integration_rules.dependencies[{i}]")
+            for i, rule in enumerate(
+                _sequence(rules, "dependencies", "$.integration_rules")
+            )
+        )
+        recommendation_rules = tuple(
+            _parse_recommendation(rule, f"$.integration_rules.recommendations[{i}]")
+            for i, rule in enumerate(
+                _sequence(rules, "recommendations", "$.integration_rules")
+            )
+        )
+
+        config_templates = {
+            name: tuple(_strings(template, f"$.config_templates.{name}"))
+            for name, template in _mapping(data, "config_templates", "$").items()
+        }
+
+        provider_types: Dict[str, set] = {}
+        for type_id, integration_type in types.items():
+            for service_id in integration_type.providers:
+                provider_types.setdefault(service_id, set()).add(type_id)
+
+        clients: Dict[str, Dict[str, ServiceIntegration]] = {}
+        compatibility: Dict[str, Dict[str, FrozenSet[str]]] = {}
+        for service_id, caps in services.items():
+            for type_id, integration in caps.integrations.items():
+                if not integration.is_client:
+                    continue
+                clients.setdefault(type_id, {})[service_id] = integration
+                type_providers = types[type_id].providers if type_id in types else ()
+                compatibility.setdefault(type_id, {})[service_id] = (
+                    integration.supports_set.intersection(type_providers)
+                )
+
+        return cls(
+            version=version,
+            types=MappingProxyType(types),
+            services=MappingProxyType(services),
+            exclusivity_rules=exclusivity_rules,
+            dependency_rules=dependency_rules,
+            recommendation_rules=recommendation_rules,
+            config_templates=MappingProxyType(config_templates),
+            provider_types=MappingProxyType(
+                {service: frozenset(ids) for service, ids in provider_types.items()}
+            ),
+            clients=MappingProxyType(
+                {k: MappingProxyType(v) for k, v in clients.items()}
+            ),
+            compatibility=MappingProxyType(
+                {k: MappingProxyType(v) for k, v in compatibility.items()}
+            ),
+        )
+
+    def integration(
+        self, service_id: str, integration_type: str
+    ) -> Optional[ServiceIntegration]:
+        """A service's settings for one integration type, if it declares any"""
+        caps = self.services.get(service_id)
+        if caps is None:
+            return None
+        return caps.integrations.get(integration_type)
+
+    def providers(self, integration_type: str) -> FrozenSet[str]:
+        """Services providing an integration type"""
+        integration_type = self.types.get(integration_type)
+        return integration_type.providers if integration_type else frozenset()
+
+
+def _parse_type(type_id: str, config: Any, path: str) -> IntegrationType:
+    _expect(config, dict, path)
+    return IntegrationType(
+        id=type_id,
+        name=_optional(config, "name", str, path) or type_id,
+        providers=frozenset(_strings(config.get("providers", []), f"{path}.providers")),
+        auto_configure_targets=frozenset(
+            _strings(
+                config.get("auto_configure_targets", []),
+                f"{path}.auto_configure_targets",
+            )
+        ),
+    )
+
+
+def _parse_service(service_id: str, caps: Any, path: str) -> ServiceCapabilities:
+    _expect(caps, dict, path)
+    integrations = {
+        type_id: _parse_integration(
+            service_id, type_id, config, f"{path}.integrations.{type_id}"
+        )
+        for type_id, config in _mapping(caps, "integrations", path).items()
+    }
+    return ServiceCapabilities(
+        service_id=service_id,
+        provides=tuple(_strings(caps.get("provides", []), f"{path}.provides")),
+        consumes=tuple(_strings(caps.get("consumes", []), f"{path}.consumes")),
+        integrations=MappingProxyType(integrations),
+    )
+
+
+def _parse_integration(
+    service_id: str, type_id: str, config: Any, path: str
+) -> ServiceIntegration:
+    _expect(config, dict, path)
+    supports = _strings(config.get("supports", []), f"{path}.supports")
+    return ServiceIntegration(
+        service_id=service_id,
+        type_id=type_id,
+        role=_optional(config, "type", str, path),
+        supports=supports,
+        supports_set=frozenset(supports),
+        env_vars=_mapping(config, "env_vars", path),
+        ports=_sequence(config, "ports", path),
+        health_check=_optional(config, "health_check", str, path),
+        method=_optional(config, "method", str, path) or "docker_labels",
+        client_configs=_mapping(config, "client_configs", path),
+        jdbc_url_template=_optional(config, "jdbc_url_template", str, path),
+        default_port=_optional(config, "default_port", int, path),
+        jdbc_drivers=_mapping(config, "jdbc_drivers", path),
+        auto_register=bool(config.get("auto_register", False)),
+        mqtt_port=config.get("mqtt_port", 1883),
+        ws_port=_optional(config, "ws_port", int, path),
+        requires_module=_optional(config, "requires_module", str, path),
+        config_file=_optional(config, "config_file", str, path),
+        datasource_types=_mapping(config, "datasource_types", path),
+    )
+
+
+def _parse_exclusivity(rule: Any, path: str) -> ExclusivityRule:
+    _expect(rule, dict, path)
+    return ExclusivityRule(
+        group=_required(rule, "group", str, path),
+        services=frozenset(_strings(_required(rule, "services", list, path), path)),
+        message=_required(rule, "message", str, path),
+        level=_optional(rule, "level", str, path) or "error",
+    )
+
+
+def _parse_requirement(requirement: Any, path: str) -> Requirement:
+    _expect(requirement, dict, path)
+    return Requirement(
+        type=_optional(requirement, "type", str, path),
+        message=_optional(requirement, "message", str, path),
+        level=_optional(requirement, "level", str, path),
+        auto_add=bool(requirement.get("auto_add", False)),
+        preferred=_optional(requirement, "preferred", str, path),
+    )
+
+
+def _parse_dependency(rule: Any, path: str) -> DependencyRule:
+    _expect(rule, dict, path)
+    return DependencyRule(
+        service=_required(rule, "service", str, path),
+        requires=(
+            _parse_requirement(rule["requires"], f"{path}.requires")
+            if "requires" in rule
+            else None
+        ),
+        recommends=(
+            _parse_requirement(rule["recommends"], f"{path}.recommends")
+            if "recommends" in rule
+            else None
+        ),
+    )
+
+
+def _parse_recommendation(rule: Any, path: str) -> RecommendationRule:
+    _expect(rule, dict, path)
+    suggest = rule.get("suggest")
+    suggest_for = rule.get("suggest_for")
+    return RecommendationRule(
+        message=_required(rule, "message", str, path),
+        level=_optional(rule, "level", str, path) or "info",
+        if_selected=frozenset(
+            _strings(rule.get("if_selected", []), f"{path}.if_selected")
+        ),
+        if_not_selected=tuple(
+            _strings(rule.get("if_not_selected", []), f"{path}.if_not_selected")
+        ),
+        suggest=_strings(suggest, f"{path}.suggest") if "suggest" in rule else None,
+        suggest_for=(
+            tuple(_strings(suggest_for, f"{path}.suggest_for"))
+            if "suggest_for" in rule
+            else None
+        ),
+    )
+
+
+def _expect(value: Any, expected: type, path: str):
+    if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+        raise IntegrationModelError(
+            f"{path}: expected {expected.__name__}, got {type(value).__name__}"
+        )
+
+
+def _required(data: Dict, key: str, expected: type, path: str) -> Any:
+    if key not in data:
+        raise IntegrationModelError(f"{path}: missing required key '{key}'")
+    _expect(data[key], expected, f"{path}.{key}")
+    return data[key]
+
+
+def _optional(data: Dict, key: str, expected: type, path: str) -> Any:
+    value = data.get(key)
+    if value is not None:
+        _expect(value, expected, f"{path}.{key}")
+    return value
+
+
+def _mapping(data: Dict, key: str, path: str) -> Dict:
+    value = data.get(key, {})
+    _expect(value, dict, f"{path}.{key}")
+    return value
+
+
+def _sequence(data: Dict, key: str, path: str) -> List:
+    value = data.get(key, [])
+    _expect(value, list, f"{path}.{key}")
+    return value
+
+
+def _strings(value: Any, path: str) -> List[str]:
+    _expect(value, list, path)
+    for i, item in enumerate(value):
+        _expect(item, str, f"{path}[{i}]")
+    return value
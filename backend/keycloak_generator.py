@@ -1,17 +1,118 @@
 """
 Keycloak realm configuration generator
 Generates realm-import.json for automatic OAuth/SSO setup
+Client secrets are random, or derived from a per-stack secret key when the
+same stack must always produce the same realm (deterministic downloads).
 """
 
+import base64
 import hashlib
+import hmac
 import json
+import logging
+import os
 import secrets
+import tempfile
+import threading
 from typing import Any, Dict, List, Optional
 
+logger = logging.getLogger(__name__)
+
+# Server key once it has been loaded (failures are retried on next use)
+_secret_key: Optional[bytes] = None
+_secret_key_lock = threading.Lock()
+
+
+def _create_key_exclusive(path: str, key: str):
+    """Create path holding key unless it already exists"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+    except FileExistsError:
+        return
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+
+
+def _load_or_create_key(path: str) -> bytes:
+    """Key stored in path, generated there first if the file does not exist"""
+    try:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    key = secrets.token_urlsafe(32)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(key)
+        # Fails if another worker created the file first; its key wins
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    except OSError:
+        # No hard links on this filesystem (some bind mounts, SMB)
+        _create_key_exclusive(path, key)
+    finally:
+        os.unlink(tmp_path)
+    with open(path, "rb") as f:
+        return f.read().strip()
+
+
+def deterministic_secret_key() -> Optional[bytes]:
+    """
+    Server key behind derived client secrets, or None if none is configured
+
+    DETERMINISTIC_SECRET_KEY wins; otherwise a key is generated once into
+    DETERMINISTIC_SECRET_KEY_FILE, so every worker and restart shares it.
+    Only a loaded key is kept, so a missing key is looked up again next time.
+    """
+    global _secret_key
+    if _secret_key is not None:
+        return _secret_key
+    with _secret_key_lock:
+        if _secret_key is None:
+            _secret_key = _load_secret_key()
+        return _secret_key
+
+
+def _load_secret_key() -> Optional[bytes]:
+    key = os.getenv("DETERMINISTIC_SECRET_KEY", "")
+    if key:
+        return key.encode()
+    path = os.getenv("DETERMINISTIC_SECRET_KEY_FILE", "")
+    if not path:
+        return None
+    try:
+        return _load_or_create_key(path) or None
+    except OSError as e:
+        logger.error(f"Could not load deterministic secret key from {path}: {e}")
+        return None
+
+
+def derive_secret_key(stack_digest: str) -> bytes:
+    """
+    Secret key for the client secrets of one stack (by its content hash)
 
-def generate_client_secret(service_name: str) -> str:
-    """Generate a secure client secret"""
-    return secrets.token_urlsafe(32)
+    Raises ValueError when no server key is configured.
+    """
+    server_key = deterministic_secret_key()
+    if server_key is None:
+        raise ValueError("No deterministic secret key is configured")
+    return hmac.new(server_key, stack_digest.encode(), hashlib.sha256).digest()
+
+
+def generate_client_secret(
+    service_name: str, secret_key: Optional[bytes] = None
+) -> str:
+    """Generate a secure client secret (derived from secret_key if given)"""
+    if secret_key is None:
+        return secrets.token_urlsafe(32)
+    digest = hmac.new(secret_key, service_name.encode(), hashlib.sha256).digest()
+    # Same alphabet and length as token_urlsafe(32)
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
 
 
 def generate_keycloak_realm(
@@ -20,6 +121,7 @@ def generate_keycloak_realm(
     users: List[Dict[str, Any]] = None,
     base_domain: str = "localhost",
     enable_https: bool = False,
+    secret_key: Optional[bytes] = None,
 ) -> Dict[str, Any]:
     """
     Generate a complete Keycloak realm configuration
@@ -30,6 +132,7 @@ def generate_keycloak_realm(
         users: List of users to import
         base_domain: Base domain for redirect URIs
         enable_https: Whether to use HTTPS URLs
+        secret_key: Derive client secrets from this key instead of randomly
 
     Returns:
         Complete realm configuration as dict
@@ -185,16 +288,24 @@ def generate_keycloak_realm(
     clients = []
 
     if "grafana" in services:
-        clients.append(_generate_grafana_client(realm_name, base_domain, protocol))
+        clients.append(
+            _generate_grafana_client(realm_name, base_domain, protocol, secret_key)
+        )
 
     if "n8n" in services:
-        clients.append(_generate_n8n_client(realm_name, base_domain, protocol))
+        clients.append(
+            _generate_n8n_client(realm_name, base_domain, protocol, secret_key)
+        )
 
     if "portainer" in services:
-        clients.append(_generate_portainer_client(realm_name, base_domain, protocol))
+        clients.append(
+            _generate_portainer_client(realm_name, base_domain, protocol, secret_key)
+        )
 
     if "ignition" in services:
-        clients.append(_generate_ignition_client(realm_name, base_domain, protocol))
+        clients.append(
+            _generate_ignition_client(realm_name, base_domain, protocol, secret_key)
+        )
 
     realm["clients"] = clients
 
@@ -237,11 +348,14 @@ def _generate_user(user_data: Dict[str, Any], realm_name: str) -> Dict[str, Any]
 
 
 def _generate_grafana_client(
-    realm_name: str, base_domain: str, protocol: str
+    realm_name: str,
+    base_domain: str,
+    protocol: str,
+    secret_key: Optional[bytes] = None,
 ) -> Dict[str, Any]:
     """Generate Grafana OAuth client configuration"""
 
-    client_secret = generate_client_secret("grafana")
+    client_secret = generate_client_secret("grafana", secret_key)
     redirect_uri = f"{protocol}://grafana.{base_domain}/*"
 
     return {
@@ -300,11 +414,14 @@ def _generate_grafana_client(
 
 
 def _generate_n8n_client(
-    realm_name: str, base_domain: str, protocol: str
+    realm_name: str,
+    base_domain: str,
+    protocol: str,
+    secret_key: Optional[bytes] = None,
 ) -> Dict[str, Any]:
     """Generate n8n OAuth client configuration"""
 
-    client_secret = generate_client_secret("n8n")
+    client_secret = generate_client_secret("n8n", secret_key)
 
     return {
         "clientId": "n8n",
@@ -327,11 +444,14 @@ def _generate_n8n_client(
 
 
 def _generate_portainer_client(
-    realm_name: str, base_domain: str, protocol: str
+    realm_name: str,
+    base_domain: str,
+    protocol: str,
+    secret_key: Optional[bytes] = None,
 ) -> Dict[str, Any]:
     """Generate Portainer OAuth client configuration"""
 
-    client_secret = generate_client_secret("portainer")
+    client_secret = generate_client_secret("portainer", secret_key)
 
     return {
         "clientId": "portainer",
@@ -351,11 +471,14 @@ def _generate_portainer_client(
 
 
 def _generate_ignition_client(
-    realm_name: str, base_domain: str, protocol: str
+    realm_name: str,
+    base_domain: str,
+    protocol: str,
+    secret_key: Optional[bytes] = None,
 ) -> Dict[str, Any]:
     """Generate Ignition OAuth client configuration (for future IdP module support)"""
 
-    client_secret = generate_client_secret("ignition")
+    client_secret = generate_client_secret("ignition", secret_key)
 
     return {
         "clientId": "ignition",
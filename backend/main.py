@@ -4,42 +4,107 @@ FastAPI backend for generating Docker Compose stacks for industrial IoT applicat
 """
 
 import base64
+import hashlib
 import io
+import itertools
 import json
 import logging
-import zipfile
-from typing import Any, Dict, List, Optional
+import os
+from functools import cached_property, partial
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
-import yaml
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 
 # Import authentication and user management routers
 import auth_router
 import settings_router
 import stacks_router
+from archive_stream import (
+    ArchiveEntry,
+    ArchiveFormat,
+    archive_etag,
+    get_archive_format,
+)
+from artifact_store import ACCEL_PREFIX_HEADER, get_artifact_store
+from cache_utils import canonical_hash
+from catalog_store import CatalogIndex, get_catalog_store
 from config_generator import (
-    generate_email_env_vars,
     generate_grafana_datasources,
     generate_mosquitto_config,
     generate_mosquitto_password_file,
-    generate_oauth_env_vars,
     generate_prometheus_config,
     generate_traefik_dynamic_config,
     generate_traefik_static_config,
 )
+from config_stage import ConfigFileStage
 from database import check_db_connection
+from detection_batch import MAX_BATCH_SIZE, detect_batch, detect_with_summary
+from detection_delta import apply_detection_delta
 from docker_hub import get_docker_tags, get_ignition_versions, get_postgres_versions
+from generation_cache import generation_cache_key, get_generation_cache
+from generation_stream import (
+    PART_COMPOSE,
+    PART_CONFIG_FILES,
+    PART_ENV,
+    PART_README,
+    SECTION_COMPOSE,
+    SECTION_CONFIG_FILE,
+    SECTION_ENV,
+    SECTION_README,
+    SECTION_SETTINGS,
+    STACK_PARTS,
+    STREAM_MEDIA_TYPES,
+    Section,
+    collect_sections,
+    parse_parts,
+    project_result,
+    replay_sections,
+    stream_sections,
+    tee_sections,
+)
+from http_cache import etag_matches
 from ignition_db_registration import (
     generate_ignition_db_readme_section,
     generate_ignition_db_registration_script,
     generate_requirements_file,
 )
-from integration_engine import get_integration_engine
-from keycloak_generator import generate_keycloak_readme_section, generate_keycloak_realm
+from integration_engine import (
+    IntegrationEngine,
+    detection_cache_stats,
+    get_integration_engine,
+    start_integrations_watcher,
+    stop_integrations_watcher,
+)
+from keycloak_generator import (
+    derive_secret_key,
+    deterministic_secret_key,
+    generate_keycloak_readme_section,
+    generate_keycloak_realm,
+)
+from module_store import get_module_store
 from ntfy_monitor import generate_ntfy_monitor_script, generate_ntfy_readme_section
+from port_allocator import PortAllocation, allocate_host_ports, reported_host_port
+from service_renderers import RenderInputs, get_renderer_registry
+from stack_fragments import (
+    assemble_compose_yaml,
+    cached_config_file,
+    fragment_cache_stats,
+    render_fragment,
+)
+from stack_templates import (
+    LOAD_IMAGES_SH,
+    OFFLINE_INSTRUCTIONS,
+    OFFLINE_README,
+    PULL_IMAGES_SH,
+    README,
+    START_BAT,
+    START_SH,
+    load_templates,
+    render_template,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -67,16 +132,34 @@ app.include_router(settings_router.router, prefix="/api")
 async def startup_event():
     """Check database connection on startup"""
     logger.info("Starting IIoT Stack Builder API...")
+    get_catalog_store().get()
+    # Fail fast on a malformed integrations.json instead of on first request
+    get_integration_engine()
+    load_templates()
+    start_integrations_watcher(float(os.getenv("INTEGRATIONS_RELOAD_INTERVAL", "2")))
     if check_db_connection():
         logger.info("✓ Database connection established")
     else:
         logger.warning("⚠ Database connection failed - auth features may not work")
 
 
+@app.on_event("shutdown")
+def shutdown_event():
+    """Stop background watchers"""
+    stop_integrations_watcher()
+
+
 def load_catalog():
-    """Load the application catalog from catalog.json"""
-    with open("catalog.json", "r") as f:
-        return json.load(f)
+    """
+    Get the application catalog from the process-wide catalog store
+    The returned dict is shared between requests and must not be mutated.
+    """
+    return get_catalog_store().get().data
+
+
+def load_catalog_index():
+    """Get the precomputed CatalogIndex for the current catalog"""
+    return get_catalog_store().get().index
 
 
 class InstanceConfig(BaseModel):
@@ -133,33 +216,78 @@ class StackConfig(BaseModel):
     integration_settings: Optional[IntegrationSettings] = None
 
 
+class DetectionBatch(BaseModel):
+    """Several stack configurations to run integration detection on"""
+
+    stacks: List[StackConfig]
+
+
+class DetectionDelta(BaseModel):
+    """Instance changes since the detection state identified by token"""
+
+    token: Optional[str] = None
+    add: List[InstanceConfig] = []
+    remove: List[str] = []
+    modify: List[InstanceConfig] = []
+
+
+def detection_instances(instances: List[InstanceConfig]) -> List[Dict[str, Any]]:
+    """Convert instances to the dict format used by the integration engine"""
+    return [
+        {
+            "app_id": inst.app_id,
+            "instance_name": inst.instance_name,
+            "config": inst.config,
+        }
+        for inst in instances
+    ]
+
+
 @app.get("/")
 def read_root():
     return {"message": "IIoT Stack Builder API", "version": "1.0.0"}
 
 
 @app.get("/api/catalog")
-def get_catalog():
-    """Get the application catalog"""
-    return load_catalog()
+def get_catalog(request: Request):
+    """Get the application catalog (supports If-None-Match / 304)"""
+    snapshot = get_catalog_store().get()
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=snapshot.body, media_type="application/json", headers=headers
+    )
+
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters of the generation, fragment and detection caches and stores"""
+    return {
+        "generation": get_generation_cache().stats(),
+        "artifacts": get_artifact_store().stats(),
+        "modules": get_module_store().stats(),
+        "fragments": fragment_cache_stats(),
+        "detection": detection_cache_stats(),
+    }
 
 
 @app.post("/validate-config")
 def validate_config(config: StackConfig):
     """Validate and sanitize an imported stack configuration"""
     try:
-        catalog = load_catalog()
-        catalog_dict = {app["id"]: app for app in catalog["applications"]}
+        catalog_index = load_catalog_index()
 
         # Validate all instances reference valid apps
         for instance in config.instances:
-            if instance.app_id not in catalog_dict:
+            if catalog_index.get(instance.app_id) is None:
                 raise HTTPException(
                     status_code=400, detail=f"Invalid app_id: {instance.app_id}"
                 )
 
-            app = catalog_dict[instance.app_id]
-            if not app.get("enabled", False):
+            if not catalog_index.is_enabled(instance.app_id):
                 raise HTTPException(
                     status_code=400, detail=f"App {instance.app_id} is not enabled"
                 )
@@ -187,8 +315,7 @@ def get_versions(app_id: str):
             versions = get_postgres_versions()
         else:
             # For other apps, try to fetch from catalog and Docker Hub
-            catalog = load_catalog()
-            app = next((a for a in catalog["applications"] if a["id"] == app_id), None)
+            app = load_catalog_index().get(app_id)
             if app and "image" in app:
                 versions = get_docker_tags(app["image"], limit=50)
                 if not versions:
@@ -201,30 +328,25 @@ def get_versions(app_id: str):
     except Exception as e:
         logger.error(f"Error fetching versions for {app_id}: {e}")
         # Fallback to catalog versions
-        catalog = load_catalog()
-        app = next((a for a in catalog["applications"] if a["id"] == app_id), None)
+        app = load_catalog_index().get(app_id)
         if app:
             return {"versions": app.get("available_versions", ["latest"])}
         return {"versions": ["latest"]}
 
 
 @app.post("/upload-module")
-async def upload_module(file: UploadFile = File(...)):
+def upload_module(file: UploadFile = File(...)):
     """
     Upload a 3rd party Ignition module file (.modl)
-    Returns base64 encoded file content that can be included in the stack
+    The file is streamed to the module store; the returned filename, size
+    and sha256 go into the instance's uploaded_modules to include it.
     """
-    try:
-        if not file.filename.endswith(".modl"):
-            raise HTTPException(status_code=400, detail="Only .modl files are allowed")
-
-        # Read file content
-        content = await file.read()
-
-        # Encode as base64 for storage/transfer
-        encoded = base64.b64encode(content).decode("utf-8")
+    if not file.filename.endswith(".modl"):
+        raise HTTPException(status_code=400, detail="Only .modl files are allowed")
 
-        return {"filename": file.filename, "size": len(content), "encoded": encoded}
+    try:
+        sha256, size = get_module_store().save(file.file)
+        return {"filename": file.filename, "size": size, "sha256": sha256}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -237,1450 +359,1144 @@ def detect_integrations(stack_config: StackConfig):
     """
     try:
         # Convert instances to dict format for integration engine
-        instances = [
-            {
-                "app_id": inst.app_id,
-                "instance_name": inst.instance_name,
-                "config": inst.config,
-            }
-            for inst in stack_config.instances
-        ]
-
-        # Get integration engine and detect integrations
-        engine = get_integration_engine()
-        detection_result = engine.detect_integrations(instances)
-
-        # Add human-readable summary
-        detection_result["summary"] = engine.get_integration_summary(detection_result)
+        instances = detection_instances(stack_config.instances)
 
-        return detection_result
+        # Detect integrations and add human-readable summary
+        return detect_with_summary(get_integration_engine(), instances)
 
     except Exception as e:
         logger.error(f"Error detecting integrations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/generate")
-def generate_stack(stack_config: StackConfig):
-    """Generate docker-compose.yml and configuration files"""
-    try:
-        catalog = load_catalog()
-        catalog_dict = {app["id"]: app for app in catalog["applications"]}
-
-        # Get global settings
-        global_settings = stack_config.global_settings or GlobalSettings()
-
-        # Get integration settings
-        integration_settings = (
-            stack_config.integration_settings or IntegrationSettings()
+@app.post("/detect-integrations/batch")
+def detect_integrations_batch(batch: DetectionBatch):
+    """
+    Detect integrations for many stacks in one request
+    Streams one NDJSON line per stack, in input order:
+    {"index": 0, "result": {...}} or {"index": 0, "error": "..."}
+    """
+    if len(batch.stacks) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch.stacks)} stacks (max {MAX_BATCH_SIZE})",
         )
 
-        # Detect integrations
-        instances_for_detection = [
-            {
-                "app_id": inst.app_id,
-                "instance_name": inst.instance_name,
-                "config": inst.config,
-            }
-            for inst in stack_config.instances
-        ]
-        engine = get_integration_engine()
-        integration_results = engine.detect_integrations(instances_for_detection)
-
-        # Build docker compose structure
-        stack_name = global_settings.stack_name
-        compose = {
-            "name": stack_name,
-            "services": {},
-            "networks": {f"{stack_name}-network": {"driver": "bridge"}},
-            "volumes": {},
-        }
+    # One engine for the whole batch, even if integrations.json is reloaded
+    engine = get_integration_engine()
+    stacks = [detection_instances(stack.instances) for stack in batch.stacks]
 
-        # Track generated config files
-        config_files = {}
+    return StreamingResponse(
+        detect_batch(engine, stacks), media_type="application/x-ndjson"
+    )
 
-        env_vars = []
-        env_vars.append("# Global Settings")
-        env_vars.append(f"TZ={global_settings.timezone}")
-        env_vars.append(f"RESTART_POLICY={global_settings.restart_policy}")
-        env_vars.append("")
 
-        # Check if Traefik is in the stack
-        has_traefik = any(inst.app_id == "traefik" for inst in stack_config.instances)
-        has_oauth_provider = "oauth_provider" in integration_results.get(
-            "integrations", {}
+@app.post("/detect-integrations/delta")
+def detect_integrations_delta(delta: DetectionDelta):
+    """
+    Incrementally re-detect integrations after instance edits
+    Returns only the changed sections plus a token to send with the next delta.
+    A 409 means the token is unknown; resend the full stack with token=null.
+    """
+    try:
+        result = apply_detection_delta(
+            get_integration_engine(),
+            delta.token,
+            add=detection_instances(delta.add),
+            remove=delta.remove,
+            modify=detection_instances(delta.modify),
         )
-        has_email_testing = "email_testing" in integration_results.get(
-            "integrations", {}
+    except Exception as e:
+        logger.error(f"Error applying detection delta: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result is None:
+        raise HTTPException(
+            status_code=409, detail="Unknown or expired detection token"
         )
-        has_mqtt_broker = "mqtt_broker" in integration_results.get("integrations", {})
 
-        # Pre-generate Keycloak realm configuration if needed (for OAuth client secrets)
-        keycloak_clients = []
-        keycloak_realm_config = None
-        if has_oauth_provider and integration_settings.oauth.get(
-            "auto_configure_services", True
-        ):
-            oauth_int = integration_results["integrations"]["oauth_provider"]
-            keycloak_providers = [
-                p for p in oauth_int.get("providers", []) if p == "keycloak"
-            ]
-
-            if keycloak_providers:
-                # Get list of services that will be OAuth clients
-                oauth_client_services = [
-                    client["service_id"] for client in oauth_int.get("clients", [])
-                ]
-
-                # Get users from integration settings
-                realm_users = integration_settings.oauth.get("realm_users", [])
-
-                # Generate realm configuration
-                realm_name = integration_settings.oauth.get("realm_name", "iiot")
-                base_domain = integration_settings.reverse_proxy.get(
-                    "base_domain", "localhost"
-                )
-                enable_https = integration_settings.reverse_proxy.get(
-                    "enable_https", False
-                )
+    return result
 
-                keycloak_realm_config = generate_keycloak_realm(
-                    realm_name=realm_name,
-                    services=oauth_client_services,
-                    users=realm_users,
-                    base_domain=base_domain,
-                    enable_https=enable_https,
-                )
 
-                # Store clients for use in OAuth env vars and README
-                keycloak_clients = keycloak_realm_config.get("clients", [])
+def normalize_stack_config(stack_config: StackConfig) -> Dict[str, Any]:
+    """
+    Canonical dict form of a StackConfig for cache keys
+    Defaults are filled in and UI-only fields (instanceId) are dropped, so
+    configs that generate the same stack normalize to the same value.
+    """
+    return {
+        "instances": [
+            inst.model_dump(exclude={"instanceId"}) for inst in stack_config.instances
+        ],
+        "integrations": stack_config.integrations,
+        "global_settings": (
+            stack_config.global_settings or GlobalSettings()
+        ).model_dump(),
+        "integration_settings": (
+            stack_config.integration_settings or IntegrationSettings()
+        ).model_dump(),
+    }
 
-        # Handle pgadmin/phpmyadmin checkboxes - add instances dynamically
-        instances_to_process = list(stack_config.instances)
-        for instance in stack_config.instances:
-            if instance.app_id == "postgres" and instance.config.get("include_pgadmin"):
-                # Add pgAdmin instance
-                pgadmin_instance = InstanceConfig(
-                    app_id="pgadmin",
-                    instance_name="pgadmin",
-                    config={
-                        "port": 5050,
-                        "email": "admin@admin.com",
-                        "password": "admin",
-                    },
-                    instanceId=None,
-                )
-                instances_to_process.append(pgadmin_instance)
-            elif instance.app_id == "mariadb" and instance.config.get(
-                "include_phpmyadmin"
-            ):
-                # Add phpMyAdmin instance
-                phpmyadmin_instance = InstanceConfig(
-                    app_id="phpmyadmin",
-                    instance_name="phpmyadmin",
-                    config={"port": 8080},
-                    instanceId=None,
-                )
-                instances_to_process.append(phpmyadmin_instance)
 
-        # Process each instance
-        for instance in instances_to_process:
-            app = catalog_dict.get(instance.app_id)
-            if not app or not app.get("enabled", False):
-                continue
+def requested_parts(parts: Optional[str]) -> FrozenSet[str]:
+    """Parse a parts= query value, rejecting unknown parts with a 400"""
+    try:
+        return parse_parts(parts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-            service_name = instance.instance_name
-            config = instance.config
 
-            # Build image name with version
-            version = config.get("version", app.get("default_version", "latest"))
-            image = f"{app['image']}:{version}"
+def requested_archive(
+    archive_format: Optional[str], level: Optional[int]
+) -> Tuple[ArchiveFormat, Optional[int]]:
+    """Resolve format= and level= query values, rejecting bad ones with a 400"""
+    try:
+        resolved = get_archive_format(archive_format)
+        return resolved, resolved.resolve_level(level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-            # Create service definition
-            service = {
-                "image": image,
-                "container_name": f"{stack_name}-{service_name}",
-                "networks": [f"{stack_name}-network"],
-                "restart": global_settings.restart_policy,
-            }
 
-            # Handle ports
-            if "ports" in app["default_config"]:
-                ports = []
-                for port_mapping in app["default_config"]["ports"]:
-                    if ":" in port_mapping:
-                        container_port = port_mapping.split(":")[1]
-                        # Check for various port config options
-                        if instance.app_id == "postgres":
-                            host_port = config.get("port", port_mapping.split(":")[0])
-                        elif instance.app_id == "ignition":
-                            if container_port == "8088":
-                                host_port = config.get(
-                                    "http_port", port_mapping.split(":")[0]
-                                )
-                            elif container_port == "8043":
-                                host_port = config.get(
-                                    "https_port", port_mapping.split(":")[0]
-                                )
-                            else:
-                                host_port = port_mapping.split(":")[0]
-                        elif instance.app_id == "keycloak":
-                            host_port = config.get("port", port_mapping.split(":")[0])
-                        elif instance.app_id == "traefik":
-                            if container_port == "80":
-                                host_port = config.get("http_port", 80)
-                            elif container_port == "443":
-                                host_port = config.get("https_port", 443)
-                            elif container_port == "8080":
-                                host_port = config.get("dashboard_port", 8080)
-                            else:
-                                host_port = port_mapping.split(":")[0]
-                        else:
-                            host_port = config.get(
-                                "port",
-                                config.get("http_port", port_mapping.split(":")[0]),
-                            )
-
-                        ports.append(f"{host_port}:{container_port}")
-                    else:
-                        ports.append(port_mapping)
-                service["ports"] = ports
-
-            # Handle environment variables
-            if "environment" in app["default_config"]:
-                env = app["default_config"]["environment"].copy()
-                env["TZ"] = global_settings.timezone
-
-                # Update with configured values based on app type
-                if instance.app_id == "postgres":
-                    env["POSTGRES_DB"] = config.get("database", env.get("POSTGRES_DB"))
-                    env["POSTGRES_USER"] = config.get(
-                        "username", env.get("POSTGRES_USER")
-                    )
-                    env["POSTGRES_PASSWORD"] = config.get(
-                        "password", env.get("POSTGRES_PASSWORD")
-                    )
+def require_deterministic_key(deterministic: bool):
+    """
+    Refuse deterministic= with a 503 unless a stable secret key is configured
+    A per-process key would make archives and ETags differ between workers
+    and across restarts.
+    """
+    if deterministic and deterministic_secret_key() is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Deterministic downloads need DETERMINISTIC_SECRET_KEY or "
+            "DETERMINISTIC_SECRET_KEY_FILE to be configured",
+        )
 
-                elif instance.app_id == "mariadb":
-                    env["MYSQL_DATABASE"] = config.get(
-                        "database", env.get("MYSQL_DATABASE")
-                    )
-                    env["MYSQL_USER"] = config.get("username", env.get("MYSQL_USER"))
-                    env["MYSQL_PASSWORD"] = config.get(
-                        "password", env.get("MYSQL_PASSWORD")
-                    )
-                    env["MYSQL_ROOT_PASSWORD"] = config.get(
-                        "root_password", env.get("MYSQL_ROOT_PASSWORD")
-                    )
 
-                elif instance.app_id == "mssql":
-                    env["SA_PASSWORD"] = config.get(
-                        "sa_password", env.get("SA_PASSWORD")
-                    )
-                    env["MSSQL_PID"] = config.get("edition", env.get("MSSQL_PID"))
+DATABASE_APPS = ("postgres", "mariadb", "mssql")
 
-                elif instance.app_id == "ignition":
-                    env["GATEWAY_ADMIN_USERNAME"] = config.get(
-                        "admin_username", env.get("GATEWAY_ADMIN_USERNAME")
-                    )
-                    env["GATEWAY_ADMIN_PASSWORD"] = config.get(
-                        "admin_password", env.get("GATEWAY_ADMIN_PASSWORD")
-                    )
-                    env["IGNITION_EDITION"] = config.get(
-                        "edition", env.get("IGNITION_EDITION", "standard")
-                    )
 
-                    # Determine version to decide which modules field to use
-                    version = config.get("version", "latest")
-                    is_83_or_later = False
-                    # "latest" maps to 8.3+, so treat it as 8.3
-                    if version == "latest" or (
-                        version.startswith("8.3")
-                        or version.startswith("8.4")
-                        or version.startswith("9")
-                    ):
-                        is_83_or_later = True
-
-                    # Handle modules - convert array to comma-separated string
-                    # Check for version-specific module fields first, then fall back to legacy "modules" field
-                    if is_83_or_later:
-                        modules = config.get("modules_83", config.get("modules", []))
-                    else:
-                        modules = config.get("modules_81", config.get("modules", []))
-
-                    if isinstance(modules, list) and len(modules) > 0:
-                        # Extract just the values if modules are objects
-                        module_values = []
-                        for mod in modules:
-                            if isinstance(mod, dict):
-                                module_values.append(mod.get("value", mod))
-                            else:
-                                module_values.append(mod)
-                        env["GATEWAY_MODULES_ENABLED"] = ",".join(module_values)
-
-                    # Handle third party modules
-                    third_party_modules = config.get("third_party_modules", "")
-                    if third_party_modules and third_party_modules.strip():
-                        # Split by newlines and filter empty lines
-                        module_urls = [
-                            url.strip()
-                            for url in third_party_modules.split("\n")
-                            if url.strip()
-                        ]
-                        if module_urls:
-                            env["GATEWAY_MODULE_RELINK"] = ";".join(module_urls)
-
-                    env["IGNITION_MEMORY_MAX"] = config.get(
-                        "memory_max", env.get("IGNITION_MEMORY_MAX", "2048m")
-                    )
-                    env["IGNITION_MEMORY_INIT"] = config.get(
-                        "memory_init", env.get("IGNITION_MEMORY_INIT", "512m")
-                    )
-
-                    # Handle commissioning options - only set if explicitly true
-                    if config.get("commissioning_allow_non_secure", False):
-                        env["GATEWAY_SYSTEM_COMMISSIONING_ALLOWINSECURE"] = "true"
-
-                    # REMOVED: IGNITION_QUICKSTART causes volume mount issues
-                    # Users should manually commission the gateway after first start
-
-                    # Apply email integration if available (for alarm notifications)
-                    if has_email_testing and integration_settings.email.get(
-                        "auto_configure_services", True
-                    ):
-                        email_int = integration_results["integrations"]["email_testing"]
-                        mailhog_instance = email_int.get("provider", "mailhog")
-                        from_address = integration_settings.email.get(
-                            "from_address", "noreply@iiot.local"
-                        )
-                        email_env_vars = generate_email_env_vars(
-                            "ignition", mailhog_instance, from_address
-                        )
-                        env.update(email_env_vars)
-
-                elif instance.app_id == "keycloak":
-                    env["KEYCLOAK_ADMIN"] = config.get(
-                        "admin_username", env.get("KEYCLOAK_ADMIN")
-                    )
-                    env["KEYCLOAK_ADMIN_PASSWORD"] = config.get(
-                        "admin_password", env.get("KEYCLOAK_ADMIN_PASSWORD")
-                    )
-
-                    # Apply email integration if available (for user emails)
-                    if has_email_testing and integration_settings.email.get(
-                        "auto_configure_services", True
-                    ):
-                        email_int = integration_results["integrations"]["email_testing"]
-                        mailhog_instance = email_int.get("provider", "mailhog")
-                        from_address = integration_settings.email.get(
-                            "from_address", "noreply@iiot.local"
-                        )
-                        email_env_vars = generate_email_env_vars(
-                            "keycloak", mailhog_instance, from_address
-                        )
-                        env.update(email_env_vars)
-
-                elif instance.app_id == "grafana":
-                    env["GF_SECURITY_ADMIN_USER"] = config.get(
-                        "admin_username", env.get("GF_SECURITY_ADMIN_USER")
-                    )
-                    env["GF_SECURITY_ADMIN_PASSWORD"] = config.get(
-                        "admin_password", env.get("GF_SECURITY_ADMIN_PASSWORD")
-                    )
+class GenerationContext:
+    """
+    Per-request inputs shared by every stage of generating one stack
+    Resolved settings, the catalog index and renderers, the submitted
+    instances grouped by app and the flags derived from them are computed
+    once; integration detection runs on first use. secret_key, if set,
+    derives Keycloak client secrets instead of generating random ones.
+    """
 
-                    # Apply OAuth integration if available
-                    if has_oauth_provider and integration_settings.oauth.get(
-                        "auto_configure_services", True
-                    ):
-                        oauth_int = integration_results["integrations"][
-                            "oauth_provider"
-                        ]
-                        for client in oauth_int.get("clients", []):
-                            if (
-                                client["service_id"] == "grafana"
-                                and client["instance_name"] == instance.instance_name
-                            ):
-                                provider = client["provider"]
-                                realm_name = integration_settings.oauth.get(
-                                    "realm_name", "iiot"
-                                )
-
-                                # Get client secret from generated Keycloak realm
-                                client_secret = None
-                                if keycloak_clients:
-                                    kc_client = next(
-                                        (
-                                            kc
-                                            for kc in keycloak_clients
-                                            if kc.get("clientId") == "grafana"
-                                        ),
-                                        None,
-                                    )
-                                    if kc_client:
-                                        client_secret = kc_client.get("secret")
-
-                                oauth_env_vars = generate_oauth_env_vars(
-                                    "grafana",
-                                    provider,
-                                    realm_name,
-                                    client_secret=client_secret,
-                                )
-                                env.update(oauth_env_vars)
-
-                    # Apply email integration if available
-                    if has_email_testing and integration_settings.email.get(
-                        "auto_configure_services", True
-                    ):
-                        email_int = integration_results["integrations"]["email_testing"]
-                        mailhog_instance = email_int.get("provider", "mailhog")
-                        from_address = integration_settings.email.get(
-                            "from_address", "noreply@iiot.local"
-                        )
-                        email_env_vars = generate_email_env_vars(
-                            "grafana", mailhog_instance, from_address
-                        )
-                        env.update(email_env_vars)
-
-                elif instance.app_id == "n8n":
-                    env["N8N_BASIC_AUTH_USER"] = config.get(
-                        "username", env.get("N8N_BASIC_AUTH_USER")
-                    )
-                    env["N8N_BASIC_AUTH_PASSWORD"] = config.get(
-                        "password", env.get("N8N_BASIC_AUTH_PASSWORD")
-                    )
+    def __init__(
+        self,
+        stack_config: StackConfig,
+        catalog_index: CatalogIndex,
+        engine: IntegrationEngine,
+        secret_key: Optional[bytes] = None,
+    ):
+        self.stack_config = stack_config
+        self.catalog_index = catalog_index
+        self.engine = engine
+        self.secret_key = secret_key
+        self.renderers = get_renderer_registry(catalog_index)
+        self.global_settings = stack_config.global_settings or GlobalSettings()
+        self.integration_settings = (
+            stack_config.integration_settings or IntegrationSettings()
+        )
 
-                    # Apply OAuth integration if available
-                    if has_oauth_provider and integration_settings.oauth.get(
-                        "auto_configure_services", True
-                    ):
-                        oauth_int = integration_results["integrations"][
-                            "oauth_provider"
-                        ]
-                        for client in oauth_int.get("clients", []):
-                            if (
-                                client["service_id"] == "n8n"
-                                and client["instance_name"] == instance.instance_name
-                            ):
-                                provider = client["provider"]
-                                realm_name = integration_settings.oauth.get(
-                                    "realm_name", "iiot"
-                                )
-
-                                # Get client secret from generated Keycloak realm
-                                client_secret = None
-                                if keycloak_clients:
-                                    kc_client = next(
-                                        (
-                                            kc
-                                            for kc in keycloak_clients
-                                            if kc.get("clientId") == "n8n"
-                                        ),
-                                        None,
-                                    )
-                                    if kc_client:
-                                        client_secret = kc_client.get("secret")
-
-                                oauth_env_vars = generate_oauth_env_vars(
-                                    "n8n",
-                                    provider,
-                                    realm_name,
-                                    client_secret=client_secret,
-                                )
-                                env.update(oauth_env_vars)
-
-                    # Apply email integration if available
-                    if has_email_testing and integration_settings.email.get(
-                        "auto_configure_services", True
-                    ):
-                        email_int = integration_results["integrations"]["email_testing"]
-                        mailhog_instance = email_int.get("provider", "mailhog")
-                        from_address = integration_settings.email.get(
-                            "from_address", "noreply@iiot.local"
-                        )
-                        email_env_vars = generate_email_env_vars(
-                            "n8n", mailhog_instance, from_address
-                        )
-                        env.update(email_env_vars)
-
-                elif instance.app_id == "rabbitmq":
-                    env["RABBITMQ_DEFAULT_USER"] = config.get(
-                        "username", env.get("RABBITMQ_DEFAULT_USER")
-                    )
-                    env["RABBITMQ_DEFAULT_PASS"] = config.get(
-                        "password", env.get("RABBITMQ_DEFAULT_PASS")
-                    )
+        self.instances = stack_config.instances
+        self.instances_by_app: Dict[str, List[InstanceConfig]] = {}
+        for instance in self.instances:
+            self.instances_by_app.setdefault(instance.app_id, []).append(instance)
 
-                elif instance.app_id == "vault":
-                    env["VAULT_DEV_ROOT_TOKEN_ID"] = config.get(
-                        "root_token", env.get("VAULT_DEV_ROOT_TOKEN_ID")
-                    )
+        self.has_traefik = self.has_app("traefik")
+        self.has_ignition = self.has_app("ignition")
+        self.has_databases = any(self.has_app(app_id) for app_id in DATABASE_APPS)
 
-                elif instance.app_id == "pgadmin":
-                    env["PGADMIN_DEFAULT_EMAIL"] = config.get(
-                        "email", env.get("PGADMIN_DEFAULT_EMAIL")
-                    )
-                    env["PGADMIN_DEFAULT_PASSWORD"] = config.get(
-                        "password", env.get("PGADMIN_DEFAULT_PASSWORD")
-                    )
+    def has_app(self, app_id: str) -> bool:
+        return app_id in self.instances_by_app
 
-                elif instance.app_id == "phpmyadmin":
-                    # PMA_HOST should point to the mariadb instance
-                    mariadb_instance = next(
-                        (
-                            inst
-                            for inst in stack_config.instances
-                            if inst.app_id == "mariadb"
-                        ),
-                        None,
-                    )
-                    if mariadb_instance:
-                        env["PMA_HOST"] = mariadb_instance.instance_name
-                        env["PMA_PORT"] = str(mariadb_instance.config.get("port", 3306))
-
-                service["environment"] = env
-
-            # Handle volumes
-            if "volumes" in app["default_config"]:
-                volumes = []
-                for vol in app["default_config"]["volumes"]:
-                    # Replace {instance_name} placeholder
-                    vol = vol.replace("{instance_name}", service_name)
-                    volumes.append(vol)
-
-                # Add Keycloak import volume if realm import is configured
-                if instance.app_id == "keycloak" and keycloak_clients:
-                    volumes.append(
-                        f"./configs/{service_name}/import:/opt/keycloak/data/import:ro"
-                    )
+    def instances_of(self, app_id: str) -> List[InstanceConfig]:
+        """Submitted instances of an app, in stack order"""
+        return self.instances_by_app.get(app_id, [])
 
-                service["volumes"] = volumes
-
-            # Handle command
-            if "command" in app["default_config"]:
-                service["command"] = app["default_config"]["command"]
-
-                # Modify Keycloak command to include import flag
-                if instance.app_id == "keycloak" and keycloak_clients:
-                    realm_name = integration_settings.oauth.get("realm_name", "iiot")
-                    service["command"] = f"start-dev --import-realm"
-
-            # Handle cap_add (for services like Vault)
-            if "cap_add" in app["default_config"]:
-                service["cap_add"] = app["default_config"]["cap_add"]
-
-            # Add Traefik labels if Traefik is present and this is a web-accessible service
-            if has_traefik and instance.app_id != "traefik":
-                # Define web services and their default ports
-                web_service_ports = {
-                    "ignition": lambda c: str(c.get("http_port", 8088)),
-                    "grafana": lambda c: str(c.get("port", 3000)),
-                    "nodered": lambda c: str(c.get("port", 1880)),
-                    "n8n": lambda c: str(c.get("port", 5678)),
-                    "keycloak": lambda c: str(c.get("port", 8180)),
-                    "prometheus": lambda c: "9090",
-                    "dozzle": lambda c: "8080",
-                    "portainer": lambda c: "9000",
-                    "guacamole": lambda c: "8080",
-                    "authentik": lambda c: "9000",
-                    "authelia": lambda c: "9091",
-                    "mailhog": lambda c: "8025",
-                    "influxdb": lambda c: "8086",
-                    "chronograf": lambda c: "8888",
-                }
+    @cached_property
+    def detection(self) -> Dict[str, Any]:
+        """Integration detection result for the submitted instances"""
+        return self.engine.detect_integrations_cached(
+            detection_instances(self.instances)
+        )
 
-                if instance.app_id in web_service_ports:
-                    # Create subdomain from service name
-                    subdomain = (
-                        service_name.split("-")[0]
-                        if "-" in service_name
-                        else service_name
-                    )
 
-                    # Get the port using the port function
-                    port = web_service_ports[instance.app_id](config)
+class StackGeneration:
+    """
+    Generation cache lookup and lazy rendering for one request
+    A full cached result also answers requests for any subset of parts;
+    partial results are cached under their own key. Deterministic
+    generations derive Keycloak secrets from the stack's content, so equal
+    configs give equal results, which are cached under keys of their own.
+    """
 
-                    # Get domain from integration settings
-                    base_domain = integration_settings.reverse_proxy.get(
-                        "base_domain", "localhost"
-                    )
-                    enable_https = integration_settings.reverse_proxy.get(
-                        "enable_https", False
-                    )
-                    entrypoint = "websecure" if enable_https else "web"
-
-                    service["labels"] = [
-                        "traefik.enable=true",
-                        f"traefik.http.routers.{service_name}.rule=Host(`{subdomain}.{base_domain}`)",
-                        f"traefik.http.routers.{service_name}.entrypoints={entrypoint}",
-                        f"traefik.http.services.{service_name}.loadbalancer.server.port={port}",
-                    ]
-
-                    # Add TLS if HTTPS is enabled
-                    if enable_https:
-                        service["labels"].append(
-                            f"traefik.http.routers.{service_name}.tls=true"
-                        )
-                        service["labels"].append(
-                            f"traefik.http.routers.{service_name}.tls.certresolver=letsencrypt"
-                        )
-
-            compose["services"][service_name] = service
+    def __init__(
+        self,
+        stack_config: StackConfig,
+        parts: FrozenSet[str],
+        deterministic: bool = False,
+    ):
+        self.stack_config = stack_config
+        self.parts = parts
+        self.catalog = get_catalog_store().get()
+        self.engine = get_integration_engine()
+        self.cache = get_generation_cache()
+
+        normalized = normalize_stack_config(stack_config)
+        secret_key = None
+        if deterministic:
+            secret_key = derive_secret_key(canonical_hash(normalized))
+
+        self.context = GenerationContext(
+            stack_config, self.catalog.index, self.engine, secret_key
+        )
 
-            # Add to env file
-            env_vars.append(f"# {service_name}")
-            env_vars.append(
-                f"{service_name.upper().replace('-', '_')}_VERSION={version}"
+        self.full_key = generation_cache_key(
+            normalized,
+            self.catalog.digest,
+            self.engine.version,
+            deterministic=deterministic,
+        )
+        self.key = self.full_key
+        if parts != STACK_PARTS:
+            self.key = generation_cache_key(
+                normalized,
+                self.catalog.digest,
+                self.engine.version,
+                parts,
+                deterministic=deterministic,
             )
-            if "environment" in service:
-                for key, value in service["environment"].items():
-                    env_vars.append(
-                        f"{service_name.upper().replace('-', '_')}_{key}={value}"
-                    )
-            env_vars.append("")
 
-        # Collect named volumes from all services
-        # Named volumes are those that don't start with ./ or / (not bind mounts)
-        named_volumes = set()
-        for service_name, service in compose["services"].items():
-            if "volumes" in service:
-                for vol in service["volumes"]:
-                    # Check if this is a named volume (not a bind mount)
-                    if ":" in vol:
-                        volume_part = vol.split(":")[0]
-                        # Named volumes don't start with ./ or /
-                        if not volume_part.startswith(
-                            "./"
-                        ) and not volume_part.startswith("/"):
-                            named_volumes.add(volume_part)
-
-        # Add named volumes to compose structure
-        if named_volumes:
-            for vol_name in sorted(named_volumes):
-                compose["volumes"][vol_name] = None
-
-        # Generate integration configuration files
-        # 1. MQTT Broker Configuration
-        if has_mqtt_broker:
-            mqtt_int = integration_results["integrations"]["mqtt_broker"]
-            for provider_info in mqtt_int.get("providers", []):
-                provider_id = provider_info["service_id"]
-                instance_name = provider_info["instance_name"]
-
-                if provider_id == "mosquitto":
-                    # Generate Mosquitto configuration
-                    mqtt_username = integration_settings.mqtt.get("username", "")
-                    mqtt_password = integration_settings.mqtt.get("password", "")
-                    mqtt_enable_tls = integration_settings.mqtt.get("enable_tls", False)
-                    mqtt_tls_port = integration_settings.mqtt.get("tls_port", 8883)
-
-                    config_files[f"configs/{instance_name}/mosquitto.conf"] = (
-                        generate_mosquitto_config(
-                            username=mqtt_username,
-                            password=mqtt_password,
-                            enable_tls=mqtt_enable_tls,
-                            tls_port=mqtt_tls_port,
-                        )
-                    )
+    def cached(self) -> Optional[Dict[str, Any]]:
+        """Cached result for the requested parts, or None"""
+        result = self.cache.get(self.full_key)
+        if result is not None:
+            return project_result(result, self.parts)
+        if self.key != self.full_key:
+            return self.cache.get(self.key)
+        return None
+
+    def stack(self) -> "GeneratedStack":
+        return GeneratedStack(self.context)
+
+    def store(self, stack: "GeneratedStack", result: Dict[str, Any]):
+        # Random Keycloak client secrets must not be handed to other requests
+        if not stack.has_generated_secrets:
+            self.cache.put(self.key, result)
+
+    def result(self) -> Dict[str, Any]:
+        """The cached result, or a freshly generated (and cached) one"""
+        result = self.cached()
+        if result is None:
+            stack = self.stack()
+            result = stack.result(self.parts)
+            self.store(stack, result)
+        return result
 
-                    if mqtt_username and mqtt_password:
-                        config_files[f"configs/{instance_name}/passwd"] = (
-                            generate_mosquitto_password_file(
-                                mqtt_username, mqtt_password
-                            )
-                        )
-
-        # Generate Prometheus config files for all Prometheus instances
-        for instance in stack_config.instances:
-            if instance.app_id == "prometheus":
-                config_files[f"configs/{instance.instance_name}/prometheus.yml"] = (
-                    generate_prometheus_config()
-                )
 
-        # 2. Grafana Datasource Provisioning
-        if "visualization" in integration_results.get("integrations", {}):
-            viz_int = integration_results["integrations"]["visualization"]
-            grafana_instance = viz_int.get("provider")
+@app.post("/generate")
+def generate_stack(stack_config: StackConfig, parts: Optional[str] = None):
+    """
+    Generate docker-compose.yml and configuration files
+    parts limits generation to a comma-separated subset of compose, env,
+    config_files and readme (default: all). Results are cached by content
+    (except stacks with generated Keycloak secrets); the returned dict may be
+    shared and must not be mutated.
+    """
+    requested = requested_parts(parts)
+    try:
+        return StackGeneration(stack_config, requested).result()
 
-            if grafana_instance:
-                datasources_config = []
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-                for ds in viz_int.get("datasources", []):
-                    ds_type = ds["service_id"]
-                    ds_instance_name = ds["instance_name"]
-                    ds_config = ds["config"]
 
-                    datasources_config.append(
-                        {
-                            "type": ds_type,
-                            "instance_name": ds_instance_name,
-                            "config": ds_config,
-                        }
-                    )
+@app.post("/generate/stream")
+def generate_stack_stream(
+    stack_config: StackConfig, format: str = "ndjson", parts: Optional[str] = None
+):
+    """
+    Generate a stack as a stream of sections (NDJSON lines or SSE events)
+    Emits docker_compose, env, each config file, readme and settings as they
+    are ready, with per-section timings, then a final "done" event. parts
+    works as for /generate.
+    """
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown stream format '{format}' (use ndjson or sse)",
+        )
+    requested = requested_parts(parts)
 
-                if datasources_config:
-                    config_files[
-                        f"configs/{grafana_instance}/provisioning/datasources/auto.yaml"
-                    ] = generate_grafana_datasources(datasources_config)
-
-        # 3. Keycloak Realm Configuration - Save to file
-        if keycloak_realm_config:
-            # Use the pre-generated realm config (ensures secrets match)
-            realm_name = integration_settings.oauth.get("realm_name", "iiot")
-            realm_json = json.dumps(keycloak_realm_config, indent=2)
-            config_files[f"configs/keycloak/import/realm-{realm_name}.json"] = (
-                realm_json
+    # Failures before the first section get the same 500 as /generate;
+    # later ones end the stream with an "error" event
+    try:
+        generation = StackGeneration(stack_config, requested)
+        cached = generation.cached()
+
+        if cached is not None:
+            sections = replay_sections(cached, requested)
+        else:
+            stack = generation.stack()
+            sections = tee_sections(
+                stack.iter_sections(requested),
+                partial(generation.store, stack),
+                requested,
             )
+    except Exception as e:
+        logger.error(f"Error preparing stack generation stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Convert to YAML
-        compose_yaml = yaml.dump(compose, default_flow_style=False, sort_keys=False)
+    return StreamingResponse(
+        stream_sections(sections, format, cached=cached is not None),
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers={"Cache-Control": "no-cache"},
+    )
 
-        # Create .env file
-        env_content = "\n".join(env_vars)
 
-        # Create README
-        has_ignition_service = any(
-            inst.app_id == "ignition" for inst in stack_config.instances
-        )
+class GeneratedStack:
+    """
+    Lazily rendered artifacts of one stack
+    Settings, integration detection, the Keycloak realm and renderer inputs
+    are prepared up front; compose/.env, config files and the README are each
+    rendered on first use, so parts nobody asks for are never built.
+    """
 
-        startup_instructions = """4. Start the stack:
-   ```bash
-   docker compose up -d
-   ```"""
-
-        if has_ignition_service:
-            startup_instructions = """4. Start the stack using the initialization script:
-
-   **Linux/Mac:**
-   ```bash
-   chmod +x start.sh
-   ./start.sh
-   ```
-
-   **Windows:**
-   ```cmd
-   start.bat
-   ```
-
-   The script automatically handles Ignition volume initialization on first run.
-
-   **Note:** For Ignition stacks, use `start.sh`/`start.bat` instead of `docker compose up -d` directly.
-   This ensures data volumes are properly initialized on first startup."""
-
-        # Generate list of required directories for config files (bind mounts only)
-        # Named volumes are automatically managed by Docker, no directory creation needed
-        required_dirs = set()
-        for instance in stack_config.instances:
-            app = catalog_dict.get(instance.app_id)
-            if app and "volumes" in app["default_config"]:
-                for vol in app["default_config"]["volumes"]:
-                    if ":" in vol and vol.startswith("./"):
-                        # Extract local path from volume mapping (e.g., "./configs/traefik/traefik.yml:/etc/traefik/traefik.yml")
-                        local_path = vol.split(":")[0]
-                        # Replace {instance_name} placeholder
-                        local_path = local_path.replace(
-                            "{instance_name}", instance.instance_name
-                        )
-
-                        # Only add parent directory of config files, not data directories
-                        # For config files, we need to ensure the parent directory exists
-                        if "/" in local_path:
-                            parent_dir = "/".join(local_path.split("/")[:-1])
-                            if parent_dir:  # Ensure it's not empty
-                                required_dirs.add(parent_dir)
-
-        # Generate directory creation commands
-        dir_creation_cmds = (
-            "\n   ".join([f"mkdir -p {d}" for d in sorted(required_dirs)])
-            if required_dirs
-            else "   # No directories required - using Docker named volumes"
+    def __init__(self, context: GenerationContext):
+        self.context = context
+        self.stack_config = context.stack_config
+        self.catalog_index = context.catalog_index
+        self.global_settings = context.global_settings
+        self.integration_settings = context.integration_settings
+        self.integration_results = context.detection
+
+        # Pre-generate Keycloak realm configuration if needed (OAuth client
+        # secrets end up in service environments, config files and README)
+        self.keycloak_realm_config = self._generate_keycloak_realm()
+        self.keycloak_clients = (
+            self.keycloak_realm_config.get("clients", [])
+            if self.keycloak_realm_config
+            else []
         )
 
-        readme_content = f"""# {global_settings.stack_name} - Generated Configuration
-
-## Global Settings
-- **Stack Name**: {global_settings.stack_name}
-- **Timezone**: {global_settings.timezone}
-- **Restart Policy**: {global_settings.restart_policy}
-
-## Services Included
-{chr(10).join([f"- {instance.instance_name} ({instance.app_id}) - {instance.config.get('version', 'latest')}" for instance in stack_config.instances])}
-
-## Getting Started
+        self.instances_to_process = self._instances_to_process()
+
+        # Per-app renderers (built once per catalog) and the stack-wide
+        # inputs they consume
+        self.renderers = context.renderers
+        self.port_allocation = self._allocate_ports()
+        self.render_inputs = RenderInputs.build(
+            self.global_settings,
+            self.integration_settings,
+            self.integration_results,
+            self.keycloak_clients,
+            context.instances,
+            self.renderers.consumed_inputs(
+                inst.app_id for inst in self.instances_to_process
+            ),
+            self.port_allocation,
+        )
 
-1. Review the generated `docker-compose.yml` and `.env` files
-2. Customise any settings as needed
-3. Create required directories:
-   ```bash
-   {dir_creation_cmds}
-   ```
-{startup_instructions}
+        self._config_files: Optional[Dict[str, str]] = None
 
-## Service URLs
-"""
+    @property
+    def has_generated_secrets(self) -> bool:
+        """Whether artifacts contain randomly generated Keycloak secrets"""
+        return (
+            self.keycloak_realm_config is not None and self.context.secret_key is None
+        )
 
-        for instance in stack_config.instances:
-            app = catalog_dict.get(instance.app_id)
-            if app and "ports" in app["default_config"]:
-                config = instance.config
-                url = ""
-
-                if instance.app_id == "ignition":
-                    port = config.get("http_port", 8088)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "postgres":
-                    port = config.get("port", 5432)
-                    url = f"localhost:{port}"
-                elif instance.app_id == "mariadb":
-                    port = config.get("port", 3306)
-                    url = f"localhost:{port}"
-                elif instance.app_id == "mssql":
-                    port = config.get("port", 1433)
-                    url = f"localhost:{port}"
-                elif instance.app_id == "keycloak":
-                    port = config.get("port", 8180)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "traefik":
-                    port = config.get("dashboard_port", 8080)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "grafana":
-                    port = config.get("port", 3000)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "prometheus":
-                    port = config.get("port", 9090)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "dozzle":
-                    port = config.get("port", 8888)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "nodered":
-                    port = config.get("port", 1880)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "n8n":
-                    port = config.get("port", 5678)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "emqx":
-                    port = config.get("dashboard_port", 18083)
-                    url = f"http://localhost:{port} (Dashboard)"
-                elif instance.app_id == "mosquitto":
-                    port = config.get("mqtt_port", 1883)
-                    url = f"mqtt://localhost:{port}"
-                elif instance.app_id == "rabbitmq":
-                    port = config.get("management_port", 15672)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "portainer":
-                    port = config.get("https_port", 9443)
-                    url = f"https://localhost:{port}"
-                elif instance.app_id == "whatupdocker":
-                    port = config.get("port", 3001)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "vault":
-                    port = config.get("port", 8200)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "guacamole":
-                    port = config.get("port", 8080)
-                    url = f"http://localhost:{port}/guacamole"
-                elif instance.app_id == "authentik":
-                    port = config.get("http_port", 9000)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "authelia":
-                    port = config.get("port", 9091)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "mailhog":
-                    port = config.get("http_port", 8025)
-                    url = f"http://localhost:{port} (SMTP: {config.get('smtp_port', 1025)})"
-                elif instance.app_id == "pgadmin":
-                    port = config.get("port", 5050)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "phpmyadmin":
-                    port = config.get("port", 8080)
-                    url = f"http://localhost:{port}"
-                elif instance.app_id == "nginx-proxy-manager":
-                    admin_port = config.get("admin_port", 81)
-                    url = f"http://localhost:{admin_port} (Admin UI)"
-                else:
-                    port = config.get("port", config.get("http_port", "8080"))
-                    url = f"http://localhost:{port}"
+    def _generate_keycloak_realm(self) -> Optional[Dict[str, Any]]:
+        integrations = self.integration_results.get("integrations", {})
+        oauth = self.integration_settings.oauth
+        if "oauth_provider" not in integrations or not oauth.get(
+            "auto_configure_services", True
+        ):
+            return None
 
-                readme_content += f"- **{instance.instance_name}**: {url}\n"
+        oauth_int = integrations["oauth_provider"]
+        if "keycloak" not in oauth_int.get("providers", []):
+            return None
 
-        # Add PostgreSQL connection instructions if applicable
-        postgres_in_stack = any(
-            inst.app_id == "postgres" for inst in stack_config.instances
-        )
-        ignition_in_stack = any(
-            inst.app_id == "ignition" for inst in stack_config.instances
+        # One Keycloak client per OAuth client service, however many
+        # instances it has
+        oauth_client_services = list(
+            dict.fromkeys(
+                client["service_id"] for client in oauth_int.get("clients", [])
+            )
         )
 
-        if postgres_in_stack and ignition_in_stack:
-            for inst in stack_config.instances:
-                if inst.app_id == "postgres":
-                    db_config = inst.config
-                    db_host = inst.instance_name
-                    db_port = db_config.get("port", 5432)
-                    db_name = db_config.get("database", "ignition")
-                    db_user = db_config.get("username", "ignition")
-                    db_pass = db_config.get("password", "password")
-
-                    readme_content += f"""
-## PostgreSQL Database Connection
-
-To connect Ignition to PostgreSQL:
-
-1. Open Ignition Gateway: http://localhost:8088
-2. Navigate to **Config → Databases → Connections**
-3. Click **"Create new Database Connection"**
-4. Enter these details:
-   - **Name**: PostgreSQL
-   - **Connect URL**: `jdbc:postgresql://{db_host}:{db_port}/{db_name}`
-   - **Username**: `{db_user}`
-   - **Password**: `{db_pass}`
-   - **Status Query**: `SELECT 1`
-   - **Max Connections**: 8
-5. Click **"Create New Database Connection"**
-6. Test the connection
-
-**Credentials Summary:**
-- Host: `{db_host}`
-- Port: `{db_port}`
-- Database: `{db_name}`
-- Username: `{db_user}`
-- Password: `{db_pass}`
-
-*See `configs/ignition-gateway/postgres_connection_info.txt` for detailed instructions.*
-"""
-                    break
+        reverse_proxy = self.integration_settings.reverse_proxy
+        return generate_keycloak_realm(
+            realm_name=oauth.get("realm_name", "iiot"),
+            services=oauth_client_services,
+            users=oauth.get("realm_users", []),
+            base_domain=reverse_proxy.get("base_domain", "localhost"),
+            enable_https=reverse_proxy.get("enable_https", False),
+            secret_key=self.context.secret_key,
+        )
 
-        # Add Keycloak SSO section if configured
-        if keycloak_clients:
-            realm_name = integration_settings.oauth.get("realm_name", "iiot")
-            readme_content += generate_keycloak_readme_section(
-                realm_name, keycloak_clients
-            )
+    def _instances_to_process(self) -> List["InstanceConfig"]:
+        """Submitted instances plus pgAdmin/phpMyAdmin added by checkboxes"""
+        instances = list(self.stack_config.instances)
+        for instance in self.stack_config.instances:
+            if instance.app_id == "postgres" and instance.config.get("include_pgadmin"):
+                instances.append(
+                    InstanceConfig(
+                        app_id="pgadmin",
+                        instance_name="pgadmin",
+                        config={
+                            "port": 5050,
+                            "email": "admin@admin.com",
+                            "password": "admin",
+                        },
+                        instanceId=None,
+                    )
+                )
+            elif instance.app_id == "mariadb" and instance.config.get(
+                "include_phpmyadmin"
+            ):
+                instances.append(
+                    InstanceConfig(
+                        app_id="phpmyadmin",
+                        instance_name="phpmyadmin",
+                        config={"port": 8080},
+                        instanceId=None,
+                    )
+                )
+        return instances
+
+    def _allocate_ports(self) -> PortAllocation:
+        """Resolve host port conflicts between the stack's services"""
+        # A repeated instance name renders once, with its last config
+        services = {}
+        for instance in self.instances_to_process:
+            if self.catalog_index.is_enabled(instance.app_id):
+                services[instance.instance_name] = instance
+
+        return allocate_host_ports(
+            (name, container_port, host_port)
+            for name, instance in services.items()
+            for container_port, host_port in self.renderers.get(
+                instance.app_id
+            ).host_bindings(instance.config)
+        )
 
-        # Add Ignition database auto-registration section if applicable
-        ignition_db_list = []
-        if "db_provider" in integration_results.get("integrations", {}):
-            db_int = integration_results["integrations"]["db_provider"]
-
-            # Find Ignition instances that will use databases
-            for client in db_int.get("clients", []):
-                if client["service_id"] == "ignition" and client.get("auto_register"):
-                    # Get compatible databases for this Ignition instance
-                    for provider in client.get("matched_providers", []):
-                        ignition_db_list.append(
-                            {
-                                "type": provider["service_id"],
-                                "instance_name": provider["instance_name"],
-                                "config": provider["config"],
-                            }
-                        )
-
-        if ignition_db_list:
-            readme_content += generate_ignition_db_readme_section(ignition_db_list)
-
-        # Add ntfy monitoring section if enabled
-        if global_settings.ntfy_enabled and global_settings.ntfy_topic:
-            readme_content += generate_ntfy_readme_section(
-                global_settings.ntfy_server, global_settings.ntfy_topic
-            )
+    @cached_property
+    def _services(self) -> Tuple[Dict[str, Any], Dict[str, Any], List[str]]:
+        """(compose dict, fragments by service name, .env lines)"""
+        global_settings = self.global_settings
+        stack_name = global_settings.stack_name
+        compose = {
+            "name": stack_name,
+            "services": {},
+            "networks": {f"{stack_name}-network": {"driver": "bridge"}},
+            "volumes": {},
+        }
 
-        readme_content += """
-## Stopping the Stack
+        env_vars = [
+            "# Global Settings",
+            f"TZ={global_settings.timezone}",
+            f"RESTART_POLICY={global_settings.restart_policy}",
+            "",
+        ]
 
-```bash
-docker compose down
-```
+        # Render each instance, reusing cached fragments of unchanged services
+        fragments = {}
+        for instance in self.instances_to_process:
+            if not self.catalog_index.is_enabled(instance.app_id):
+                continue
 
-To remove volumes as well:
-```bash
-docker compose down -v
-```
+            fragment = render_fragment(
+                self.renderers.get(instance.app_id), instance, self.render_inputs
+            )
+            fragments[fragment.name] = fragment
+            compose["services"][fragment.name] = fragment.service
 
-## Generated by IIoT Stack Builder
-"""
+            # Add to env file
+            env_vars.extend(fragment.env_lines)
 
+        # Collect named volumes from all services
+        # Named volumes are those that don't start with ./ or / (not bind mounts)
+        named_volumes = set()
+        for service in compose["services"].values():
+            for vol in service.get("volumes", ()):
+                # Check if this is a named volume (not a bind mount)
+                if ":" in vol:
+                    volume_part = vol.split(":")[0]
+                    if not volume_part.startswith(("./", "/")):
+                        named_volumes.add(volume_part)
+
+        for vol_name in sorted(named_volumes):
+            compose["volumes"][vol_name] = None
+
+        return compose, fragments, env_vars
+
+    @cached_property
+    def docker_compose(self) -> str:
+        compose, fragments, _ = self._services
+        return assemble_compose_yaml(compose, fragments.values())
+
+    @cached_property
+    def env(self) -> str:
+        return "\n".join(self._services[2])
+
+    @property
+    def config_files(self) -> Dict[str, str]:
+        if self._config_files is None:
+            self._config_files = dict(self.iter_config_files())
+        return self._config_files
+
+    def iter_config_files(self) -> Iterator[Tuple[str, str]]:
+        """Yield (path, content) as each config file is rendered"""
+        if self._config_files is not None:
+            yield from self._config_files.items()
+            return
+
+        rendered = {}
+        for path, content in stack_config_stage(self).iter_render():
+            rendered[path] = content
+            yield path, content
+        self._config_files = rendered
+
+    @cached_property
+    def readme(self) -> str:
+        return stack_readme(self)
+
+    @property
+    def settings(self) -> Dict[str, Any]:
         return {
-            "docker_compose": compose_yaml,
-            "env": env_content,
-            "readme": readme_content,
-            "config_files": config_files,
-            "ntfy_enabled": global_settings.ntfy_enabled,
-            "ntfy_server": global_settings.ntfy_server,
-            "ntfy_topic": global_settings.ntfy_topic,
+            "ntfy_enabled": self.global_settings.ntfy_enabled,
+            "ntfy_server": self.global_settings.ntfy_server,
+            "ntfy_topic": self.global_settings.ntfy_topic,
+            "port_assignments": self.port_allocation.reassignments(),
         }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.post("/download")
-def download_stack(stack_config: StackConfig):
-    """Download complete stack as ZIP file"""
-    try:
-        generated = generate_stack(stack_config)
-
-        # Check if Traefik is in the stack
-        has_traefik = any(inst.app_id == "traefik" for inst in stack_config.instances)
-
-        # Create ZIP file in memory
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.writestr("docker-compose.yml", generated["docker_compose"])
-            zip_file.writestr(".env", generated["env"])
-            zip_file.writestr("README.md", generated["readme"])
-
-            # Add generated config files from integrations
-            for file_path, content in generated.get("config_files", {}).items():
-                # Create ZipInfo with proper permissions (0o644 = rw-r--r--)
-                info = zipfile.ZipInfo(file_path)
-                info.external_attr = 0o644 << 16  # Set file permissions
-                zip_file.writestr(info, content)
-
-            # Create directory structure placeholders
-            zip_file.writestr("configs/.gitkeep", "")
-            zip_file.writestr("scripts/.gitkeep", "")
-
-            # Add ntfy monitoring script if enabled
-            global_settings = stack_config.global_settings or GlobalSettings()
-            if global_settings.ntfy_enabled and global_settings.ntfy_topic:
-                monitor_script = generate_ntfy_monitor_script(
-                    ntfy_server=global_settings.ntfy_server,
-                    ntfy_topic=global_settings.ntfy_topic,
-                    stack_name=global_settings.stack_name,
+    def iter_sections(self, parts: FrozenSet[str] = STACK_PARTS) -> Iterator[Section]:
+        """Requested parts in stream order, each rendered just before it is yielded"""
+        if PART_COMPOSE in parts:
+            yield SECTION_COMPOSE, self.docker_compose
+        if PART_ENV in parts:
+            yield SECTION_ENV, self.env
+        if PART_CONFIG_FILES in parts:
+            for file_path, content in self.iter_config_files():
+                yield SECTION_CONFIG_FILE, (file_path, content)
+        if PART_README in parts:
+            yield SECTION_README, self.readme
+        yield SECTION_SETTINGS, self.settings
+
+    def result(self, parts: FrozenSet[str] = STACK_PARTS) -> Dict[str, Any]:
+        """The /generate result restricted to parts"""
+        return collect_sections(self.iter_sections(parts), parts)
+
+
+def stack_config_stage(stack: GeneratedStack) -> ConfigFileStage:
+    """Queue the integration config files of a stack"""
+    integration_settings = stack.integration_settings
+    integration_results = stack.integration_results
+    keycloak_realm_config = stack.keycloak_realm_config
+
+    config_stage = ConfigFileStage()
+    has_mqtt_broker = "mqtt_broker" in integration_results.get("integrations", {})
+
+    # Generate integration configuration files
+    # 1. MQTT Broker Configuration
+    if has_mqtt_broker:
+        mqtt_int = integration_results["integrations"]["mqtt_broker"]
+        for provider_info in mqtt_int.get("providers", []):
+            provider_id = provider_info["service_id"]
+            instance_name = provider_info["instance_name"]
+
+            if provider_id == "mosquitto":
+                # Generate Mosquitto configuration
+                mqtt_username = integration_settings.mqtt.get("username", "")
+                mqtt_password = integration_settings.mqtt.get("password", "")
+                mqtt_enable_tls = integration_settings.mqtt.get("enable_tls", False)
+                mqtt_tls_port = integration_settings.mqtt.get("tls_port", 8883)
+
+                config_stage.add(
+                    f"configs/{instance_name}/mosquitto.conf",
+                    partial(
+                        generate_mosquitto_config,
+                        username=mqtt_username,
+                        password=mqtt_password,
+                        enable_tls=mqtt_enable_tls,
+                        tls_port=mqtt_tls_port,
+                    ),
                 )
-                zip_file.writestr("monitor.sh", monitor_script)
 
-            # Generate Ignition database auto-registration script if applicable
-            has_ignition = any(
-                inst.app_id == "ignition" for inst in stack_config.instances
-            )
-            has_databases = any(
-                inst.app_id in ["postgres", "mariadb", "mssql"]
-                for inst in stack_config.instances
-            )
+                if mqtt_username and mqtt_password:
+                    config_stage.add(
+                        f"configs/{instance_name}/passwd",
+                        partial(
+                            generate_mosquitto_password_file,
+                            mqtt_username,
+                            mqtt_password,
+                        ),
+                    )
 
-            if has_ignition and has_databases:
-                # Detect integrations to find database connections
-                instances_for_detection = [
-                    {
-                        "app_id": inst.app_id,
-                        "instance_name": inst.instance_name,
-                        "config": inst.config,
-                    }
-                    for inst in stack_config.instances
-                ]
-                engine = get_integration_engine()
-                detection = engine.detect_integrations(instances_for_detection)
-
-                if "db_provider" in detection.get("integrations", {}):
-                    db_int = detection["integrations"]["db_provider"]
-
-                    # Find databases that should be auto-registered with Ignition
-                    ignition_dbs = []
-                    for client in db_int.get("clients", []):
-                        if client["service_id"] == "ignition":
-                            for provider in client.get("matched_providers", []):
-                                ignition_dbs.append(
-                                    {
-                                        "type": provider["service_id"],
-                                        "instance_name": provider["instance_name"],
-                                        "config": provider["config"],
-                                    }
-                                )
-
-                    if ignition_dbs:
-                        # Get Ignition admin credentials
-                        ignition_inst = next(
-                            (
-                                inst
-                                for inst in stack_config.instances
-                                if inst.app_id == "ignition"
-                            ),
-                            None,
-                        )
-                        if ignition_inst:
-                            ignition_host = ignition_inst.instance_name
-                            ignition_port = ignition_inst.config.get("http_port", 8088)
-                            admin_username = ignition_inst.config.get(
-                                "admin_username", "admin"
-                            )
-                            admin_password = ignition_inst.config.get(
-                                "admin_password", "password"
-                            )
-
-                            # Generate the registration script
-                            db_registration_script = (
-                                generate_ignition_db_registration_script(
-                                    ignition_host=ignition_host,
-                                    ignition_port=ignition_port,
-                                    admin_username=admin_username,
-                                    admin_password=admin_password,
-                                    databases=ignition_dbs,
-                                )
-                            )
-
-                            zip_file.writestr(
-                                "scripts/register_databases.py", db_registration_script
-                            )
-                            zip_file.writestr(
-                                "scripts/requirements.txt", generate_requirements_file()
-                            )
-
-            # Generate Ignition initialization script if Ignition is present
-            has_postgres = any(
-                inst.app_id == "postgres" for inst in stack_config.instances
-            )
+    # Generate Prometheus config files for all Prometheus instances
+    for instance in stack.context.instances_of("prometheus"):
+        config_stage.add(
+            f"configs/{instance.instance_name}/prometheus.yml",
+            generate_prometheus_config,
+        )
 
-            if has_ignition:
-                # Load catalog for volume path extraction
-                catalog = load_catalog()
-                catalog_dict_download = {
-                    app["id"]: app for app in catalog["applications"]
-                }
+    # 2. Grafana Datasource Provisioning
+    if "visualization" in integration_results.get("integrations", {}):
+        viz_int = integration_results["integrations"]["visualization"]
+        grafana_instance = viz_int.get("provider")
 
-                ignition_instances = [
-                    inst for inst in stack_config.instances if inst.app_id == "ignition"
-                ]
+        if grafana_instance:
+            datasources_config = []
 
-                # Get Ignition and PostgreSQL configs for database auto-configuration
-                ignition_config = None
-                postgres_config = None
-                for inst in stack_config.instances:
-                    if inst.app_id == "ignition":
-                        ignition_config = inst
-                    elif inst.app_id == "postgres":
-                        postgres_config = inst
+            for ds in viz_int.get("datasources", []):
+                ds_type = ds["service_id"]
+                ds_instance_name = ds["instance_name"]
+                ds_config = ds["config"]
 
-                init_script = """#!/bin/bash
-# Ignition Volume Initialization Script
-# This script handles the two-phase startup for Ignition to properly initialize volumes
+                datasources_config.append(
+                    {
+                        "type": ds_type,
+                        "instance_name": ds_instance_name,
+                        "config": ds_config,
+                    }
+                )
 
-set -e
+            if datasources_config:
+                config_stage.add(
+                    f"configs/{grafana_instance}/provisioning/datasources/auto.yaml",
+                    partial(
+                        cached_config_file,
+                        "grafana_datasources",
+                        datasources_config,
+                        partial(generate_grafana_datasources, datasources_config),
+                    ),
+                )
 
-echo "🚀 Ignition Stack Initialization Script"
-echo "========================================"
+    # 3. Keycloak Realm Configuration - Save to file
+    if keycloak_realm_config:
+        # Use the pre-generated realm config (ensures secrets match)
+        realm_name = integration_settings.oauth.get("realm_name", "iiot")
+        config_stage.add(
+            f"configs/keycloak/import/realm-{realm_name}.json",
+            partial(json.dumps, keycloak_realm_config, indent=2),
+        )
 
-# Create required directories for config files (if any)
-# Note: Data directories are managed as Docker named volumes
-echo ""
-echo "📁 Creating config directories..."
-"""
-                # Add directory creation only for config file bind mounts (not data directories)
-                config_dirs = set()
-                for instance in stack_config.instances:
-                    app = catalog_dict_download.get(instance.app_id)
-                    if app and "volumes" in app["default_config"]:
-                        for vol in app["default_config"]["volumes"]:
-                            if ":" in vol and vol.startswith("./"):
-                                local_path = vol.split(":")[0]
-                                local_path = local_path.replace(
-                                    "{instance_name}", instance.instance_name
-                                )
-                                # Only add parent directory of config files
-                                if "/" in local_path:
-                                    parent_dir = "/".join(local_path.split("/")[:-1])
-                                    if parent_dir:
-                                        config_dirs.add(parent_dir)
-
-                if config_dirs:
-                    for config_dir in sorted(config_dirs):
-                        init_script += f"""mkdir -p {config_dir}
-"""
-                else:
-                    init_script += """# No config directories required
-"""
+    return config_stage
 
-                init_script += """
-echo "✅ Config directories ready"
 
-# With named volumes, Ignition can start normally without two-phase initialization
-# Docker manages the named volumes automatically
-echo ""
-echo "🚀 Starting all services..."
-echo "============================"
-"""
+def stack_readme(stack: GeneratedStack) -> str:
+    """README.md content for a stack"""
+    stack_config = stack.stack_config
+    global_settings = stack.global_settings
+    integration_settings = stack.integration_settings
+    integration_results = stack.integration_results
+    instances = stack_config.instances
 
-                init_script += """
-    docker compose up -d
+    services = [
+        {
+            "name": instance.instance_name,
+            "app_id": instance.app_id,
+            "version": instance.config.get("version", "latest"),
+        }
+        for instance in instances
+    ]
+
+    service_urls = []
+    for instance in instances:
+        renderer = stack.renderers.get(instance.app_id)
+        if renderer and renderer.has_ports:
+            service_urls.append(
+                {
+                    "name": instance.instance_name,
+                    "url": renderer.readme_url(instance, stack.port_allocation),
+                }
+            )
 
-    echo ""
-    echo "⏳ Waiting for services to start..."
-    sleep 10
+    # Add PostgreSQL connection instructions if applicable
+    postgres = None
+    context = stack.context
+    if context.has_ignition and context.has_app("postgres"):
+        postgres = postgres_connection(context.instances_of("postgres")[0])
 
-    # Wait for Ignition to be healthy (if present)
-    WAIT_TIME=0
-    MAX_WAIT=90
+    extra_sections = []
 
-    while [ $WAIT_TIME -lt $MAX_WAIT ]; do
-"""
+    # Add Keycloak SSO section if configured
+    if stack.keycloak_clients:
+        realm_name = integration_settings.oauth.get("realm_name", "iiot")
+        extra_sections.append(
+            generate_keycloak_readme_section(realm_name, stack.keycloak_clients)
+        )
 
-                for inst in ignition_instances:
-                    service_name = inst.instance_name
-                    container_name = f"{global_settings.stack_name}-{service_name}"
-                    init_script += f"""        HEALTH=$(docker inspect --format='{{{{.State.Health.Status}}}}' {container_name} 2>/dev/null || echo "starting")
-        if [ "$HEALTH" = "healthy" ]; then
-            echo "✅ {service_name} is healthy!"
-            break
-        fi
-"""
+    # Add Ignition database auto-registration section if applicable
+    ignition_db_list = []
+    if "db_provider" in integration_results.get("integrations", {}):
+        db_int = integration_results["integrations"]["db_provider"]
+
+        # Find Ignition instances that will use databases
+        for client in db_int.get("clients", []):
+            if client["service_id"] == "ignition" and client.get("auto_register"):
+                # Get compatible databases for this Ignition instance
+                for provider in client.get("matched_providers", []):
+                    ignition_db_list.append(
+                        {
+                            "type": provider["service_id"],
+                            "instance_name": provider["instance_name"],
+                            "config": provider["config"],
+                        }
+                    )
+                # Every Ignition instance matches the same databases
+                break
 
-                init_script += """
-        echo "   Status: $HEALTH - waiting... (${WAIT_TIME}s/${MAX_WAIT}s)"
-        sleep 10
-        WAIT_TIME=$((WAIT_TIME + 10))
-    done
+    if ignition_db_list:
+        extra_sections.append(generate_ignition_db_readme_section(ignition_db_list))
 
-    if [ $WAIT_TIME -ge $MAX_WAIT ]; then
-        echo "⚠️  Warning: Service health check timed out, but services are running"
-    fi
-"""
+    # Add ntfy monitoring section if enabled
+    if global_settings.ntfy_enabled and global_settings.ntfy_topic:
+        extra_sections.append(
+            generate_ntfy_readme_section(
+                global_settings.ntfy_server, global_settings.ntfy_topic
+            )
+        )
 
-                # If PostgreSQL is present, create connection instructions
-                if has_postgres and ignition_config and postgres_config:
-                    db_name = postgres_config.config.get("database", "ignition")
-                    db_user = postgres_config.config.get("username", "ignition")
-                    db_pass = postgres_config.config.get("password", "password")
-                    db_host = postgres_config.instance_name
-                    db_port = postgres_config.config.get("port", 5432)
-
-                    # Create config directory for Ignition
-                    init_script += f"""
-# Create PostgreSQL connection instructions
-mkdir -p "./configs/{ignition_config.instance_name}"
-cat > "./configs/{ignition_config.instance_name}/postgres_connection_info.txt" <<'DBINFO'
-PostgreSQL Database Connection Information
-==========================================
-
-To add the PostgreSQL datasource in Ignition Gateway:
-
-1. Open Ignition Gateway at http://localhost:{ignition_config.config.get("http_port", 8088)}
-2. Go to Config → Databases → Connections
-3. Click "Create new Database Connection"
-4. Enter the following details:
-
-   Name: PostgreSQL
-   Connect URL: jdbc:postgresql://{db_host}:{db_port}/{db_name}
-   Username: {db_user}
-   Password: {db_pass}
-   Status Query: SELECT 1
-   Max Connections: 8
-
-5. Click "Create New Database Connection"
-6. Test the connection to verify it works
-
-Database Credentials:
-- Host: {db_host}
-- Port: {db_port}
-- Database: {db_name}
-- Username: {db_user}
-- Password: {db_pass}
-DBINFO
-echo "   📄 PostgreSQL connection info saved to configs/{ignition_config.instance_name}/postgres_connection_info.txt"
-"""
+    return render_template(
+        README,
+        stack_name=global_settings.stack_name,
+        timezone=global_settings.timezone,
+        restart_policy=global_settings.restart_policy,
+        services=services,
+        required_dirs=config_directories(instances, stack.catalog_index),
+        has_ignition=context.has_ignition,
+        service_urls=service_urls,
+        port_assignments=stack.port_allocation.reassignments(),
+        postgres=postgres,
+        extra_sections="".join(extra_sections),
+    )
+
+
+def config_directories(instances: List[Any], catalog_index: CatalogIndex) -> List[str]:
+    """
+    Sorted parent directories of the stack's local bind-mounted config files
+    Named volumes are managed by Docker and need no directory.
+    """
+    directories = set()
+    for instance in instances:
+        for vol in catalog_index.volume_templates.get(instance.app_id, ()):
+            if vol.is_local_bind:
+                # Local path from volume mapping (e.g., "./configs/traefik/traefik.yml:/etc/traefik/traefik.yml")
+                # with the {instance_name} placeholder replaced
+                local_path = vol.source.replace(
+                    "{instance_name}", instance.instance_name
+                )
 
-                init_script += """
+                # Only add parent directory of config files, not data directories
+                if "/" in local_path:
+                    parent_dir = "/".join(local_path.split("/")[:-1])
+                    if parent_dir:  # Ensure it's not empty
+                        directories.add(parent_dir)
+    return sorted(directories)
+
+
+def postgres_connection(instance: Any) -> Dict[str, Any]:
+    """Connection details of a PostgreSQL instance for Ignition instructions"""
+    config = instance.config
+    return {
+        "host": instance.instance_name,
+        "port": config.get("port", 5432),
+        "database": config.get("database", "ignition"),
+        "username": config.get("username", "ignition"),
+        "password": config.get("password", "password"),
+    }
 
-echo ""
-echo "✅ Services started successfully!"
-echo ""
-echo "📊 Waiting for services to be fully ready..."
-sleep 10
 
-echo ""
-echo "🎉 Stack is ready!"
-echo ""
-echo "📋 Service URLs:"
-"""
+@app.post("/download")
+def download_stack(
+    stack_config: StackConfig,
+    request: Request,
+    parts: Optional[str] = None,
+    format: Optional[str] = None,
+    level: Optional[int] = None,
+    deterministic: bool = False,
+):
+    """
+    Download complete stack as an archive (ZIP unless format says otherwise)
+    parts (as for /generate) limits which generated files are included;
+    scripts and Traefik configs are always added. format is one of
+    zip-deflate (default), zip-store, tar.gz or tar.zst, and level sets the
+    compression level within that format's range. deterministic gives
+    byte-identical archives for identical requests, with an ETag (supports
+    If-None-Match / 304).
+    """
+    requested = requested_parts(parts)
+    archive_format, archive_level = requested_archive(format, level)
+    require_deterministic_key(deterministic)
+    # Checked before anything is generated or streamed
+    module_paths = stored_module_paths(stack_config.instances)
+    try:
+        generation = StackGeneration(stack_config, requested, deterministic)
+        generated = generation.result()
+        context = generation.context
+        global_settings = context.global_settings
+
+        # Small generated files are prepared up front so failures still get an
+        # error response; the archive itself is streamed as it is compressed
+        entries = []
+        if "docker_compose" in generated:
+            entries.append(
+                ArchiveEntry("docker-compose.yml", generated["docker_compose"])
+            )
+        if "env" in generated:
+            entries.append(ArchiveEntry(".env", generated["env"]))
+        if "readme" in generated:
+            entries.append(ArchiveEntry("README.md", generated["readme"]))
 
-                # Add service URLs
-                for instance in stack_config.instances:
-                    if instance.app_id == "ignition":
-                        http_port = instance.config.get("http_port", 8088)
-                        if has_traefik:
-                            subdomain = (
-                                instance.instance_name.split("-")[0]
-                                if "-" in instance.instance_name
-                                else instance.instance_name
-                            )
-                            init_script += f"""echo "   🔧 {instance.instance_name}: http://{subdomain}.localhost (via Traefik) or http://localhost:{http_port}"
-"""
-                        else:
-                            init_script += f"""echo "   🔧 {instance.instance_name}: http://localhost:{http_port}"
-"""
+        # Add generated config files from integrations (0o644 = rw-r--r--)
+        for file_path, content in generated.get("config_files", {}).items():
+            entries.append(ArchiveEntry(file_path, content, mode=0o644))
 
-                if has_traefik:
-                    init_script += """echo "   🌐 Traefik Dashboard: http://localhost:8080"
-"""
+        # Create directory structure placeholders
+        entries.append(ArchiveEntry("configs/.gitkeep", ""))
+        entries.append(ArchiveEntry("scripts/.gitkeep", ""))
 
-                init_script += """
-echo ""
-echo "💡 To stop the stack: docker compose down"
-echo "💡 To view logs: docker compose logs -f"
-echo ""
-"""
+        # Add ntfy monitoring script if enabled
+        if global_settings.ntfy_enabled and global_settings.ntfy_topic:
+            monitor_script = generate_ntfy_monitor_script(
+                ntfy_server=global_settings.ntfy_server,
+                ntfy_topic=global_settings.ntfy_topic,
+                stack_name=global_settings.stack_name,
+            )
+            entries.append(ArchiveEntry("monitor.sh", monitor_script))
 
-                zip_file.writestr("start.sh", init_script)
+        # Generate Ignition database auto-registration script if applicable
+        if context.has_ignition and context.has_databases:
+            for path, content in ignition_db_registration_files(context):
+                entries.append(ArchiveEntry(path, content))
 
-                # Also create a Windows batch file version
-                win_script = f"""@echo off
-REM Ignition Volume Initialization Script for Windows
-REM This script handles the two-phase startup for Ignition to properly initialize volumes
+        # Generate Ignition initialization scripts if Ignition is present
+        if context.has_ignition:
+            for path, content in ignition_start_scripts(
+                context, generated["port_assignments"]
+            ):
+                entries.append(ArchiveEntry(path, content))
 
-echo Ignition Stack Initialization Script
-echo ========================================
-echo.
+        # Generate Traefik configuration files if Traefik is present
+        if context.has_traefik:
+            for file_path, content in traefik_config_stage(context).render().items():
+                entries.append(ArchiveEntry(file_path, content))
 
-REM For Windows, we'll use a simpler approach - just start normally
-REM Users can manually do two-phase if needed
+        if deterministic:
+            # Every entry is listed (and hashed) before the archive is written
+            entries.extend(
+                uploaded_module_entries(context, module_paths, deferred=True)
+            )
+        else:
+            entries = itertools.chain(
+                entries, uploaded_module_entries(context, module_paths)
+            )
 
-echo Starting stack...
-docker compose up -d
+        return archive_response(
+            request,
+            entries,
+            archive_format,
+            archive_level,
+            global_settings.stack_name,
+            deterministic,
+        )
 
-echo.
-echo Stack is starting...
-echo.
-echo Service URLs:
-"""
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-                for instance in stack_config.instances:
-                    if instance.app_id == "ignition":
-                        http_port = instance.config.get("http_port", 8088)
-                        if has_traefik:
-                            subdomain = (
-                                instance.instance_name.split("-")[0]
-                                if "-" in instance.instance_name
-                                else instance.instance_name
-                            )
-                            win_script += f"""echo    {instance.instance_name}: http://{subdomain}.localhost or http://localhost:{http_port}
-"""
-                        else:
-                            win_script += f"""echo    {instance.instance_name}: http://localhost:{http_port}
-"""
 
-                if has_traefik:
-                    win_script += """echo    Traefik Dashboard: http://localhost:8080
-"""
+def archive_response(
+    request: Request,
+    entries: Iterable[ArchiveEntry],
+    archive_format: ArchiveFormat,
+    archive_level: Optional[int],
+    filename: str,
+    deterministic: bool = False,
+) -> Response:
+    """
+    Stream entries as an archive attachment
+    Deterministic archives are sorted by name and carry an ETag of their
+    content, so a matching If-None-Match gets a 304 without compressing.
+    With the artifact store enabled they are written to it once and served
+    from there.
+    """
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}{archive_format.extension}"'
+    }
+    if deterministic:
+        entries = sorted(entries, key=lambda entry: entry.name)
+        etag = archive_etag(entries, archive_format, archive_level)
+        cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers)
+        headers.update(cache_headers)
+
+        store = get_artifact_store()
+        if store.enabled:
+            name = etag.strip('"') + archive_format.extension
+            try:
+                path = store.get(name) or store.put(
+                    name, archive_format.iter_archive(entries, archive_level, True)
+                )
+            except OSError as e:
+                logger.warning(f"Could not store archive {name}: {e}")
+                store.record_error()
+            else:
+                accel_prefix = request.headers.get(ACCEL_PREFIX_HEADER)
+                if accel_prefix:
+                    # nginx sends the file; this worker is done
+                    headers["X-Accel-Redirect"] = accel_prefix + name
+                    return Response(
+                        media_type=archive_format.media_type, headers=headers
+                    )
+                return FileResponse(
+                    path, media_type=archive_format.media_type, headers=headers
+                )
 
-                win_script += """
-echo.
-echo To stop: docker compose down
-echo To view logs: docker compose logs -f
-echo.
-pause
-"""
+    return StreamingResponse(
+        archive_format.iter_archive(entries, archive_level, deterministic),
+        media_type=archive_format.media_type,
+        headers=headers,
+    )
 
-                zip_file.writestr("start.bat", win_script)
 
-            # Generate Traefik configuration files if Traefik is present
-            if has_traefik:
-                # Get integration settings for Traefik
-                integration_settings = (
-                    stack_config.integration_settings or IntegrationSettings()
-                )
-                enable_https = integration_settings.reverse_proxy.get(
-                    "enable_https", False
-                )
-                letsencrypt_email = integration_settings.reverse_proxy.get(
-                    "letsencrypt_email", ""
+def stored_module_paths(instances: List[InstanceConfig]) -> Dict[str, str]:
+    """
+    Module store paths of the modules Ignition instances reference by sha256
+    Raises a 409 naming every module the store does not have (uploaded to
+    another server, or evicted), so the client can upload them again.
+    """
+    module_store = get_module_store()
+    paths: Dict[str, str] = {}
+    missing = []
+    for instance in instances:
+        if instance.app_id != "ignition":
+            continue
+        for module in instance.config.get("uploaded_modules", []):
+            sha256 = module.get("sha256")
+            if not sha256 or sha256 in paths:
+                continue
+            path = module_store.find(sha256)
+            if path is None:
+                missing.append(
+                    {
+                        "instance_name": instance.instance_name,
+                        "filename": module.get("filename", "module.modl"),
+                        "sha256": sha256,
+                    }
                 )
+            else:
+                paths[sha256] = path
+
+    if missing:
+        names = ", ".join(module["filename"] for module in missing)
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": f"Uploaded modules are no longer available, upload them again: {names}",
+                "missing_modules": missing,
+            },
+        )
+    return paths
 
-                # Main Traefik configuration using config generator
-                traefik_config = generate_traefik_static_config(
-                    enable_https=enable_https, letsencrypt_email=letsencrypt_email
-                )
-                zip_file.writestr("configs/traefik/traefik.yml", traefik_config)
-
-                # Define web services and their ports (must match the docker compose generation)
-                web_service_ports = {
-                    "ignition": lambda c: str(c.get("http_port", 8088)),
-                    "grafana": lambda c: str(c.get("port", 3000)),
-                    "nodered": lambda c: str(c.get("port", 1880)),
-                    "n8n": lambda c: str(c.get("port", 5678)),
-                    "keycloak": lambda c: str(c.get("port", 8180)),
-                    "prometheus": lambda c: "9090",
-                    "dozzle": lambda c: "8080",
-                    "portainer": lambda c: "9000",
-                    "guacamole": lambda c: "8080",
-                    "authentik": lambda c: "9000",
-                    "authelia": lambda c: "9091",
-                    "mailhog": lambda c: "8025",
-                    "influxdb": lambda c: "8086",
-                    "chronograf": lambda c: "8888",
-                }
 
-                # Generate dynamic routing for each web service
-                services_for_traefik = []
-                for instance in stack_config.instances:
-                    if (
-                        instance.app_id != "traefik"
-                        and instance.app_id in web_service_ports
-                    ):
-                        service_name = instance.instance_name
-                        config = instance.config
-
-                        # Create subdomain from service name
-                        subdomain = (
-                            service_name.split("-")[0]
-                            if "-" in service_name
-                            else service_name
-                        )
-
-                        # Get the port using the port function
-                        port = int(web_service_ports[instance.app_id](config))
-
-                        services_for_traefik.append(
-                            {
-                                "instance_name": service_name,
-                                "subdomain": subdomain,
-                                "port": port,
-                            }
-                        )
-
-                # Generate dynamic config using config generator
-                base_domain = integration_settings.reverse_proxy.get(
-                    "base_domain", "localhost"
-                )
-                dynamic_config = generate_traefik_dynamic_config(
-                    services=services_for_traefik,
-                    domain=base_domain,
-                    enable_https=enable_https,
+def uploaded_module_entries(
+    context: GenerationContext,
+    module_paths: Dict[str, str],
+    deferred: bool = False,
+) -> Iterator[ArchiveEntry]:
+    """
+    Uploaded module files of the Ignition instances
+    Modules referenced by sha256 are streamed from their module_paths (see
+    stored_module_paths()) while the archive is written. Ones carrying
+    base64 content (configs saved before the store existed) are decoded one
+    at a time, so at most one module's content is held in memory; deferred
+    entries are decoded once up front for their digest and again when
+    written.
+    """
+    for instance in context.instances_of("ignition"):
+        uploaded_modules = instance.config.get("uploaded_modules", [])
+        for module in uploaded_modules:
+            filename = module.get("filename", "module.modl")
+            sha256 = module.get("sha256")
+            if sha256:
+                yield ArchiveEntry(
+                    f"modules/{instance.instance_name}/{filename}",
+                    path=module_paths[sha256],
+                    digest=sha256,
                 )
-                zip_file.writestr(
-                    "configs/traefik/dynamic/services.yml", dynamic_config
+                continue
+
+            # Decode base64 module file and add to the archive
+            encoded_content = module.get("encoded", "")
+            if encoded_content:
+                try:
+                    content = base64.b64decode(encoded_content)
+                except Exception as e:
+                    logger.error(f"Error decoding module {filename}: {e}")
+                    continue
+                name = f"modules/{instance.instance_name}/{filename}"
+                if deferred:
+                    yield ArchiveEntry(
+                        name,
+                        partial(base64.b64decode, encoded_content),
+                        digest=hashlib.sha256(content).hexdigest(),
+                    )
+                else:
+                    yield ArchiveEntry(name, content)
+
+
+def ignition_db_registration_files(
+    context: GenerationContext,
+) -> List[Tuple[str, str]]:
+    """Database auto-registration script for the first Ignition gateway"""
+    detection = context.detection
+    if "db_provider" not in detection.get("integrations", {}):
+        return []
+    db_int = detection["integrations"]["db_provider"]
+
+    # Find databases that should be auto-registered with Ignition
+    ignition_dbs = []
+    for client in db_int.get("clients", []):
+        if client["service_id"] == "ignition":
+            for provider in client.get("matched_providers", []):
+                ignition_dbs.append(
+                    {
+                        "type": provider["service_id"],
+                        "instance_name": provider["instance_name"],
+                        "config": provider["config"],
+                    }
                 )
+            # Every Ignition instance matches the same databases
+            break
+    if not ignition_dbs:
+        return []
+
+    # Get Ignition admin credentials
+    ignition_inst = context.instances_of("ignition")[0]
+    db_registration_script = generate_ignition_db_registration_script(
+        ignition_host=ignition_inst.instance_name,
+        ignition_port=ignition_inst.config.get("http_port", 8088),
+        admin_username=ignition_inst.config.get("admin_username", "admin"),
+        admin_password=ignition_inst.config.get("admin_password", "password"),
+        databases=ignition_dbs,
+    )
+    return [
+        ("scripts/register_databases.py", db_registration_script),
+        ("scripts/requirements.txt", generate_requirements_file()),
+    ]
+
+
+def ignition_start_scripts(
+    context: GenerationContext, port_assignments: List[Dict[str, Any]]
+) -> List[Tuple[str, str]]:
+    """start.sh and start.bat for a stack with Ignition gateways"""
+    ignition_instances = context.instances_of("ignition")
+    stack_name = context.global_settings.stack_name
+    gateways = []
+    for inst in ignition_instances:
+        service_name = inst.instance_name
+        gateways.append(
+            {
+                "service_name": service_name,
+                "container_name": f"{stack_name}-{service_name}",
+                "http_port": reported_host_port(
+                    port_assignments,
+                    service_name,
+                    inst.config.get("http_port", 8088),
+                ),
+                "subdomain": (
+                    service_name.split("-")[0] if "-" in service_name else service_name
+                ),
+            }
+        )
 
-            # Add uploaded module files for Ignition instances
-            for instance in stack_config.instances:
-                if instance.app_id == "ignition":
-                    uploaded_modules = instance.config.get("uploaded_modules", [])
-                    if uploaded_modules:
-                        for module in uploaded_modules:
-                            # Decode base64 module file and add to zip
-                            filename = module.get("filename", "module.modl")
-                            encoded_content = module.get("encoded", "")
-                            if encoded_content:
-                                try:
-                                    content = base64.b64decode(encoded_content)
-                                    zip_file.writestr(
-                                        f"modules/{instance.instance_name}/{filename}",
-                                        content,
-                                    )
-                                except Exception as e:
-                                    logger.error(
-                                        f"Error decoding module {filename}: {e}"
-                                    )
-
-        zip_buffer.seek(0)
+    # PostgreSQL connection instructions use the last Ignition and
+    # PostgreSQL instances
+    postgres = None
+    postgres_instances = context.instances_of("postgres")
+    if postgres_instances:
+        ignition_config = ignition_instances[-1]
+        postgres = postgres_connection(postgres_instances[-1])
+        postgres["ignition_instance"] = ignition_config.instance_name
+        postgres["ignition_port"] = reported_host_port(
+            port_assignments,
+            ignition_config.instance_name,
+            ignition_config.config.get("http_port", 8088),
+        )
 
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f'attachment; filename="{global_settings.stack_name}.zip"'
-            },
+    script_context = {"gateways": gateways, "has_traefik": context.has_traefik}
+    return [
+        (
+            "start.sh",
+            render_template(
+                START_SH,
+                config_dirs=config_directories(
+                    context.instances, context.catalog_index
+                ),
+                postgres=postgres,
+                **script_context,
+            ),
+        ),
+        ("start.bat", render_template(START_BAT, **script_context)),
+    ]
+
+
+def traefik_config_stage(context: GenerationContext) -> ConfigFileStage:
+    """Queue the Traefik static config and dynamic routes of a stack"""
+    reverse_proxy = context.integration_settings.reverse_proxy
+    enable_https = reverse_proxy.get("enable_https", False)
+
+    # Main Traefik configuration using config generator
+    traefik_stage = ConfigFileStage()
+    traefik_stage.add(
+        "configs/traefik/traefik.yml",
+        partial(
+            generate_traefik_static_config,
+            enable_https=enable_https,
+            letsencrypt_email=reverse_proxy.get("letsencrypt_email", ""),
+        ),
+    )
+
+    # Dynamic routing for each web service, on the port its compose labels use
+    services_for_traefik = []
+    for instance in context.instances:
+        renderer = context.renderers.get(instance.app_id)
+        if instance.app_id == "traefik" or renderer is None:
+            continue
+        port = renderer.traefik_port(instance.config)
+        if port is None:
+            continue
+
+        service_name = instance.instance_name
+        services_for_traefik.append(
+            {
+                "instance_name": service_name,
+                # Create subdomain from service name
+                "subdomain": (
+                    service_name.split("-")[0] if "-" in service_name else service_name
+                ),
+                "port": int(port),
+            }
         )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Generate dynamic config using config generator
+    traefik_stage.add(
+        "configs/traefik/dynamic/services.yml",
+        partial(
+            generate_traefik_dynamic_config,
+            services=services_for_traefik,
+            domain=reverse_proxy.get("base_domain", "localhost"),
+            enable_https=enable_https,
+        ),
+    )
+    return traefik_stage
 
 
 @app.get("/download/docker-installer/linux")
@@ -1724,24 +1540,34 @@ def download_windows_installer():
 
 
 @app.post("/generate-offline-bundle")
-def generate_offline_bundle(stack_config: StackConfig):
-    """Generate offline bundle with all Docker images and configurations"""
+def generate_offline_bundle(
+    stack_config: StackConfig,
+    request: Request,
+    format: Optional[str] = None,
+    level: Optional[int] = None,
+    deterministic: bool = False,
+):
+    """
+    Generate offline bundle with all Docker images and configurations
+    format, level and deterministic work as for /download.
+    """
+    archive_format, archive_level = requested_archive(format, level)
+    require_deterministic_key(deterministic)
     try:
         # Generate the stack first
-        generated = generate_stack(stack_config)
-
-        # Get global settings for stack name
-        global_settings = stack_config.global_settings or GlobalSettings()
+        generation = StackGeneration(stack_config, STACK_PARTS, deterministic)
+        generated = generation.result()
+        context = generation.context
+        global_settings = context.global_settings
 
         # Create a shell script to pull and save all Docker images
-        catalog = load_catalog()
-        catalog_dict = {app["id"]: app for app in catalog["applications"]}
+        catalog_index = context.catalog_index
 
         images_to_pull = []
-        for instance in stack_config.instances:
-            app = catalog_dict.get(instance.app_id)
-            if not app or not app.get("enabled", False):
+        for instance in context.instances:
+            if not catalog_index.is_enabled(instance.app_id):
                 continue
+            app = catalog_index.get(instance.app_id)
 
             version = instance.config.get(
                 "version", app.get("default_version", "latest")
@@ -1749,234 +1575,35 @@ def generate_offline_bundle(stack_config: StackConfig):
             image = f"{app['image']}:{version}"
             images_to_pull.append(image)
 
-        # Generate pull and save script
-        pull_script = """#!/bin/bash
-# Offline Bundle Image Pull and Save Script
-# This script pulls all required Docker images and saves them to a tar file
-# for offline/airgapped installation
-
-set -e
-
-echo "🚀 Offline Bundle Generator"
-echo "============================"
-echo ""
-echo "This script will:"
-echo "  1. Pull all required Docker images"
-echo "  2. Save images to docker-images.tar"
-echo "  3. Create a complete offline bundle"
-echo ""
-
-# Colors
-GREEN='\\033[0;32m'
-YELLOW='\\033[1;33m'
-NC='\\033[0m' # No Color
-
-"""
-
-        for image in images_to_pull:
-            pull_script += f"""echo -e "${{GREEN}}[INFO]${{NC}} Pulling {image}..."
-docker pull {image}
-
-"""
-
-        pull_script += f"""
-echo ""
-echo -e "${{GREEN}}[INFO]${{NC}} Saving all images to docker-images.tar..."
-docker save -o docker-images.tar {' '.join(images_to_pull)}
-
-echo ""
-echo -e "${{GREEN}}[INFO]${{NC}} Compressing images..."
-gzip docker-images.tar
-
-echo ""
-echo "✅ Offline bundle created successfully!"
-echo ""
-echo "📦 Bundle contents:"
-echo "   - docker-images.tar.gz (all Docker images)"
-echo "   - docker-compose.yml"
-echo "   - .env"
-echo "   - All configuration files"
-echo ""
-echo "📋 To use on offline system:"
-echo "   1. Transfer all files to the offline system"
-echo "   2. Load images: gunzip -c docker-images.tar.gz | docker load"
-echo "   3. Run: docker compose up -d"
-echo ""
-"""
-
-        # Create load script for offline system
-        load_script = """#!/bin/bash
-# Offline Bundle Load Script
-# Run this on the airgapped/offline system to load Docker images
-
-set -e
-
-echo "🚀 Loading Docker images from offline bundle..."
-echo "==============================================="
-echo ""
-
-if [ ! -f "docker-images.tar.gz" ]; then
-    echo "ERROR: docker-images.tar.gz not found!"
-    echo "Please ensure the offline bundle files are in the current directory."
-    exit 1
-fi
-
-echo "Decompressing and loading images..."
-gunzip -c docker-images.tar.gz | docker load
-
-echo ""
-echo "✅ All images loaded successfully!"
-echo ""
-echo "Next steps:"
-echo "  1. Review docker-compose.yml and .env files"
-echo "  2. Create required directories (see README.md)"
-echo "  3. Run: docker compose up -d"
-echo ""
-"""
-
-        # Create README for offline bundle
-        offline_readme = """# Offline/Airgapped Installation Bundle
-
-This bundle contains everything needed to run your IIoT stack in an offline/airgapped environment.
-
-## Bundle Contents
-
-- `docker-images.tar.gz` - All required Docker images
-- `docker-compose.yml` - Docker Compose configuration
-- `.env` - Environment variables
-- `configs/` - Configuration files for services
-- `load-images.sh` - Script to load images on offline system
-- `README.md` - This file
-
-## Prerequisites (on offline system)
-
-- Docker installed and running
-- Docker Compose installed
-- Sufficient disk space for images (check file size)
-
-## Installation Steps
-
-### 1. Transfer Bundle
-
-Transfer all files from this bundle to your offline system using:
-- USB drive
-- Network transfer (if temporarily connected)
-- Any secure file transfer method
-
-### 2. Load Docker Images
-
-On the offline system, run:
-
-```bash
-chmod +x load-images.sh
-./load-images.sh
-```
-
-Or manually:
-
-```bash
-gunzip -c docker-images.tar.gz | docker load
-```
-
-### 3. Start the Stack
-
-Follow the same instructions as in the main README.md:
-
-```bash
-# Create required directories
-mkdir -p configs scripts
-
-# Start services
-docker compose up -d
-```
-
-## Verification
-
-Check that all images are loaded:
-
-```bash
-docker images
-```
-
-Check that all services are running:
-
-```bash
-docker compose ps
-```
-
-## Troubleshooting
-
-### Images not loading
-- Ensure docker-images.tar.gz is not corrupted
-- Check available disk space
-- Verify Docker daemon is running
-
-### Services failing to start
-- Check logs: `docker compose logs -f`
-- Verify all config files are present
-- Ensure ports are not in use
-
-## Support
-
-For issues and documentation, see the main README.md file.
-
----
-
-Generated by Ignition Stack Builder - Offline Bundle
-"""
-
         # Create ZIP file with offline bundle
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        entries = [
             # Add all generated files
-            zip_file.writestr("docker-compose.yml", generated["docker_compose"])
-            zip_file.writestr(".env", generated["env"])
-            zip_file.writestr("README.md", generated["readme"])
-            zip_file.writestr("OFFLINE-README.md", offline_readme)
-            zip_file.writestr("pull-images.sh", pull_script)
-            zip_file.writestr("load-images.sh", load_script)
-
-            # Add config files
-            for file_path, content in generated.get("config_files", {}).items():
-                info = zipfile.ZipInfo(file_path)
-                info.external_attr = 0o644 << 16
-                zip_file.writestr(info, content)
-
-            # Add instructions file
-            instructions = """OFFLINE BUNDLE CREATION INSTRUCTIONS
-=====================================
-
-Step 1: On a system WITH internet access:
------------------------------------------
-1. Extract this bundle
-2. Run: chmod +x pull-images.sh
-3. Run: ./pull-images.sh
-   This will download all Docker images and create docker-images.tar.gz
-
-Step 2: Transfer to offline system:
------------------------------------
-1. Copy ALL files including docker-images.tar.gz to offline system
-2. Use USB drive, secure network transfer, or approved method
-
-Step 3: On the OFFLINE system:
-------------------------------
-1. Run: chmod +x load-images.sh
-2. Run: ./load-images.sh
-3. Follow README.md to start the stack
-
-The docker-images.tar.gz file will be large (several GB).
-Ensure you have sufficient space and transfer capacity.
-"""
-            zip_file.writestr("INSTRUCTIONS.txt", instructions)
+            ArchiveEntry("docker-compose.yml", generated["docker_compose"]),
+            ArchiveEntry(".env", generated["env"]),
+            ArchiveEntry("README.md", generated["readme"]),
+            ArchiveEntry("OFFLINE-README.md", render_template(OFFLINE_README)),
+            ArchiveEntry(
+                "pull-images.sh", render_template(PULL_IMAGES_SH, images=images_to_pull)
+            ),
+            ArchiveEntry("load-images.sh", render_template(LOAD_IMAGES_SH)),
+        ]
 
-        zip_buffer.seek(0)
+        # Add config files
+        for file_path, content in generated.get("config_files", {}).items():
+            entries.append(ArchiveEntry(file_path, content, mode=0o644))
 
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f'attachment; filename="{global_settings.stack_name}-offline-bundle.zip"'
-            },
+        # Add instructions file
+        entries.append(
+            ArchiveEntry("INSTRUCTIONS.txt", render_template(OFFLINE_INSTRUCTIONS))
+        )
+
+        return archive_response(
+            request,
+            entries,
+            archive_format,
+            archive_level,
+            f"{global_settings.stack_name}-offline-bundle",
+            deterministic,
         )
 
     except Exception as e:
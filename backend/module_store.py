@@ -0,0 +1,83 @@
+"""
+Content-addressed store of uploaded Ignition modules
+Uploads are streamed to <sha256>.modl files, so each module is stored once
+and stack configs reference it by hash instead of carrying its content.
+Archives stream modules straight from these files. The store is bounded by
+total size like the artifact store: the least recently uploaded or
+downloaded modules are evicted first, and stacks referencing them are asked
+to upload them again.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from typing import IO, Any, Dict, Optional, Tuple
+
+from artifact_store import ArtifactStore
+
+# Uploads are read and hashed in pieces of this size
+CHUNK_SIZE = 1024 * 1024
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+class ModuleStore(ArtifactStore):
+    """Directory of module files named by their SHA-256, size-bounded LRU"""
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30):
+        super().__init__(directory, max_bytes)
+
+    def save(self, source: IO[bytes]) -> Tuple[str, int]:
+        """Store a module read from source; returns its SHA-256 and size"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while chunk := source.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            # Same content, same file: a repeat upload just replaces it
+            os.replace(tmp_path, self.path(self._name(sha256)))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._add(self._name(sha256), size)
+            self._evict()
+        return sha256, size
+
+    def find(self, sha256: Any) -> Optional[str]:
+        """Path of a stored module, or None if unknown (or not a SHA-256)"""
+        if not isinstance(sha256, str) or not _SHA256.fullmatch(sha256):
+            return None
+        return self.get(self._name(sha256))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["modules"] = stats.pop("archives")
+        return stats
+
+    @staticmethod
+    def _name(sha256: str) -> str:
+        return f"{sha256}.modl"
+
+
+# Singleton instance
+_store = None
+
+
+def get_module_store() -> ModuleStore:
+    """Get or create the module store singleton"""
+    global _store
+    if _store is None:
+        _store = ModuleStore(
+            os.getenv("MODULE_STORE_DIR", "")
+            or os.path.join(tempfile.gettempdir(), "stack-builder-modules"),
+            max_bytes=int(os.getenv("MODULE_STORE_MAX_MB", "2048")) * 1024 * 1024,
+        )
+    return _store
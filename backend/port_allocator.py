@@ -0,0 +1,180 @@
+"""
+Host port allocation across a generated stack
+Each instance asks for host ports from its config (or the catalog defaults),
+with no view of the rest of the stack, so multi-instance stacks collide on
+8088, 5432 and friends. The allocator marks every requested port in a bitmap,
+keeps the first claim on each port and moves later claims to the next free
+port above the one they asked for. Ports that are not plain numbers (e.g.
+"127.0.0.1:8080" or "${PORT}") are passed through untouched.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+MAX_PORT = 65535
+# Searches for a free port wrap around to the first unprivileged port
+MIN_DYNAMIC_PORT = 1024
+
+
+class PortBitmap:
+    """Set of used host ports with O(1) membership and claim"""
+
+    def __init__(self):
+        self._used = bytearray(MAX_PORT + 1)
+        # Where the search for a free port above a given port resumes
+        self._resume: Dict[int, int] = {}
+
+    def __contains__(self, port: int) -> bool:
+        return bool(self._used[port])
+
+    def claim(self, port: int) -> bool:
+        """Mark port used; False if it already was"""
+        if self._used[port]:
+            return False
+        self._used[port] = 1
+        return True
+
+    def claim_next_free(self, port: int) -> int:
+        """
+        Claim the first free port above port, wrapping around at 65535
+
+        Searches resume where the previous search from the same port stopped,
+        so N instances asking for the same port cost O(N) in total.
+        Raises ValueError when every port is taken.
+        """
+        start = self._resume.get(port, port + 1)
+        for candidate in _wrapped_range(start, port):
+            if not self._used[candidate]:
+                self._used[candidate] = 1
+                self._resume[port] = candidate + 1
+                return candidate
+        raise ValueError(f"No free host port left to replace {port}")
+
+
+def _wrapped_range(start: int, stop: int) -> Iterable[int]:
+    yield from range(start, MAX_PORT + 1)
+    yield from range(MIN_DYNAMIC_PORT, min(stop, MAX_PORT + 1))
+
+
+@dataclass(frozen=True, slots=True)
+class PortBinding:
+    """One "host:container" mapping of an instance"""
+
+    instance_name: str
+    container_port: str
+    requested: Any
+    host: Any
+
+    @property
+    def reassigned(self) -> bool:
+        return self.host != self.requested
+
+
+def _as_port(value: Any) -> Optional[int]:
+    """value as a host port number, or None if it is not a plain port"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        port = value
+    elif isinstance(value, str) and value.isdigit():
+        port = int(value)
+    else:
+        return None
+    return port if 0 < port <= MAX_PORT else None
+
+
+class PortAllocation:
+    """Host ports assigned to every instance of a stack"""
+
+    def __init__(self, bindings: List[PortBinding]):
+        self.bindings = bindings
+        self._moved: Dict[str, Dict[str, Any]] = {}
+        self._moved_requests: Dict[str, Dict[Optional[int], Any]] = {}
+
+        kept: Dict[str, Set[Optional[int]]] = {}
+        for binding in bindings:
+            name = binding.instance_name
+            if binding.reassigned:
+                self._moved.setdefault(name, {})[binding.container_port] = binding.host
+            else:
+                kept.setdefault(name, set()).add(_as_port(binding.host))
+
+        # A URL port maps to the moved binding unless the instance also
+        # kept that port for another binding
+        for binding in bindings:
+            name = binding.instance_name
+            requested = _as_port(binding.requested)
+            if binding.reassigned and requested not in kept.get(name, ()):
+                self._moved_requests.setdefault(name, {}).setdefault(
+                    requested, binding.host
+                )
+
+    def host_ports(self, instance_name: str) -> Optional[Dict[str, Any]]:
+        """Reassigned host ports of an instance by container port (None if none)"""
+        return self._moved.get(instance_name)
+
+    def host_port(self, instance_name: str, port: Any) -> Any:
+        """
+        Where a host port an instance asked for ended up
+
+        Used for URLs built from instance config (README, start scripts).
+        """
+        moved = self._moved_requests.get(instance_name)
+        if not moved:
+            return port
+        return moved.get(_as_port(port), port)
+
+    def reassignments(self) -> List[Dict[str, Any]]:
+        """Report of every binding moved off its requested port"""
+        return [
+            {
+                "service": binding.instance_name,
+                "container_port": binding.container_port,
+                "requested": _as_port(binding.requested),
+                "host_port": binding.host,
+            }
+            for binding in self.bindings
+            if binding.reassigned
+        ]
+
+
+def allocate_host_ports(
+    requests: Iterable[Tuple[str, str, Any]],
+) -> PortAllocation:
+    """
+    Assign host ports to (instance_name, container_port, requested) bindings
+
+    Every requested port is claimed first, in order, so a binding is only
+    moved if an earlier one asked for the same port, and a moved binding
+    never takes a port another binding asked for.
+    """
+    requests = list(requests)
+    used = PortBitmap()
+    displaced = []
+    for index, (_, _, requested) in enumerate(requests):
+        port = _as_port(requested)
+        if port is not None and not used.claim(port):
+            displaced.append(index)
+
+    hosts = [requested for _, _, requested in requests]
+    for index in displaced:
+        hosts[index] = used.claim_next_free(_as_port(hosts[index]))
+
+    return PortAllocation(
+        [
+            PortBinding(instance_name, container_port, requested, host)
+            for (instance_name, container_port, requested), host in zip(requests, hosts)
+        ]
+    )
+
+
+def reported_host_port(
+    assignments: List[Dict[str, Any]], instance_name: str, port: Any
+) -> Any:
+    """Where a requested host port ended up, from a reassignments() report"""
+    for assignment in assignments:
+        if assignment["service"] == instance_name and _as_port(
+            assignment["requested"]
+        ) == _as_port(port):
+            return assignment["host_port"]
+    return port
@@ -0,0 +1,724 @@
+"""
+Per-app service renderers for docker-compose generation
+One renderer per catalog app is built when the catalog is loaded; generation
+dispatches on app_id instead of walking an if/elif chain for every instance.
+Each renderer declares which stack-wide inputs it consumes, so inputs no
+renderer in the stack needs are never computed.
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from cache_utils import canonical_hash
+from catalog_store import CatalogIndex
+from config_generator import generate_email_env_vars, generate_oauth_env_vars
+from port_allocator import PortAllocation
+
+# Stack-wide inputs a renderer can consume
+INPUT_EMAIL = "email_testing"
+INPUT_OAUTH = "oauth_provider"
+INPUT_KEYCLOAK_REALM = "keycloak_realm"
+INPUT_STACK_INSTANCES = "stack_instances"
+
+
+@dataclass(slots=True)
+class RenderInputs:
+    """Stack-wide inputs shared by every renderer in one generation"""
+
+    stack_name: str
+    timezone: str
+    restart_policy: str
+    # Instances as submitted (without the auto-added pgAdmin/phpMyAdmin);
+    # empty unless a renderer consumes INPUT_STACK_INSTANCES
+    instances: List[Any]
+    has_traefik: bool
+    # Generated Keycloak clients; empty unless INPUT_KEYCLOAK_REALM is consumed
+    keycloak_clients: List[Dict]
+    base_domain: str
+    enable_https: bool
+    # (mailhog provider, from address) when email auto-configuration applies
+    email: Optional[Tuple[str, str]]
+    # (service_id, instance_name) -> OAuth providers, when OAuth applies
+    oauth_providers: Dict[Tuple[str, str], List[str]]
+    oauth_realm_name: str
+    # Keycloak clientId -> client secret
+    oauth_client_secrets: Dict[str, Optional[str]]
+    # Host ports the stack's port allocation moved
+    port_allocation: PortAllocation
+
+    @classmethod
+    def build(
+        cls,
+        global_settings: Any,
+        integration_settings: Any,
+        integration_results: Dict,
+        keycloak_clients: List[Dict],
+        instances: List[Any],
+        consumed: FrozenSet[str],
+        port_allocation: PortAllocation,
+    ) -> "RenderInputs":
+        """Compute the inputs, skipping any that no renderer in consumed needs"""
+        integrations = integration_results.get("integrations", {})
+
+        email = None
+        if (
+            INPUT_EMAIL in consumed
+            and "email_testing" in integrations
+            and integration_settings.email.get("auto_configure_services", True)
+        ):
+            email = (
+                integrations["email_testing"].get("provider", "mailhog"),
+                integration_settings.email.get("from_address", "noreply@iiot.local"),
+            )
+
+        oauth_providers: Dict[Tuple[str, str], List[str]] = {}
+        oauth_client_secrets: Dict[str, Optional[str]] = {}
+        if (
+            INPUT_OAUTH in consumed
+            and "oauth_provider" in integrations
+            and integration_settings.oauth.get("auto_configure_services", True)
+        ):
+            for client in integrations["oauth_provider"].get("clients", []):
+                key = (client["service_id"], client["instance_name"])
+                oauth_providers.setdefault(key, []).append(client["provider"])
+            for kc_client in keycloak_clients:
+                oauth_client_secrets.setdefault(
+                    kc_client.get("clientId"), kc_client.get("secret")
+                )
+
+        return cls(
+            stack_name=global_settings.stack_name,
+            timezone=global_settings.timezone,
+            restart_policy=global_settings.restart_policy,
+            instances=instances if INPUT_STACK_INSTANCES in consumed else [],
+            has_traefik=any(inst.app_id == "traefik" for inst in instances),
+            keycloak_clients=(
+                keycloak_clients if INPUT_KEYCLOAK_REALM in consumed else []
+            ),
+            base_domain=integration_settings.reverse_proxy.get(
+                "base_domain", "localhost"
+            ),
+            enable_https=integration_settings.reverse_proxy.get("enable_https", False),
+            email=email,
+            oauth_providers=oauth_providers,
+            oauth_realm_name=integration_settings.oauth.get("realm_name", "iiot"),
+            oauth_client_secrets=oauth_client_secrets,
+            port_allocation=port_allocation,
+        )
+
+
+class ServiceRenderer:
+    """
+    Renders the compose service, Traefik port and README URL for one app
+
+    Subclasses override the class attributes below for simple per-app
+    differences and the hook methods for anything more involved.
+    """
+
+    app_id: Optional[str] = None
+    consumes: FrozenSet[str] = frozenset()
+    # (ENV_VAR, config key) pairs overriding catalog environment defaults
+    env_options: Tuple[Tuple[str, str], ...] = ()
+    # Traefik backend port: (config key, default); key None means a fixed port
+    traefik_port_option: Optional[Tuple[Optional[str], Any]] = None
+    # README URL: (config key, default); None means "port", then "http_port"
+    url_port_option: Optional[Tuple[str, Any]] = None
+    url_format = "http://localhost:{port}"
+    # Apply generated OAuth/email env vars for this app
+    oauth_client = False
+    email_client = False
+
+    def __init__(self, app: Dict[str, Any], catalog_index: CatalogIndex):
+        self.app = app
+        app_id = app["id"]
+        default_config = app.get("default_config", {})
+        self.default_version = app.get("default_version", "latest")
+        self.has_ports = "ports" in default_config
+        self.port_templates = catalog_index.port_templates.get(app_id, ())
+        self.env_template = default_config.get("environment")
+        self.volume_templates = default_config.get("volumes")
+        self.command = default_config.get("command")
+        self.cap_add = default_config.get("cap_add")
+        # Identifies the rendering logic and catalog entry in fragment keys
+        self.fingerprint = canonical_hash([type(self).__name__, app])
+
+    # -- compose service -------------------------------------------------
+
+    def render(self, instance: Any, inputs: RenderInputs) -> Tuple[Dict, str]:
+        """Build the compose service for an instance; returns (service, version)"""
+        service_name = instance.instance_name
+        config = instance.config
+
+        version = config.get("version", self.default_version)
+        service = {
+            "image": f"{self.app['image']}:{version}",
+            "container_name": f"{inputs.stack_name}-{service_name}",
+            "networks": [f"{inputs.stack_name}-network"],
+            "restart": inputs.restart_policy,
+        }
+
+        if self.has_ports:
+            service["ports"] = self.ports(
+                config, inputs.port_allocation.host_ports(service_name)
+            )
+
+        if self.env_template is not None:
+            service["environment"] = self.environment(instance, inputs)
+
+        if self.volume_templates is not None:
+            service["volumes"] = self.volumes(service_name, inputs)
+
+        if self.command is not None:
+            service["command"] = self.service_command(inputs)
+
+        if self.cap_add is not None:
+            # Copy so services never share a list (YAML would emit an alias)
+            service["cap_add"] = list(self.cap_add)
+
+        if inputs.has_traefik:
+            labels = self.traefik_labels(service_name, config, inputs)
+            if labels:
+                service["labels"] = labels
+
+        return service, version
+
+    def input_fingerprint(self, instance: Any, inputs: RenderInputs) -> List[Any]:
+        """The stack-wide inputs this instance's service depends on"""
+        fingerprint = [
+            inputs.stack_name,
+            inputs.timezone,
+            inputs.restart_policy,
+            inputs.has_traefik,
+            inputs.base_domain,
+            inputs.enable_https,
+        ]
+        if self.oauth_client:
+            fingerprint.append(
+                [
+                    inputs.oauth_providers.get((self.app_id, instance.instance_name)),
+                    inputs.oauth_realm_name,
+                    inputs.oauth_client_secrets.get(self.app_id),
+                ]
+            )
+        if self.email_client:
+            fingerprint.append(inputs.email)
+        if self.has_ports:
+            fingerprint.append(
+                inputs.port_allocation.host_ports(instance.instance_name)
+            )
+        return fingerprint
+
+    def ports(
+        self, config: Dict, host_ports: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """Port mappings, with host ports moved by the allocator substituted"""
+        ports = []
+        for template in self.port_templates:
+            if template.container is not None:
+                if host_ports and template.container in host_ports:
+                    host_port = host_ports[template.container]
+                else:
+                    host_port = self.host_port(
+                        template.container, template.host, config
+                    )
+                ports.append(f"{host_port}:{template.container}")
+            else:
+                ports.append(template.raw)
+        return ports
+
+    def host_bindings(self, config: Dict) -> List[Tuple[str, Any]]:
+        """(container port, requested host port) of each host:container mapping"""
+        if not self.has_ports:
+            return []
+        return [
+            (
+                template.container,
+                self.host_port(template.container, template.host, config),
+            )
+            for template in self.port_templates
+            if template.container is not None
+        ]
+
+    def host_port(self, container_port: str, default_host: Any, config: Dict) -> Any:
+        """Host side of a "host:container" mapping"""
+        return config.get("port", config.get("http_port", default_host))
+
+    def environment(self, instance: Any, inputs: RenderInputs) -> Dict[str, Any]:
+        env = self.env_template.copy()
+        env["TZ"] = inputs.timezone
+
+        config = instance.config
+        for env_key, config_key in self.env_options:
+            env[env_key] = config.get(config_key, env.get(env_key))
+
+        self.customize_environment(env, instance, inputs)
+
+        if self.oauth_client:
+            for provider in inputs.oauth_providers.get(
+                (self.app_id, instance.instance_name), ()
+            ):
+                env.update(
+                    generate_oauth_env_vars(
+                        self.app_id,
+                        provider,
+                        inputs.oauth_realm_name,
+                        client_secret=inputs.oauth_client_secrets.get(self.app_id),
+                    )
+                )
+
+        if self.email_client and inputs.email is not None:
+            mailhog_instance, from_address = inputs.email
+            env.update(
+                generate_email_env_vars(self.app_id, mailhog_instance, from_address)
+            )
+
+        return env
+
+    def customize_environment(
+        self, env: Dict[str, Any], instance: Any, inputs: RenderInputs
+    ):
+        """Hook for app-specific environment logic"""
+
+    def volumes(self, service_name: str, inputs: RenderInputs) -> List[str]:
+        return [
+            vol.replace("{instance_name}", service_name)
+            for vol in self.volume_templates
+        ]
+
+    def service_command(self, inputs: RenderInputs) -> Any:
+        return self.command
+
+    # -- Traefik -----------------------------------------------------------
+
+    def traefik_port(self, config: Dict) -> Optional[str]:
+        """Port Traefik routes to, or None if the app is not proxied"""
+        if self.traefik_port_option is None:
+            return None
+        config_key, default = self.traefik_port_option
+        if config_key is None:
+            return str(default)
+        return str(config.get(config_key, default))
+
+    def traefik_labels(
+        self, service_name: str, config: Dict, inputs: RenderInputs
+    ) -> Optional[List[str]]:
+        port = self.traefik_port(config)
+        if port is None:
+            return None
+
+        # Create subdomain from service name
+        subdomain = service_name.split("-")[0] if "-" in service_name else service_name
+        entrypoint = "websecure" if inputs.enable_https else "web"
+
+        labels = [
+            "traefik.enable=true",
+            f"traefik.http.routers.{service_name}.rule=Host(`{subdomain}.{inputs.base_domain}`)",
+            f"traefik.http.routers.{service_name}.entrypoints={entrypoint}",
+            f"traefik.http.services.{service_name}.loadbalancer.server.port={port}",
+        ]
+
+        # Add TLS if HTTPS is enabled
+        if inputs.enable_https:
+            labels.append(f"traefik.http.routers.{service_name}.tls=true")
+            labels.append(
+                f"traefik.http.routers.{service_name}.tls.certresolver=letsencrypt"
+            )
+
+        return labels
+
+    # -- README ------------------------------------------------------------
+
+    def readme_url(
+        self, instance: Any, port_allocation: Optional[PortAllocation] = None
+    ) -> str:
+        """Service URL listed in the README"""
+        config = instance.config
+        if self.url_port_option is None:
+            port = config.get("port", config.get("http_port", "8080"))
+        else:
+            port = config.get(*self.url_port_option)
+        if port_allocation is not None:
+            port = port_allocation.host_port(instance.instance_name, port)
+        return self.url_format.format(port=port)
+
+
+_RENDERER_CLASSES: Dict[str, type] = {}
+
+
+def register(app_id: str):
+    """Class decorator registering a renderer for an app id"""
+
+    def decorator(cls):
+        cls.app_id = app_id
+        _RENDERER_CLASSES[app_id] = cls
+        return cls
+
+    return decorator
+
+
+@register("ignition")
+class IgnitionRenderer(ServiceRenderer):
+    consumes = frozenset({INPUT_EMAIL})
+    traefik_port_option = ("http_port", 8088)
+    url_port_option = ("http_port", 8088)
+    email_client = True
+
+    def host_port(self, container_port, default_host, config):
+        if container_port == "8088":
+            return config.get("http_port", default_host)
+        if container_port == "8043":
+            return config.get("https_port", default_host)
+        return default_host
+
+    def customize_environment(self, env, instance, inputs):
+        config = instance.config
+        env["GATEWAY_ADMIN_USERNAME"] = config.get(
+            "admin_username", env.get("GATEWAY_ADMIN_USERNAME")
+        )
+        env["GATEWAY_ADMIN_PASSWORD"] = config.get(
+            "admin_password", env.get("GATEWAY_ADMIN_PASSWORD")
+        )
+        env["IGNITION_EDITION"] = config.get(
+            "edition", env.get("IGNITION_EDITION", "standard")
+        )
+
+        # Determine version to decide which modules field to use
+        version = config.get("version", "latest")
+        # "latest" maps to 8.3+, so treat it as 8.3
+        is_83_or_later = version == "latest" or (
+            version.startswith("8.3")
+            or version.startswith("8.4")
+            or version.startswith("9")
+        )
+
+        # Handle modules - convert array to comma-separated string
+        # Check for version-specific module fields first, then fall back to legacy "modules" field
+        if is_83_or_later:
+            modules = config.get("modules_83", config.get("modules", []))
+        else:
+            modules = config.get("modules_81", config.get("modules", []))
+
+        if isinstance(modules, list) and len(modules) > 0:
+            # Extract just the values if modules are objects
+            module_values = [
+                mod.get("value", mod) if isinstance(mod, dict) else mod
+                for mod in modules
+            ]
+            env["GATEWAY_MODULES_ENABLED"] = ",".join(module_values)
+
+        # Handle third party modules
+        third_party_modules = config.get("third_party_modules", "")
+        if third_party_modules and third_party_modules.strip():
+            # Split by newlines and filter empty lines
+            module_urls = [
+                url.strip() for url in third_party_modules.split("\n") if url.strip()
+            ]
+            if module_urls:
+                env["GATEWAY_MODULE_RELINK"] = ";".join(module_urls)
+
+        env["IGNITION_MEMORY_MAX"] = config.get(
+            "memory_max", env.get("IGNITION_MEMORY_MAX", "2048m")
+        )
+        env["IGNITION_MEMORY_INIT"] = config.get(
+            "memory_init", env.get("IGNITION_MEMORY_INIT", "512m")
+        )
+
+        # Handle commissioning options - only set if explicitly true
+        if config.get("commissioning_allow_non_secure", False):
+            env["GATEWAY_SYSTEM_COMMISSIONING_ALLOWINSECURE"] = "true"
+
+        # REMOVED: IGNITION_QUICKSTART causes volume mount issues
+        # Users should manually commission the gateway after first start
+
+
+@register("postgres")
+class PostgresRenderer(ServiceRenderer):
+    env_options = (
+        ("POSTGRES_DB", "database"),
+        ("POSTGRES_USER", "username"),
+        ("POSTGRES_PASSWORD", "password"),
+    )
+    url_port_option = ("port", 5432)
+    url_format = "localhost:{port}"
+
+    def host_port(self, container_port, default_host, config):
+        return config.get("port", default_host)
+
+
+@register("mariadb")
+class MariaDBRenderer(ServiceRenderer):
+    env_options = (
+        ("MYSQL_DATABASE", "database"),
+        ("MYSQL_USER", "username"),
+        ("MYSQL_PASSWORD", "password"),
+        ("MYSQL_ROOT_PASSWORD", "root_password"),
+    )
+    url_port_option = ("port", 3306)
+    url_format = "localhost:{port}"
+
+
+@register("mssql")
+class MSSQLRenderer(ServiceRenderer):
+    env_options = (("SA_PASSWORD", "sa_password"), ("MSSQL_PID", "edition"))
+    url_port_option = ("port", 1433)
+    url_format = "localhost:{port}"
+
+
+@register("keycloak")
+class KeycloakRenderer(ServiceRenderer):
+    consumes = frozenset({INPUT_EMAIL, INPUT_KEYCLOAK_REALM})
+    env_options = (
+        ("KEYCLOAK_ADMIN", "admin_username"),
+        ("KEYCLOAK_ADMIN_PASSWORD", "admin_password"),
+    )
+    traefik_port_option = ("port", 8180)
+    url_port_option = ("port", 8180)
+    email_client = True
+
+    def host_port(self, container_port, default_host, config):
+        return config.get("port", default_host)
+
+    def input_fingerprint(self, instance, inputs):
+        return super().input_fingerprint(instance, inputs) + [
+            bool(inputs.keycloak_clients)
+        ]
+
+    def volumes(self, service_name, inputs):
+        volumes = super().volumes(service_name, inputs)
+        # Add Keycloak import volume if realm import is configured
+        if inputs.keycloak_clients:
+            volumes.append(
+                f"./configs/{service_name}/import:/opt/keycloak/data/import:ro"
+            )
+        return volumes
+
+    def service_command(self, inputs):
+        # Include the import flag when a realm is generated
+        if inputs.keycloak_clients:
+            return "start-dev --import-realm"
+        return self.command
+
+
+@register("traefik")
+class TraefikRenderer(ServiceRenderer):
+    url_port_option = ("dashboard_port", 8080)
+
+    def host_port(self, container_port, default_host, config):
+        if container_port == "80":
+            return config.get("http_port", 80)
+        if container_port == "443":
+            return config.get("https_port", 443)
+        if container_port == "8080":
+            return config.get("dashboard_port", 8080)
+        return default_host
+
+
+@register("grafana")
+class GrafanaRenderer(ServiceRenderer):
+    consumes = frozenset({INPUT_EMAIL, INPUT_OAUTH})
+    env_options = (
+        ("GF_SECURITY_ADMIN_USER", "admin_username"),
+        ("GF_SECURITY_ADMIN_PASSWORD", "admin_password"),
+    )
+    traefik_port_option = ("port", 3000)
+    url_port_option = ("port", 3000)
+    oauth_client = True
+    email_client = True
+
+
+@register("n8n")
+class N8nRenderer(ServiceRenderer):
+    consumes = frozenset({INPUT_EMAIL, INPUT_OAUTH})
+    env_options = (
+        ("N8N_BASIC_AUTH_USER", "username"),
+        ("N8N_BASIC_AUTH_PASSWORD", "password"),
+    )
+    traefik_port_option = ("port", 5678)
+    url_port_option = ("port", 5678)
+    oauth_client = True
+    email_client = True
+
+
+@register("rabbitmq")
+class RabbitMQRenderer(ServiceRenderer):
+    env_options = (
+        ("RABBITMQ_DEFAULT_USER", "username"),
+        ("RABBITMQ_DEFAULT_PASS", "password"),
+    )
+    url_port_option = ("management_port", 15672)
+
+
+@register("vault")
+class VaultRenderer(ServiceRenderer):
+    env_options = (("VAULT_DEV_ROOT_TOKEN_ID", "root_token"),)
+    url_port_option = ("port", 8200)
+
+
+@register("pgadmin")
+class PgAdminRenderer(ServiceRenderer):
+    env_options = (
+        ("PGADMIN_DEFAULT_EMAIL", "email"),
+        ("PGADMIN_DEFAULT_PASSWORD", "password"),
+    )
+    url_port_option = ("port", 5050)
+
+
+@register("phpmyadmin")
+class PhpMyAdminRenderer(ServiceRenderer):
+    consumes = frozenset({INPUT_STACK_INSTANCES})
+    url_port_option = ("port", 8080)
+
+    def input_fingerprint(self, instance, inputs):
+        mariadb_instance = self.mariadb_instance(inputs)
+        return super().input_fingerprint(instance, inputs) + [
+            mariadb_instance and mariadb_instance.instance_name,
+            mariadb_instance and mariadb_instance.config.get("port", 3306),
+        ]
+
+    def mariadb_instance(self, inputs):
+        return next(
+            (inst for inst in inputs.instances if inst.app_id == "mariadb"), None
+        )
+
+    def customize_environment(self, env, instance, inputs):
+        # PMA_HOST should point to the mariadb instance
+        mariadb_instance = self.mariadb_instance(inputs)
+        if mariadb_instance:
+            env["PMA_HOST"] = mariadb_instance.instance_name
+            env["PMA_PORT"] = str(mariadb_instance.config.get("port", 3306))
+
+
+@register("prometheus")
+class PrometheusRenderer(ServiceRenderer):
+    traefik_port_option = (None, "9090")
+    url_port_option = ("port", 9090)
+
+
+@register("nodered")
+class NodeRedRenderer(ServiceRenderer):
+    traefik_port_option = ("port", 1880)
+    url_port_option = ("port", 1880)
+
+
+@register("dozzle")
+class DozzleRenderer(ServiceRenderer):
+    traefik_port_option = (None, "8080")
+    url_port_option = ("port", 8888)
+
+
+@register("portainer")
+class PortainerRenderer(ServiceRenderer):
+    traefik_port_option = (None, "9000")
+    url_port_option = ("https_port", 9443)
+    url_format = "https://localhost:{port}"
+
+
+@register("guacamole")
+class GuacamoleRenderer(ServiceRenderer):
+    traefik_port_option = (None, "8080")
+    url_port_option = ("port", 8080)
+    url_format = "http://localhost:{port}/guacamole"
+
+
+@register("authentik")
+class AuthentikRenderer(ServiceRenderer):
+    traefik_port_option = (None, "9000")
+    url_port_option = ("http_port", 9000)
+
+
+@register("authelia")
+class AutheliaRenderer(ServiceRenderer):
+    traefik_port_option = (None, "9091")
+    url_port_option = ("port", 9091)
+
+
+@register("mailhog")
+class MailHogRenderer(ServiceRenderer):
+    traefik_port_option = (None, "8025")
+    url_port_option = ("http_port", 8025)
+
+    def readme_url(self, instance, port_allocation=None):
+        config = instance.config
+        port = config.get("http_port", 8025)
+        smtp_port = config.get("smtp_port", 1025)
+        if port_allocation is not None:
+            port = port_allocation.host_port(instance.instance_name, port)
+            smtp_port = port_allocation.host_port(instance.instance_name, smtp_port)
+        return f"http://localhost:{port} (SMTP: {smtp_port})"
+
+
+@register("emqx")
+class EMQXRenderer(ServiceRenderer):
+    url_port_option = ("dashboard_port", 18083)
+    url_format = "http://localhost:{port} (Dashboard)"
+
+
+@register("mosquitto")
+class MosquittoRenderer(ServiceRenderer):
+    url_port_option = ("mqtt_port", 1883)
+    url_format = "mqtt://localhost:{port}"
+
+
+@register("whatupdocker")
+class WhatsUpDockerRenderer(ServiceRenderer):
+    url_port_option = ("port", 3001)
+
+
+@register("nginx-proxy-manager")
+class NginxProxyManagerRenderer(ServiceRenderer):
+    url_port_option = ("admin_port", 81)
+    url_format = "http://localhost:{port} (Admin UI)"
+
+
+@register("influxdb")
+class InfluxDBRenderer(ServiceRenderer):
+    traefik_port_option = (None, "8086")
+
+
+@register("chronograf")
+class ChronografRenderer(ServiceRenderer):
+    traefik_port_option = (None, "8888")
+
+
+class RendererRegistry:
+    """Renderers for every catalog app, keyed by app id"""
+
+    def __init__(self, catalog_index: CatalogIndex):
+        self.catalog_index = catalog_index
+        self._renderers: Dict[str, ServiceRenderer] = {}
+        for app_id, app in catalog_index.by_id.items():
+            renderer_cls = _RENDERER_CLASSES.get(app_id, ServiceRenderer)
+            renderer = renderer_cls(app, catalog_index)
+            renderer.app_id = app_id
+            self._renderers[app_id] = renderer
+
+    def get(self, app_id: str) -> Optional[ServiceRenderer]:
+        """Renderer for an app, or None if the app is not in the catalog"""
+        return self._renderers.get(app_id)
+
+    def consumed_inputs(self, app_ids: Iterable[str]) -> FrozenSet[str]:
+        """Union of the inputs consumed by the renderers of the given apps"""
+        consumed = set()
+        for app_id in set(app_ids):
+            renderer = self._renderers.get(app_id)
+            if renderer is not None:
+                consumed.update(renderer.consumes)
+        return frozenset(consumed)
+
+
+_registry: Optional[RendererRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_renderer_registry(catalog_index: CatalogIndex) -> RendererRegistry:
+    """Get the renderer registry for a catalog, rebuilding it after a reload"""
+    global _registry
+    registry = _registry
+    if registry is None or registry.catalog_index is not catalog_index:
+        with _registry_lock:
+            registry = _registry
+            if registry is None or registry.catalog_index is not catalog_index:
+                registry = RendererRegistry(catalog_index)
+                _registry = registry
+    return registry
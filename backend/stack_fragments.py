@@ -0,0 +1,115 @@
+"""
+Per-service fragments of a generated stack
+Each enabled instance renders to a fragment (its compose service, that
+service's YAML and its .env lines) cached by renderer, instance config and the
+stack-wide inputs the renderer consumes. Regenerating an edited stack only
+re-renders the fragments whose key changed; the compose file and .env are then
+assembled from fragment text.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from cache_utils import LRUCache, canonical_hash
+from service_renderers import RenderInputs, ServiceRenderer
+from yaml_emitter import dump_yaml
+
+SERVICES_HEADER = "services:\n"
+
+_fragments = LRUCache(maxsize=int(os.getenv("FRAGMENT_CACHE_SIZE", "4096")))
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceFragment:
+    """One rendered service (shared between generations, treat as read-only)"""
+
+    name: str
+    service: Dict[str, Any]
+    version: str
+    # The service's entry under "services:" in the compose YAML
+    compose_yaml: str
+    env_lines: Tuple[str, ...]
+
+
+def fragment_key(renderer: ServiceRenderer, instance: Any, inputs: RenderInputs) -> str:
+    """Cache key of an instance's fragment"""
+    return canonical_hash(
+        [
+            renderer.fingerprint,
+            instance.instance_name,
+            instance.config,
+            renderer.input_fingerprint(instance, inputs),
+        ]
+    )
+
+
+def render_fragment(
+    renderer: ServiceRenderer, instance: Any, inputs: RenderInputs
+) -> ServiceFragment:
+    """Cached fragment for an instance, rendering it on a miss"""
+    return _fragments.get_or_compute(
+        fragment_key(renderer, instance, inputs),
+        lambda: _render(renderer, instance, inputs),
+    )
+
+
+def _render(
+    renderer: ServiceRenderer, instance: Any, inputs: RenderInputs
+) -> ServiceFragment:
+    service_name = instance.instance_name
+    service, version = renderer.render(instance, inputs)
+
+    entry = dump_yaml({"services": {service_name: service}}, sort_keys=False)
+
+    env_prefix = service_name.upper().replace("-", "_")
+    env_lines = [f"# {service_name}", f"{env_prefix}_VERSION={version}"]
+    for key, value in service.get("environment", {}).items():
+        env_lines.append(f"{env_prefix}_{key}={value}")
+    env_lines.append("")
+
+    return ServiceFragment(
+        name=service_name,
+        service=service,
+        version=version,
+        compose_yaml=entry[len(SERVICES_HEADER) :],
+        env_lines=tuple(env_lines),
+    )
+
+
+def assemble_compose_yaml(
+    compose: Dict[str, Any], fragments: Iterable[ServiceFragment]
+) -> str:
+    """
+    Compose YAML with the services section joined from fragment text
+
+    Same output as dumping the whole compose dict, except that services
+    never share YAML anchors since each one is dumped on its own.
+    """
+    fragments = list(fragments)
+    if not fragments:
+        return dump_yaml(compose, sort_keys=False)
+
+    return "".join(
+        [
+            dump_yaml({"name": compose["name"]}),
+            SERVICES_HEADER,
+            *(fragment.compose_yaml for fragment in fragments),
+            dump_yaml(
+                {"networks": compose["networks"], "volumes": compose["volumes"]},
+                sort_keys=False,
+            ),
+        ]
+    )
+
+
+def cached_config_file(kind: str, params: Any, generate: Callable[[], str]) -> str:
+    """Generated config file content cached by kind and generator parameters"""
+    return _fragments.get_or_compute(
+        canonical_hash(["config_file", kind, params]), generate
+    )
+
+
+def fragment_cache_stats() -> Dict[str, int]:
+    """Fragment cache size and hit/miss counters"""
+    return _fragments.stats()
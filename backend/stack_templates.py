@@ -0,0 +1,86 @@
+"""
+Jinja2 templates for generated READMEs and scripts
+Templates in templates/ are compiled once (load_templates() runs at startup)
+with compiled bytecode cached on disk across restarts. Callers compute the
+context in Python, so rendering is a single linear pass over the template.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    StrictUndefined,
+    Template,
+)
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+README = "readme.md.j2"
+START_SH = "start.sh.j2"
+START_BAT = "start.bat.j2"
+OFFLINE_README = "offline_readme.md.j2"
+OFFLINE_INSTRUCTIONS = "offline_instructions.txt.j2"
+PULL_IMAGES_SH = "pull_images.sh.j2"
+LOAD_IMAGES_SH = "load_images.sh.j2"
+
+TEMPLATE_NAMES = (
+    README,
+    START_SH,
+    START_BAT,
+    OFFLINE_README,
+    OFFLINE_INSTRUCTIONS,
+    PULL_IMAGES_SH,
+    LOAD_IMAGES_SH,
+)
+
+_environment: Optional[Environment] = None
+_templates: Dict[str, Template] = {}
+_lock = threading.Lock()
+
+
+def _create_environment() -> Environment:
+    cache_dir = os.getenv("TEMPLATE_CACHE_DIR", "")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    return Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        # None picks a private directory under the system temp dir
+        bytecode_cache=FileSystemBytecodeCache(cache_dir or None),
+        # Output is Markdown and shell, never HTML
+        autoescape=False,
+        undefined=StrictUndefined,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        keep_trailing_newline=True,
+        # Templates ship with the code; never re-stat them per render
+        auto_reload=False,
+    )
+
+
+def load_templates():
+    """Compile every template (raises if one is missing or invalid)"""
+    global _environment
+    with _lock:
+        if _environment is None:
+            _environment = _create_environment()
+        for name in TEMPLATE_NAMES:
+            if name not in _templates:
+                _templates[name] = _environment.get_template(name)
+    logger.info(f"Loaded {len(_templates)} generation templates")
+
+
+def render_template(name: str, **context: Any) -> str:
+    """Render a compiled template"""
+    template = _templates.get(name)
+    if template is None:
+        load_templates()
+        template = _templates[name]
+    return template.render(**context)
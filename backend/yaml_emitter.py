@@ -0,0 +1,52 @@
+"""
+Shared YAML emission for generated compose and config files
+Uses PyYAML's libyaml-backed CDumper when it is available and falls back to
+the pure-Python Dumper otherwise. Output matches yaml.dump() byte for byte
+either way.
+"""
+
+from typing import Any
+
+import yaml
+
+try:
+    from yaml import CDumper as FastDumper
+
+    LIBYAML_AVAILABLE = True
+except ImportError:  # PyYAML built without libyaml
+    from yaml import Dumper as FastDumper
+
+    LIBYAML_AVAILABLE = False
+
+
+def _is_plain_ascii(data: Any) -> bool:
+    """
+    True if every string in data is printable ASCII
+
+    libyaml folds long double-quoted scalars (the style used for control
+    characters and non-ASCII text) differently from the Python emitter, so
+    documents containing such strings are emitted in Python.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            if not (value.isascii() and value.isprintable()):
+                return False
+        elif isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return True
+
+
+def dump_yaml(data: Any, sort_keys: bool = True) -> str:
+    """yaml.dump(data, default_flow_style=False) through the fastest dumper"""
+    dumper = FastDumper if _is_plain_ascii(data) else yaml.Dumper
+    return yaml.dump(
+        data,
+        Dumper=dumper,
+        default_flow_style=False,
+        sort_keys=sort_keys,
+    )
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import axios from 'axios'
 import './App.css'
 import { downloadEncryptedConfig, importEncryptedConfig, validateConfigStructure } from './crypto'
@@ -59,23 +59,76 @@ function App() {
     fetchCatalog()
   }, [])
 
+  // Last detection state acknowledged by the server, used to send only deltas
+  const detectionState = useRef({ token: null, instances: {}, results: null })
+  const detectionQueue = useRef(Promise.resolve())
+  // Aborts a preview still streaming when Generate is clicked again
+  const generateAbort = useRef(null)
+
   // Detect integrations whenever instances change
   useEffect(() => {
     if (selectedInstances.length > 0) {
-      detectIntegrations()
+      detectIntegrations(selectedInstances)
     } else {
-      setIntegrationResults(null)
+      detectionQueue.current = detectionQueue.current.then(() => {
+        detectionState.current = { token: null, instances: {}, results: null }
+        setIntegrationResults(null)
+      })
     }
   }, [selectedInstances])
 
-  const detectIntegrations = async () => {
+  const detectIntegrations = (instances) => {
+    // Serialize requests so each delta is computed against the latest token
+    detectionQueue.current = detectionQueue.current.then(() => sendDetectionDelta(instances))
+    return detectionQueue.current
+  }
+
+  const sendDetectionDelta = async (instances) => {
+    const state = detectionState.current
+    const next = {}
+    const add = []
+    const modify = []
+    for (const inst of instances) {
+      const entry = { app_id: inst.app_id, instance_name: inst.instance_name, config: inst.config }
+      next[inst.instance_name] = entry
+      const previous = state.instances[inst.instance_name]
+      if (!previous) {
+        add.push(entry)
+      } else if (JSON.stringify(previous) !== JSON.stringify(entry)) {
+        modify.push(entry)
+      }
+    }
+    const remove = Object.keys(state.instances).filter(name => !(name in next))
+
     try {
-      const response = await axios.post(`${API_URL}/detect-integrations`, {
-        instances: selectedInstances,
-        global_settings: globalSettings
-      })
-      setIntegrationResults(response.data)
+      let response
+      try {
+        response = await axios.post(`${API_URL}/detect-integrations/delta`, {
+          token: state.token, add, remove, modify
+        })
+      } catch (error) {
+        if (error.response?.status !== 409) throw error
+        // Server no longer has our state - resend the whole stack
+        response = await axios.post(`${API_URL}/detect-integrations/delta`, {
+          token: null, add: Object.values(next), remove: [], modify: []
+        })
+      }
+
+      const delta = response.data
+      const base = delta.base_token && state.results ? state.results : { integrations: {} }
+      const integrations = { ...base.integrations, ...delta.integrations }
+      for (const type of delta.removed_integrations) {
+        delete integrations[type]
+      }
+      const results = { ...base, integrations }
+      for (const section of ['conflicts', 'warnings', 'recommendations', 'auto_add_services', 'summary']) {
+        if (section in delta) results[section] = delta[section]
+      }
+
+      detectionState.current = { token: delta.token, instances: next, results }
+      setIntegrationResults(results)
     } catch (error) {
+      detectionState.current = { token: null, instances: {}, results: null }
       console.error('Error detecting integrations:', error)
     }
   }
@@ -381,16 +434,58 @@ function App() {
     return null
   }
 
+  const applyGenerationEvent = (result, event) => {
+    if (event.section === 'error') {
+      throw new Error(event.detail)
+    } else if (event.section === 'config_file') {
+      result.config_files[event.path] = event.content
+    } else if (event.section === 'settings') {
+      Object.assign(result, event)
+      delete result.section
+    } else if (event.section !== 'done') {
+      result[event.section] = event.content
+    }
+  }
+
   const generateStack = async () => {
+    // The preview only shows the compose file, so only that part is generated
+    generateAbort.current?.abort()
+    const controller = new AbortController()
+    generateAbort.current = controller
+
     try {
-      const response = await axios.post(`${API_URL}/generate`, {
-        instances: selectedInstances,
-        integrations: [],
-        global_settings: globalSettings,
-        integration_settings: integrationSettings
+      const response = await fetch(`${API_URL}/generate/stream?parts=compose`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          instances: selectedInstances,
+          integrations: [],
+          global_settings: globalSettings,
+          integration_settings: integrationSettings
+        }),
+        signal: controller.signal
       })
-      setGeneratedConfig(response.data)
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`)
+      }
+
+      const result = { config_files: {} }
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffered = ''
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffered += decoder.decode(value, { stream: true })
+        const lines = buffered.split('\n')
+        buffered = lines.pop()
+        for (const line of lines) {
+          if (line) applyGenerationEvent(result, JSON.parse(line))
+        }
+        setGeneratedConfig({ ...result, config_files: { ...result.config_files } })
+      }
     } catch (error) {
+      if (error.name === 'AbortError') return
       console.error('Error generating stack:', error)
       alert('Error generating stack configuration')
     }
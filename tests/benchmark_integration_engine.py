@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the integration engine
+Times detect_integrations, get_recommendations and get_integration_summary on
+synthetic stacks built from every catalog app, and records peak allocations.
+
+Usage:
+    python3 tests/benchmark_integration_engine.py
+    python3 tests/benchmark_integration_engine.py --sizes 5,500 --output bench.json
+    python3 tests/benchmark_integration_engine.py --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from integration_engine import IntegrationEngine  # noqa: E402
+
+DEFAULT_SIZES = [5, 50, 500, 5000]
+
+# ANSI color codes
+GREEN = "\033[0;32m"
+RED = "\033[0;31m"
+BLUE = "\033[0;34m"
+NC = "\033[0m"  # No Color
+
+
+def load_catalog_apps() -> List[str]:
+    """All app ids from the backend catalog"""
+    with open(os.path.join(BACKEND_DIR, "catalog.json")) as f:
+        catalog = json.load(f)
+    return [app["id"] for app in catalog.get("applications", [])]
+
+
+def build_stack(app_ids: List[str], size: int, seed: int) -> List[Dict]:
+    """
+    Build a deterministic synthetic stack of size instances
+
+    Apps are dealt round-robin from a seeded shuffle, so every catalog app is
+    present once size >= len(app_ids) and larger stacks hold many instances
+    of each. Every other instance gets a custom name.
+    """
+    rng = random.Random(seed)
+    order = list(app_ids)
+    rng.shuffle(order)
+
+    instances = []
+    for i in range(size):
+        app_id = order[i % len(order)]
+        config = {"name": f"{app_id}-{i}"} if i % 2 else {}
+        instances.append(
+            {"app_id": app_id, "instance_name": f"{app_id}-{i}", "config": config}
+        )
+    return instances
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Time repeat calls and trace allocations of one extra call"""
+    func()  # warm-up
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        timings.append((time.perf_counter_ns() - start) / 1e6)
+    timings.sort()
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "min_ms": round(timings[0], 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+        "peak_alloc_bytes": peak,
+    }
+
+
+def run_benchmarks(sizes: List[int], repeat: int, seed: int) -> Dict:
+    """Run every operation against every stack size"""
+    engine = IntegrationEngine(os.path.join(BACKEND_DIR, "integrations.json"))
+    app_ids = load_catalog_apps()
+
+    results = []
+    for size in sizes:
+        instances = build_stack(app_ids, size, seed)
+        selected_services = [inst["app_id"] for inst in instances]
+        detection = engine.detect_integrations(instances)
+        # Scale rounds down for large stacks so a full run stays short
+        rounds = max(5, min(repeat, repeat * 50 // size))
+
+        operations = {
+            "detect_integrations": lambda: engine.detect_integrations(instances),
+            "get_recommendations": lambda: engine.get_recommendations(
+                selected_services
+            ),
+            "get_integration_summary": lambda: engine.get_integration_summary(
+                detection
+            ),
+        }
+
+        for operation, func in operations.items():
+            stats = measure(func, rounds)
+            results.append(
+                {"operation": operation, "instances": size, "repeat": rounds, **stats}
+            )
+            print(
+                f"  {operation:<26} {size:>6} instances  "
+                f"median {stats['median_ms']:>10.3f} ms  "
+                f"p95 {stats['p95_ms']:>10.3f} ms  "
+                f"peak {stats['peak_alloc_bytes'] / 1024:>10.1f} KiB"
+            )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "integrations_version": engine.version,
+            "catalog_apps": len(app_ids),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """List operations whose median latency regressed by more than threshold %"""
+    previous = {
+        (entry["operation"], entry["instances"]): entry
+        for entry in baseline.get("results", [])
+    }
+
+    regressions = []
+    for entry in report["results"]:
+        base = previous.get((entry["operation"], entry["instances"]))
+        if not base or base["median_ms"] <= 0:
+            continue
+        change = (entry["median_ms"] - base["median_ms"]) / base["median_ms"] * 100
+        if change > threshold:
+            regressions.append(
+                f"{entry['operation']} @ {entry['instances']} instances: "
+                f"{base['median_ms']:.3f} ms -> {entry['median_ms']:.3f} ms "
+                f"(+{change:.0f}%)"
+            )
+    return regressions
+
+
+def parse_sizes(value: str) -> List[int]:
+    try:
+        sizes = [int(size) for size in value.split(",") if size.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size list: {value}")
+    if not sizes or min(sizes) < 1:
+        raise argparse.ArgumentTypeError("sizes must be positive integers")
+    return sizes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=DEFAULT_SIZES,
+        help="comma-separated instance counts (default: 5,50,500,5000)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=50, help="timed rounds per small stack"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="stack shuffle seed")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument(
+        "--baseline", help="JSON results of a previous run to compare against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=25.0,
+        help="allowed median slowdown vs baseline, in percent (default: 25)",
+    )
+    args = parser.parse_args(argv)
+
+    print(f"\n{BLUE}Integration engine benchmarks{NC}\n")
+    report = run_benchmarks(args.sizes, args.repeat, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    else:
+        print()
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{RED}✗ Regressions vs {args.baseline}:{NC}")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\n{GREEN}✓ No regressions vs {args.baseline}{NC}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())